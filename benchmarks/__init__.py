@@ -0,0 +1 @@
+"""Benchmarks for the plotting pipeline, run with ``python -m benchmarks``"""
@@ -0,0 +1,149 @@
+"""Benchmark cases covering the plotting pipeline
+
+Each case builds a renderable from a synthetic frame. The runner measures
+render, serialization, peak RSS, model count and document size.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Callable
+
+import polars as pl
+
+from benchmarks.datagen import DataShape
+from mas.libs.phanpy.plotting import (
+    BoxPlot,
+    Histogram,
+    Line,
+    Plot,
+    Scatter,
+    factor_cmap,
+)
+from mas.libs.phanpy.plotting.layer.grid import GridPlot
+from mas.libs.phanpy.plotting.layer.renderable import RenderableTrait
+
+
+@dataclass(frozen=True)
+class BenchmarkCase:
+    name: str
+    shape: DataShape
+    build: Callable[[pl.DataFrame], RenderableTrait]
+
+
+def _scatter(df: pl.DataFrame) -> RenderableTrait:
+    return Plot(data=df).add(Scatter(x=pl.col("x"), y=pl.col("y")))
+
+
+def _scatter_colored(df: pl.DataFrame) -> RenderableTrait:
+    return Plot(data=df).add(
+        Scatter(x=pl.col("x"), y=pl.col("y"), fill_color=factor_cmap("group"))
+    )
+
+
+def _line_group(df: pl.DataFrame) -> RenderableTrait:
+    return Plot(data=df).add(Line(x=pl.col("x"), y=pl.col("y"), group="subject"))
+
+
+def _histogram_stacked(df: pl.DataFrame) -> RenderableTrait:
+    return Histogram(
+        data=df, x=pl.col("y"), bins=50, mode="stack", fill_color=factor_cmap("group")
+    )
+
+
+def _histogram_overlay(df: pl.DataFrame) -> RenderableTrait:
+    return Histogram(
+        data=df,
+        x=pl.col("y"),
+        bins=50,
+        mode="overlay",
+        type="density",
+        fill_color=factor_cmap("group"),
+    )
+
+
+def _boxplot(df: pl.DataFrame) -> RenderableTrait:
+    factors = df["group"].unique().sort().to_list()
+    return BoxPlot(
+        data=df,
+        x=pl.col("group"),
+        y=pl.col("y"),
+        x_ax={"typ": "categorical", "factors": factors},
+    )
+
+
+def _facet_wrap(df: pl.DataFrame) -> RenderableTrait:
+    return (
+        Plot(data=df)
+        .add(Scatter(x=pl.col("x"), y=pl.col("y"), fill_color=factor_cmap("group")))
+        .with_facet_wrap("facet", n_cols=4, shared_x_axis=True, shared_y_axis=True)
+    )
+
+
+def _facet_wrap_shared(df: pl.DataFrame) -> RenderableTrait:
+    return (
+        Plot(data=df)
+        .add(Scatter(x=pl.col("x"), y=pl.col("y"), fill_color=factor_cmap("group")))
+        .with_facet_wrap(
+            "facet",
+            n_cols=4,
+            shared_data=True,
+            shared_x_axis=True,
+            shared_y_axis=True,
+        )
+    )
+
+
+def _facet_wrap_lean(df: pl.DataFrame) -> RenderableTrait:
+    return (
+        Plot(data=df)
+        .add(Scatter(x=pl.col("x"), y=pl.col("y"), fill_color=factor_cmap("group")))
+        .with_facet_wrap(
+            "facet",
+            n_cols=10,
+            shared_x_axis=True,
+            shared_y_axis=True,
+            lean=True,
+        )
+    )
+
+
+def _gridplot(df: pl.DataFrame) -> RenderableTrait:
+    return GridPlot(
+        children=[
+            Plot(data=df).add(Scatter(x=pl.col("x"), y=pl.col("y"))),
+            Plot(data=df).add(Scatter(x=pl.col("x"), y=pl.col("v0"))),
+            Histogram(data=df, x=pl.col("y"), bins=50),
+            Histogram(data=df, x=pl.col("v0"), bins=50),
+        ],
+        n_cols=2,
+    )
+
+
+CASES: list[BenchmarkCase] = [
+    BenchmarkCase("scatter", DataShape(100_000), _scatter),
+    BenchmarkCase("scatter_colored", DataShape(100_000, n_groups=8), _scatter_colored),
+    BenchmarkCase("line_group", DataShape(5_000, n_groups=10), _line_group),
+    BenchmarkCase(
+        "histogram_stacked", DataShape(200_000, n_groups=8), _histogram_stacked
+    ),
+    BenchmarkCase(
+        "histogram_overlay", DataShape(200_000, n_groups=8), _histogram_overlay
+    ),
+    BenchmarkCase("boxplot", DataShape(200_000, n_groups=12), _boxplot),
+    BenchmarkCase(
+        "facet_wrap", DataShape(50_000, n_groups=4, n_facets=16), _facet_wrap
+    ),
+    BenchmarkCase(
+        "facet_wrap_shared",
+        DataShape(50_000, n_groups=4, n_facets=16),
+        _facet_wrap_shared,
+    ),
+    BenchmarkCase("gridplot", DataShape(50_000, n_cols=1), _gridplot),
+    # 最后执行：100 个子图的峰值内存较大，会影响之后用例的 RSS
+    BenchmarkCase(
+        "facet_wrap_lean",
+        DataShape(50_000, n_groups=4, n_facets=100),
+        _facet_wrap_lean,
+    ),
+]
@@ -0,0 +1,53 @@
+"""Synthetic data generators for the plotting benchmarks
+
+All generators are deterministic for a given seed, so model counts and document
+sizes are comparable between runs.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import numpy as np
+import polars as pl
+
+
+@dataclass(frozen=True)
+class DataShape:
+    n_rows: int
+    n_cols: int = 2  # 除 x/y 以外的数值列
+    n_groups: int = 1
+    n_facets: int = 1
+
+    def label(self) -> str:
+        return f"N={self.n_rows} M={self.n_cols} K={self.n_groups} F={self.n_facets}"
+
+
+def make_frame(shape: DataShape, seed: int = 0) -> pl.DataFrame:
+    """N 行 × M 数值列 × K 个分组 × F 个分面
+
+    - `x`/`y`: 每个分组有不同的斜率和噪声
+    - `v0` ... `v{M-1}`: 额外的数值列
+    - `group`: K 个分组 (字符串)
+    - `facet`: F 个分面 (字符串)
+    - `subject`: 每个分组内的个体编号，用于 Line(group=...)
+    """
+    rng = np.random.default_rng(seed)
+    n = shape.n_rows
+    group_idx = rng.integers(0, shape.n_groups, n)
+    facet_idx = rng.integers(0, shape.n_facets, n)
+    x = rng.uniform(0, 24, n)
+    slope = np.linspace(0.5, 2.0, shape.n_groups)[group_idx]
+    y = slope * x + rng.normal(0, 2, n)
+
+    columns: dict[str, object] = {
+        "x": x,
+        "y": y,
+        "group": np.char.add("g", np.char.zfill(group_idx.astype(str), 3)),
+        "facet": np.char.add("f", np.char.zfill(facet_idx.astype(str), 3)),
+        "subject": group_idx * 1000 + rng.integers(0, 10, n),
+    }
+    for i in range(shape.n_cols):
+        columns[f"v{i}"] = rng.lognormal(0, 1, n)
+
+    return pl.DataFrame(columns).sort("subject", "x")
@@ -0,0 +1,113 @@
+"""Guard the import time of the plotting package
+
+    python -m benchmarks.importtime             # check all cases
+    python -m benchmarks.importtime --repeat 9  # more runs per case
+
+Each case imports one module in a fresh interpreter with `python -X importtime`
+and fails if any of the heavy dependencies listed for it got imported, or if
+the cumulative import time exceeds the (deliberately loose) limit.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import pathlib
+import subprocess
+import sys
+from dataclasses import dataclass
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+HEAVY = ("bokeh", "polars", "numpy", "pydantic", "IPython")
+
+
+@dataclass(frozen=True)
+class ImportCase:
+    module: str
+    forbidden: tuple[str, ...]
+    max_ms: float
+
+
+IMPORT_CASES: list[ImportCase] = [
+    ImportCase("mas.libs.phanpy.plotting", HEAVY, max_ms=100),
+    ImportCase("mas.libs.phanpy.plotting.composable.glyphs", HEAVY, max_ms=100),
+    # palette 的数据来自 bokeh.palettes (依赖 numpy)
+    ImportCase(
+        "mas.libs.phanpy.plotting.palette", ("polars", "pydantic", "IPython"), 500
+    ),
+    ImportCase(
+        "mas.libs.phanpy.plotting.options", ("bokeh", "polars", "IPython"), 500
+    ),
+]
+
+
+@dataclass
+class ImportResult:
+    module: str
+    cumulative_ms: float
+    imported: set[str]
+
+
+def measure_import(module: str) -> ImportResult:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [str(ROOT), env.get("PYTHONPATH", None)])
+    )
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+    cumulative_us = 0
+    imported: set[str] = set()
+    for line in proc.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        imported.add(name.strip().split(".")[0])
+        if name.strip() == module:
+            cumulative_us = max(cumulative_us, int(cumulative))
+    return ImportResult(module, cumulative_us / 1000, imported)
+
+
+def run_import_case(case: ImportCase, repeat: int) -> tuple[ImportResult, list[str]]:
+    # 取最小值，减少磁盘缓存等因素的影响
+    results = [measure_import(case.module) for _ in range(repeat)]
+    best = min(results, key=lambda r: r.cumulative_ms)
+    problems = [
+        f"{case.module}: imports {name}"
+        for name in case.forbidden
+        if name in best.imported
+    ]
+    if best.cumulative_ms > case.max_ms:
+        problems.append(
+            f"{case.module}: {best.cumulative_ms:.1f} ms > {case.max_ms:.1f} ms"
+        )
+    return best, problems
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.importtime")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    regressions: list[str] = []
+    print(f"{'module':<48} {'import ms':>10} {'limit ms':>10}")
+    for case in IMPORT_CASES:
+        result, problems = run_import_case(case, repeat=args.repeat)
+        print(f"{case.module:<48} {result.cumulative_ms:>10.1f} {case.max_ms:>10.1f}")
+        regressions.extend(problems)
+
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,215 @@
+"""Run the plotting benchmarks and compare them against a stored baseline
+
+    python -m benchmarks                      # run and compare with baseline.json
+    python -m benchmarks --update             # run and overwrite baseline.json
+    python -m benchmarks -k facet --repeat 5  # filter cases by name
+    python -m benchmarks.importtime           # import time guard
+
+The baseline is a plain JSON file next to this module, so regressions in model
+count and document size show up as diffs in review. Timings and RSS are
+machine dependent and are only compared with a loose tolerance.
+"""
+
+from __future__ import annotations
+
+import argparse
+import dataclasses
+import gc
+import json
+import pathlib
+import platform
+import resource
+import statistics
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any
+
+from bokeh.embed import json_item
+
+from benchmarks.cases import CASES, BenchmarkCase
+from benchmarks.datagen import make_frame
+
+BASELINE_PATH = pathlib.Path(__file__).with_name("baseline.json")
+
+# 耗时/内存在不同机器上波动较大，只有超过这个倍数才认为是回归
+TIME_TOLERANCE = 1.5
+RSS_TOLERANCE = 1.3
+# 模型 id 的长度会随进程中已创建的模型数量变化，文档大小允许很小的误差
+BYTES_TOLERANCE = 1.01
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    shape: str
+    render_s: float
+    serialize_s: float
+    peak_rss_mb: float
+    models: int
+    document_bytes: int
+
+
+def _reset_peak_rss() -> bool:
+    # Linux >= 4.0: 写入 5 会重置 VmHWM
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # 回退到进程生命周期内的峰值
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_case(case: BenchmarkCase, repeat: int, scale: float) -> BenchmarkResult:
+    shape = dataclasses.replace(case.shape, n_rows=int(case.shape.n_rows * scale))
+    df = make_frame(shape)
+
+    render_times: list[float] = []
+    serialize_times: list[float] = []
+    models = 0
+    document_bytes = 0
+    peak_rss = 0.0
+    for _ in range(repeat):
+        gc.collect()
+        _reset_peak_rss()
+        renderable = case.build(df)
+
+        t0 = time.perf_counter()
+        model = renderable.render()
+        t1 = time.perf_counter()
+        document = json.dumps(json_item(model))
+        t2 = time.perf_counter()
+
+        render_times.append(t1 - t0)
+        serialize_times.append(t2 - t1)
+        peak_rss = max(peak_rss, _peak_rss_mb())
+        models = len(model.references())
+        document_bytes = len(document.encode())
+        del model, document, renderable
+
+    return BenchmarkResult(
+        name=case.name,
+        shape=shape.label(),
+        render_s=round(statistics.median(render_times), 4),
+        serialize_s=round(statistics.median(serialize_times), 4),
+        peak_rss_mb=round(peak_rss, 1),
+        models=models,
+        document_bytes=document_bytes,
+    )
+
+
+def load_baseline(path: pathlib.Path = BASELINE_PATH) -> dict[str, dict[str, Any]]:
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())["cases"]
+
+
+def save_baseline(
+    results: list[BenchmarkResult], path: pathlib.Path = BASELINE_PATH
+) -> None:
+    cases = load_baseline(path)
+    for r in results:
+        cases[r.name] = dataclasses.asdict(r)
+    path.write_text(
+        json.dumps(
+            {
+                "machine": {
+                    "python": platform.python_version(),
+                    "platform": platform.platform(terse=True),
+                },
+                "cases": dict(sorted(cases.items())),
+            },
+            indent=2,
+        )
+        + "\n"
+    )
+
+
+def compare(
+    results: list[BenchmarkResult], baseline: dict[str, dict[str, Any]]
+) -> list[str]:
+    """返回回归项的描述，模型数要求完全一致"""
+    regressions: list[str] = []
+    for r in results:
+        base = baseline.get(r.name, None)
+        if base is None:
+            continue
+        if r.shape != base["shape"]:
+            continue
+        if r.models != base["models"]:
+            regressions.append(f"{r.name}: models {base['models']} -> {r.models}")
+        if r.document_bytes > base["document_bytes"] * BYTES_TOLERANCE:
+            regressions.append(
+                f"{r.name}: document bytes {base['document_bytes']} -> {r.document_bytes}"
+            )
+        for key, tolerance in (
+            ("render_s", TIME_TOLERANCE),
+            ("serialize_s", TIME_TOLERANCE),
+            ("peak_rss_mb", RSS_TOLERANCE),
+        ):
+            current: float = getattr(r, key)
+            if base[key] > 0 and current > base[key] * tolerance:
+                regressions.append(f"{r.name}: {key} {base[key]} -> {current}")
+    return regressions
+
+
+def format_table(
+    results: list[BenchmarkResult], baseline: dict[str, dict[str, Any]]
+) -> str:
+    header = (
+        f"{'case':<20} {'shape':<30} {'render s':>10} {'serial. s':>10} "
+        f"{'peak MB':>9} {'models':>8} {'doc bytes':>12} {'vs base':>8}"
+    )
+    lines = [header, "-" * len(header)]
+    for r in results:
+        base = baseline.get(r.name, None)
+        ratio = ""
+        if base is not None and base["render_s"] > 0:
+            ratio = f"{r.render_s / base['render_s']:.2f}x"
+        lines.append(
+            f"{r.name:<20} {r.shape:<30} {r.render_s:>10.4f} {r.serialize_s:>10.4f} "
+            f"{r.peak_rss_mb:>9.1f} {r.models:>8} {r.document_bytes:>12} {ratio:>8}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument("-k", dest="pattern", default=None, help="filter case names")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--scale", type=float, default=1.0, help="scale row counts")
+    parser.add_argument("--update", action="store_true", help="rewrite baseline")
+    parser.add_argument("--baseline", type=pathlib.Path, default=BASELINE_PATH)
+    args = parser.parse_args(argv)
+
+    cases = [c for c in CASES if args.pattern is None or args.pattern in c.name]
+    baseline = load_baseline(args.baseline)
+    results: list[BenchmarkResult] = []
+    for case in cases:
+        result = run_case(case, repeat=args.repeat, scale=args.scale)
+        results.append(result)
+        print(f"{case.name}: {result.render_s:.4f}s", file=sys.stderr)
+
+    print(format_table(results, baseline))
+
+    if args.update:
+        save_baseline(results, args.baseline)
+        return 0
+
+    regressions = compare(results, baseline)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    return 1 if regressions else 0
+
@@ -12,42 +12,112 @@
 #
 # Copyright (c) 2024 Maspectra Dev Team
 ############################################################
-from mas.libs.phanpy.plotting.composable.glyphs import (
-    GlyphSpec,
-    HArea,
-    HLine,
-    Line,
-    Rectangle,
-    Scatter,
-    Step,
-    Text,
-    VArea,
-    VLine,
-)
-from mas.libs.phanpy.plotting.composable.plot import Plot
-from mas.libs.phanpy.plotting.composable.stats.boxplot import BoxPlot
-from mas.libs.phanpy.plotting.composable.stats.histogram import Histogram
-from mas.libs.phanpy.plotting.factor import factor_cmap, factor_marker
-from mas.libs.phanpy.plotting.options import plotting_options
-from mas.libs.phanpy.plotting.setup import setup_html, setup_notebook
+import importlib
+import typing
+
+if typing.TYPE_CHECKING:
+    from mas.libs.phanpy.plotting.composable.glyphs import (
+        GlyphSpec,
+        HArea,
+        HLine,
+        Line,
+        Rectangle,
+        Scatter,
+        Step,
+        Text,
+        VArea,
+        VLine,
+    )
+    from mas.libs.phanpy.plotting.composable.plot import Plot
+    from mas.libs.phanpy.plotting.composable.stats.boxplot import BoxPlot
+    from mas.libs.phanpy.plotting.composable.stats.density import Density
+    from mas.libs.phanpy.plotting.composable.stats.ecdf import ECDF
+    from mas.libs.phanpy.plotting.composable.stats.hexbin import HexBin
+    from mas.libs.phanpy.plotting.composable.stats.histogram import Histogram
+    from mas.libs.phanpy.plotting.composable.stats.histogram2d import Histogram2D
+    from mas.libs.phanpy.plotting.composable.stats.qq import QQ
+    from mas.libs.phanpy.plotting.composable.stats.trend import Trend
+    from mas.libs.phanpy.plotting.composable.stats.violin import Violin
+    from mas.libs.phanpy.plotting.composable.stats.vpc import VPC
+    from mas.libs.phanpy.plotting.factor import (
+        factor_cmap,
+        factor_marker,
+        infer_factors,
+    )
+    from mas.libs.phanpy.plotting.options import plotting_options
+    from mas.libs.phanpy.plotting.setup import setup_html, setup_notebook
+
+# 按需导入，避免只用到部分功能 (例如 palette) 时加载 bokeh/polars 等依赖
+_LAZY_ATTRS: dict[str, str] = {
+    "BoxPlot": "mas.libs.phanpy.plotting.composable.stats.boxplot",
+    "Density": "mas.libs.phanpy.plotting.composable.stats.density",
+    "ECDF": "mas.libs.phanpy.plotting.composable.stats.ecdf",
+    "factor_cmap": "mas.libs.phanpy.plotting.factor",
+    "factor_marker": "mas.libs.phanpy.plotting.factor",
+    "GlyphSpec": "mas.libs.phanpy.plotting.composable.glyphs",
+    "HArea": "mas.libs.phanpy.plotting.composable.glyphs",
+    "HexBin": "mas.libs.phanpy.plotting.composable.stats.hexbin",
+    "Histogram": "mas.libs.phanpy.plotting.composable.stats.histogram",
+    "Histogram2D": "mas.libs.phanpy.plotting.composable.stats.histogram2d",
+    "HLine": "mas.libs.phanpy.plotting.composable.glyphs",
+    "infer_factors": "mas.libs.phanpy.plotting.factor",
+    "Line": "mas.libs.phanpy.plotting.composable.glyphs",
+    "Step": "mas.libs.phanpy.plotting.composable.glyphs",
+    "Plot": "mas.libs.phanpy.plotting.composable.plot",
+    "plotting_options": "mas.libs.phanpy.plotting.options",
+    "QQ": "mas.libs.phanpy.plotting.composable.stats.qq",
+    "Rectangle": "mas.libs.phanpy.plotting.composable.glyphs",
+    "Scatter": "mas.libs.phanpy.plotting.composable.glyphs",
+    "setup_html": "mas.libs.phanpy.plotting.setup",
+    "setup_notebook": "mas.libs.phanpy.plotting.setup",
+    "Text": "mas.libs.phanpy.plotting.composable.glyphs",
+    "Trend": "mas.libs.phanpy.plotting.composable.stats.trend",
+    "VArea": "mas.libs.phanpy.plotting.composable.glyphs",
+    "Violin": "mas.libs.phanpy.plotting.composable.stats.violin",
+    "VLine": "mas.libs.phanpy.plotting.composable.glyphs",
+    "VPC": "mas.libs.phanpy.plotting.composable.stats.vpc",
+}
+
+
+def __getattr__(name: str) -> typing.Any:
+    module_name = _LAZY_ATTRS.get(name, None)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted([*globals(), *_LAZY_ATTRS])
+
 
 __all__ = [
     "BoxPlot",
+    "Density",
+    "ECDF",
     "factor_cmap",
     "factor_marker",
     "GlyphSpec",
     "HArea",
+    "HexBin",
     "Histogram",
+    "Histogram2D",
     "HLine",
+    "infer_factors",
     "Line",
     "Step",
     "Plot",
     "plotting_options",
+    "QQ",
     "Rectangle",
     "Scatter",
     "setup_html",
     "setup_notebook",
     "Text",
+    "Trend",
     "VArea",
+    "Violin",
     "VLine",
+    "VPC",
 ]
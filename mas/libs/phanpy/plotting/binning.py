@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import numpy as np
+import numpy.typing as npt
+import polars as pl
+
+__all__ = [
+    "is_uniform_edges",
+    "bin_index",
+]
+
+
+def is_uniform_edges(edges: npt.NDArray[np.float64]) -> bool:
+    widths = np.diff(edges)
+    return bool(np.allclose(widths, widths[0]))
+
+
+def bin_index(expr: pl.Expr, edges: npt.NDArray[np.float64], name: str) -> pl.Expr:
+    """数据所在 bin 的序号，超出边界时为 -1 或 len(edges) - 1
+
+    只使用按行计算的表达式，streaming 引擎可以分块执行
+    """
+    n = len(edges) - 1
+    if is_uniform_edges(edges):
+        index = ((expr - edges[0]) / (edges[-1] - edges[0]) * n).floor()
+    else:
+        # 逐个边界比较而不是 search_sorted，保持按行计算
+        index = (
+            pl.sum_horizontal([(expr >= float(e)).cast(pl.Int64) for e in edges]) - 1
+        )
+    # 和 numpy 一致，最后一个 bin 包含右边界
+    return (
+        pl.when(expr == edges[-1])
+        .then(n - 1)
+        .otherwise(index)
+        .cast(pl.Int64)
+        .alias(name)
+    )
@@ -0,0 +1,303 @@
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import logging as logger
+from dataclasses import dataclass, field
+from typing import Any, Iterator, Literal
+
+import bokeh.models as bm
+import numpy as np
+import polars as pl
+from bokeh.core.property.vectorization import Field
+from bokeh.palettes import Viridis256
+
+from mas.libs.phanpy.plotting.options import plotting_options
+
+__all__ = [
+    "BudgetPolicy",
+    "RenderBudgetExceededError",
+    "BudgetDecision",
+    "render_budget",
+    "apply_render_budget",
+    "apply_shared_render_budget",
+    "will_rasterize",
+]
+
+BudgetPolicy = Literal["raise", "warn", "downsample", "rasterize", "sample"]
+
+# rasterize 时生成的图片分辨率
+RASTER_SHAPE = (400, 400)
+
+
+class RenderBudgetExceededError(ValueError):
+    """渲染超出 `plotting_options.budget` 的限制 (policy="raise")"""
+
+
+@dataclass
+class _BudgetUsage:
+    total_bytes: int = 0
+    renderers: dict[int, int] = field(default_factory=dict)
+
+
+# 一次 render 过程中累计的用量，跨 figure 统计总字节数
+_usage: contextvars.ContextVar[_BudgetUsage | None] = contextvars.ContextVar(
+    "mas.plotting.render.budget_usage", default=None
+)
+
+
+@contextlib.contextmanager
+def render_budget() -> Iterator[None]:
+    """在一次渲染中统计用量，嵌套调用时沿用外层的统计"""
+    if _usage.get() is not None:
+        yield
+        return
+
+    token = _usage.set(_BudgetUsage())
+    try:
+        yield
+    finally:
+        _usage.reset(token)
+
+
+@dataclass
+class BudgetDecision:
+    """`apply_render_budget` 的结果
+
+    - `data` 为 None 时表示该 renderer 被跳过
+    - `glyph` 可能被替换为栅格化后的 `bm.Image`，此时数据在 `source_data` 中
+    """
+
+    data: pl.DataFrame | None
+    glyph: bm.Glyph
+    action: str = "none"
+    source_data: dict[str, Any] | None = None
+
+    def to_source_data(self) -> dict[str, Any]:
+        if self.source_data is not None:
+            return self.source_data
+        assert self.data is not None
+        return self.data.to_dict()
+
+    def estimated_size(self) -> int:
+        if self.source_data is not None:
+            return sum(
+                v.nbytes if isinstance(v, np.ndarray) else 8
+                for values in self.source_data.values()
+                for v in values
+            )
+        return self.data.estimated_size() if self.data is not None else 0
+
+
+def _field_name(value: object) -> str | None:
+    if isinstance(value, Field):
+        return value.field
+    if isinstance(value, str):
+        return value
+    return None
+
+
+def _can_rasterize(data: pl.DataFrame, glyph: bm.Glyph) -> bool:
+    # 只有散点类的 glyph 栅格化后语义不变
+    if not isinstance(glyph, (bm.Scatter, bm.Circle)):
+        return False
+    x, y = _field_name(glyph.x), _field_name(glyph.y)
+    return (
+        x in data.columns
+        and y in data.columns
+        and data.schema[x].is_numeric()
+        and data.schema[y].is_numeric()
+    )
+
+
+def _rasterize(data: pl.DataFrame, glyph: bm.Glyph) -> BudgetDecision:
+    x_name, y_name = _field_name(glyph.x), _field_name(glyph.y)
+    xy = data.select(
+        pl.col(x_name).cast(pl.Float64), pl.col(y_name).cast(pl.Float64)
+    ).drop_nulls()
+    x, y = xy[x_name].to_numpy(), xy[y_name].to_numpy()
+    finite = np.isfinite(x) & np.isfinite(y)
+    x, y = x[finite], y[finite]
+    if x.size == 0:
+        return BudgetDecision(data=data.clear(), glyph=glyph, action="rasterize")
+
+    x_min, x_max = float(x.min()), float(x.max())
+    y_min, y_max = float(y.min()), float(y.max())
+    # 避免所有点落在同一个位置时宽度为 0
+    dw = (x_max - x_min) or 1.0
+    dh = (y_max - y_min) or 1.0
+    n_rows, n_cols = RASTER_SHAPE
+    counts, _, _ = np.histogram2d(
+        y, x, bins=(n_rows, n_cols), range=((y_min, y_min + dh), (x_min, x_min + dw))
+    )
+    image = np.where(counts > 0, counts, np.nan)
+    mapper = bm.LogColorMapper(palette=Viridis256, nan_color="rgba(0, 0, 0, 0)")
+    return BudgetDecision(
+        data=data.clear(),
+        glyph=bm.Image(
+            image="image", x="x", y="y", dw="dw", dh="dh", color_mapper=mapper
+        ),
+        action="rasterize",
+        # 二维数组无法放在 polars 的列中，直接作为 CDS 的数据
+        source_data={
+            "image": [image],
+            "x": [x_min],
+            "y": [y_min],
+            "dw": [dw],
+            "dh": [dh],
+        },
+    )
+
+
+def _shrink(
+    data: pl.DataFrame, n: int, policy: BudgetPolicy
+) -> tuple[pl.DataFrame, str]:
+    if n >= data.height:
+        return data, "none"
+    if policy == "sample":
+        # 固定 seed 保证同一份数据的输出稳定，并保持原有顺序
+        return data.sample(n, seed=0, shuffle=False), f"sample {data.height} -> {n}"
+    # downsample: 等间隔抽取，保留数据的顺序 (适合 Line 等有序的 glyph)
+    step = -(-data.height // max(n, 1))
+    sampled = data.gather_every(step)
+    return sampled, f"downsample {data.height} -> {sampled.height}"
+
+
+def _check_renderers(
+    usage: _BudgetUsage, figure: bm.Plot, policy: BudgetPolicy, label: str
+) -> bool:
+    """检查 figure 中 renderer 的数量，返回 False 时该 renderer 被跳过"""
+    budget = plotting_options.budget
+    n_renderers = usage.renderers.get(figure.id, 0)
+    if (
+        budget.max_renderers_per_figure is not None
+        and n_renderers >= budget.max_renderers_per_figure
+    ):
+        message = (
+            f"Render budget exceeded for {label}: "
+            f"more than {budget.max_renderers_per_figure} renderers"
+        )
+        if policy == "raise":
+            raise RenderBudgetExceededError(message)
+        logger.warning(f"{message} (policy={policy})")
+        if policy != "warn":
+            logger.warning(f"Renderer {label} skipped")
+            return False
+    return True
+
+
+def apply_shared_render_budget(
+    glyph: bm.Glyph, figure: bm.Plot, name: str | None = None
+) -> bool:
+    """复用已有 source 的 renderer 只计入 renderer 的数量，字节数在创建 source 时已经计入
+
+    返回 False 时该 renderer 被跳过
+    """
+    usage = _usage.get() or _BudgetUsage()
+    label = name or type(glyph).__name__
+    if not _check_renderers(usage, figure, plotting_options.budget.policy, label):
+        return False
+    usage.renderers[figure.id] = usage.renderers.get(figure.id, 0) + 1
+    return True
+
+
+def will_rasterize(data: pl.DataFrame, glyph: bm.Glyph) -> bool:
+    """`apply_render_budget` 是否会把该 renderer 栅格化，只做判断，不计入用量"""
+    budget = plotting_options.budget
+    if budget.policy != "rasterize" or not _can_rasterize(data, glyph):
+        return False
+    if (
+        budget.max_points_per_renderer is not None
+        and data.height > budget.max_points_per_renderer
+    ):
+        return True
+    if budget.max_total_cds_bytes is not None:
+        usage = _usage.get() or _BudgetUsage()
+        remaining = budget.max_total_cds_bytes - usage.total_bytes
+        return 0 < remaining < data.estimated_size()
+    return False
+
+
+def apply_render_budget(
+    data: pl.DataFrame,
+    glyph: bm.Glyph,
+    figure: bm.Plot,
+    name: str | None = None,
+    source_data: dict[str, Any] | None = None,
+) -> BudgetDecision:
+    """按照 `plotting_options.budget` 检查即将生成的 renderer
+
+    超出限制时根据 policy 处理，所有处理都会记录在日志中。
+    `source_data` 为无法放在 polars 中的 CDS 数据 (例如图片)，只计入字节数，不会被缩小
+    """
+    budget = plotting_options.budget
+    policy = budget.policy
+    usage = _usage.get() or _BudgetUsage()
+    label = name or type(glyph).__name__
+
+    def _exceeded(reason: str) -> None:
+        message = f"Render budget exceeded for {label}: {reason}"
+        if policy == "raise":
+            raise RenderBudgetExceededError(message)
+        logger.warning(f"{message} (policy={policy})")
+
+    decision = BudgetDecision(data=data, glyph=glyph, source_data=source_data)
+
+    if not _check_renderers(usage, figure, policy, label):
+        decision.data, decision.action = None, "skip"
+        return decision
+
+    if (
+        budget.max_points_per_renderer is not None
+        and source_data is None
+        and data.height > budget.max_points_per_renderer
+    ):
+        _exceeded(f"{data.height} points > {budget.max_points_per_renderer}")
+        decision = _degrade(decision, budget.max_points_per_renderer, policy, label)
+
+    if budget.max_total_cds_bytes is not None and decision.data is not None:
+        remaining = budget.max_total_cds_bytes - usage.total_bytes
+        n_bytes = decision.estimated_size()
+        if n_bytes > remaining:
+            _exceeded(
+                f"{usage.total_bytes + n_bytes} bytes > {budget.max_total_cds_bytes}"
+            )
+            if policy != "warn" and remaining <= 0:
+                logger.warning(f"Renderer {label} skipped")
+                decision.data, decision.action = None, "skip"
+                return decision
+            # 栅格化后的图片大小固定，无法再缩小
+            if decision.source_data is None:
+                n = int(decision.data.height * max(remaining, 0) / max(n_bytes, 1))
+                decision = _degrade(decision, n, policy, label)
+
+    if decision.data is not None:
+        usage.total_bytes += decision.estimated_size()
+        usage.renderers[figure.id] = usage.renderers.get(figure.id, 0) + 1
+    return decision
+
+
+def _degrade(
+    decision: BudgetDecision, n: int, policy: BudgetPolicy, label: str
+) -> BudgetDecision:
+    assert decision.data is not None
+    if policy == "warn":
+        return decision
+
+    if policy == "rasterize":
+        if _can_rasterize(decision.data, decision.glyph):
+            logger.warning(
+                f"Renderer {label} rasterized: {decision.data.height} points -> "
+                f"{RASTER_SHAPE[0]}x{RASTER_SHAPE[1]} image"
+            )
+            return _rasterize(decision.data, decision.glyph)
+        logger.warning(
+            f"Renderer {label} ({type(decision.glyph).__name__}) could not be "
+            "rasterized, fallback to downsample"
+        )
+        policy = "downsample"
+
+    data, action = _shrink(decision.data, n, policy)
+    if action != "none":
+        logger.warning(f"Renderer {label}: {action}")
+    return BudgetDecision(data=data, glyph=decision.glyph, action=policy)
@@ -12,13 +12,46 @@
 #
 # Copyright (c) 2024 Maspectra Dev Team
 ############################################################
-from mas.libs.phanpy.plotting.composable.glyphs.abstract import GlyphSpec
-from mas.libs.phanpy.plotting.composable.glyphs.area import HArea, Rectangle, VArea
-from mas.libs.phanpy.plotting.composable.glyphs.bar import HBar, VBar
-from mas.libs.phanpy.plotting.composable.glyphs.line import HLine, Line, VLine
-from mas.libs.phanpy.plotting.composable.glyphs.scatter import Scatter
-from mas.libs.phanpy.plotting.composable.glyphs.step import Step
-from mas.libs.phanpy.plotting.composable.glyphs.text import Text
+import importlib
+import typing
+
+if typing.TYPE_CHECKING:
+    from mas.libs.phanpy.plotting.composable.glyphs.abstract import GlyphSpec
+    from mas.libs.phanpy.plotting.composable.glyphs.area import HArea, Rectangle, VArea
+    from mas.libs.phanpy.plotting.composable.glyphs.bar import HBar, VBar
+    from mas.libs.phanpy.plotting.composable.glyphs.line import HLine, Line, VLine
+    from mas.libs.phanpy.plotting.composable.glyphs.scatter import Scatter
+    from mas.libs.phanpy.plotting.composable.glyphs.step import Step
+    from mas.libs.phanpy.plotting.composable.glyphs.text import Text
+
+_LAZY_ATTRS: dict[str, str] = {
+    "GlyphSpec": "mas.libs.phanpy.plotting.composable.glyphs.abstract",
+    "HArea": "mas.libs.phanpy.plotting.composable.glyphs.area",
+    "HBar": "mas.libs.phanpy.plotting.composable.glyphs.bar",
+    "HLine": "mas.libs.phanpy.plotting.composable.glyphs.line",
+    "Line": "mas.libs.phanpy.plotting.composable.glyphs.line",
+    "Rectangle": "mas.libs.phanpy.plotting.composable.glyphs.area",
+    "Scatter": "mas.libs.phanpy.plotting.composable.glyphs.scatter",
+    "Step": "mas.libs.phanpy.plotting.composable.glyphs.step",
+    "Text": "mas.libs.phanpy.plotting.composable.glyphs.text",
+    "VArea": "mas.libs.phanpy.plotting.composable.glyphs.area",
+    "VBar": "mas.libs.phanpy.plotting.composable.glyphs.bar",
+    "VLine": "mas.libs.phanpy.plotting.composable.glyphs.line",
+}
+
+
+def __getattr__(name: str) -> typing.Any:
+    module_name = _LAZY_ATTRS.get(name, None)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted([*globals(), *_LAZY_ATTRS])
+
 
 __all__ = [
     "GlyphSpec",
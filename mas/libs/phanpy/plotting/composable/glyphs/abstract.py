@@ -24,6 +24,7 @@ from mas.libs.phanpy.plotting.field import (
     FieldSpecConstructorCls,
     get_field_props,
     handle_spec_constructor,
+    materialize_field_props,
 )
 from mas.libs.phanpy.plotting.render import (
     GlyphLegendSpec,
@@ -48,6 +49,10 @@ class GlyphSpec(CopyTrait, abc.ABC):
         self.__legend = legend
         self.__tooltip_template: pl.Expr | Literal[False] | None = tooltip_template
 
+    def __deepcopy_memo__(self) -> list[int]:
+        # pl.Expr 是不可变的，复制时共享同一个对象，便于按 id 缓存 data spec 的解析结果
+        return [id(v) for v in self.__dict__.values() if isinstance(v, pl.Expr)]
+
     @property
     def name(self) -> str | None:
         return self.__name
@@ -104,6 +109,8 @@ class GlyphSpec(CopyTrait, abc.ABC):
             tooltip_template = None
         else:
             tooltip_template = self.__tooltip_template
+        # 计算列 (例如依赖多个输入列的表达式) 先计算为临时列，再按列分组
+        props, data = materialize_field_props(props, data)
         field_props = get_field_props(props)
         if len(field_props) == 0:
             render_glyph(
@@ -118,7 +125,9 @@ class GlyphSpec(CopyTrait, abc.ABC):
             return
 
         field_names = {c.column_name for c in field_props.values()}
-        grouped = data.group_by(field_names).agg(pl.all())
+        field_labels = {c.column_name: c.label for c in field_props.values()}
+        # 保持分组的顺序，facet 的各个子图按相同的顺序渲染 (见 SharedFacetSources)
+        grouped = data.group_by(field_names, maintain_order=True).agg(pl.all())
         props_to_reduce: dict[str, str] = {}
         for k, v in props.items():
             if isinstance(v, FieldSpecConstructorCls):
@@ -148,9 +157,9 @@ class GlyphSpec(CopyTrait, abc.ABC):
                         *[
                             pl.concat_str(
                                 pl.lit("<br>"),
-                                pl.format("{}={}", pl.lit(name), pl.col(name)),
+                                pl.format("{}={}", pl.lit(label), pl.col(name)),
                             )
-                            for name in field_names
+                            for name, label in field_labels.items()
                         ],
                     )
                     if tooltip_template is not None
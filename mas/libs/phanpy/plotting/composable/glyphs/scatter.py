@@ -12,22 +12,26 @@
 #
 # Copyright (c) 2024 Maspectra Dev Team
 ############################################################
-from typing import Any
+from typing import Any, TypedDict
 
 import bokeh.models as bm
 import polars as pl
 from bokeh.core.property.vectorization import Field as BokehField
+from bokeh.core.property.vectorization import value
 from typing_extensions import NotRequired, Self, Unpack
 
 from mas.libs.phanpy.plotting.composable.glyphs.abstract import (
     GlyphSpec,
     RenderLevelType,
 )
-from mas.libs.phanpy.plotting.facet import FacetFilter
+from mas.libs.phanpy.plotting.facet import FacetFilter, apply_facet_filter
+from mas.libs.phanpy.plotting.factor import as_factor_columns, ensure_factors
 from mas.libs.phanpy.plotting.field import (
     DataSpec,
+    expr_column_name,
     get_field_props,
     interpret_data_spec,
+    materialize_field_props,
     replace_field_props,
 )
 from mas.libs.phanpy.plotting.props import (
@@ -37,6 +41,11 @@ from mas.libs.phanpy.plotting.props import (
     MarkerProps,
 )
 from mas.libs.phanpy.plotting.render import typesafe_glyph_legend
+from mas.libs.phanpy.plotting.sampling import (
+    SamplingResult,
+    SamplingStrategy,
+    sample_rows,
+)
 from mas.libs.phanpy.plotting.traits import (
     FillStyleableTrait,
     LineStyleableTrait,
@@ -53,6 +62,14 @@ class ScatterGlyphStyles(
     jitter: NotRequired[JitterProps]
 
 
+class ScatterSamplingProps(TypedDict):
+    n: int
+    strategy: NotRequired[SamplingStrategy]
+    seed: NotRequired[int]
+    # 是否在图例中显示抽样比例
+    show_ratio: NotRequired[bool]
+
+
 class Scatter(
     GlyphSpec,
     LineStyleableTrait[ScatterGlyphStyles],
@@ -81,6 +98,7 @@ class Scatter(
         self._x = x
         self._y = y
         self._styles = styles or self.Styles()
+        self._sampling: ScatterSamplingProps | None = None
 
     def with_jitter(self, **props: Unpack[JitterProps]) -> Self:
         self_ = self.copy()
@@ -89,6 +107,17 @@ class Scatter(
         self_._styles["jitter"] = jitter_styles
         return self_
 
+    def with_sampling(self, **props: Unpack[ScatterSamplingProps]) -> Self:
+        """点数超过 `n` 时先在 polars 中抽样再绘制
+
+        - stratified: 按样式中映射的列 (颜色、marker 等) 分层，少数类全部保留
+        - reservoir: 均匀抽样
+        - density: 按 x/y 网格分层，稀疏区域和离群点全部保留
+        """
+        self_ = self.copy()
+        self_._sampling = props
+        return self_
+
     def _draw(
         self,
         figure: bm.Plot,
@@ -97,17 +126,44 @@ class Scatter(
         facet_filter: FacetFilter | None,
         level: RenderLevelType = "glyph",
     ) -> None:
+        styles: dict[str, Any] = {**self._styles}
+        jitter_styles: JitterProps = styles.pop("jitter", None)
+
+        sampled: SamplingResult | None = None
+        source = data
         data, (x, y) = interpret_data_spec(
             data=data,
             x=self._x,
             y=self._y,
         )
+        # categorical 轴没有指定 factors 时，从 (未按 facet 过滤的) 数据中推断
+        factor_columns: list[str] = []
+        if isinstance(figure.x_scale, bm.CategoricalScale):
+            ensure_factors(figure.x_range, data, x, source=source, spec=(self._x,))
+            factor_columns.append(x)
+        if isinstance(figure.y_scale, bm.CategoricalScale):
+            ensure_factors(figure.y_range, data, y, source=source, spec=(self._y,))
+            factor_columns.append(y)
+        if self._sampling is not None:
+            styles, data = materialize_field_props(styles, data)
+            # 先过滤 facet，保证每个子图中的点数不超过 n
+            data = apply_facet_filter(data, facet_filter)
+            facet_filter = None
+            sampled = self._sample(self._sampling, data, styles, x=x, y=y)
+            data = sampled.data
+        data = as_factor_columns(data, *factor_columns)
+        x_label, y_label = (
+            expr_column_name(spec)[1] if isinstance(spec, pl.Expr) else name
+            for spec, name in ((self._x, x), (self._y, y))
+        )
         default_tooltip_template = pl.concat_str(
-            pl.lit(f"{x}="), pl.col(x), pl.lit("<br>"), pl.lit(f"{y}="), pl.col(y)
+            pl.lit(f"{x_label}="),
+            pl.col(x),
+            pl.lit("<br>"),
+            pl.lit(f"{y_label}="),
+            pl.col(y),
         )
-        styles: dict[str, Any] = {**self._styles}
 
-        jitter_styles: JitterProps = styles.pop("jitter", None)
         field_props = get_field_props(styles)
         styles, data = replace_field_props(styles, data=data)
         fill_color = styles.get("fill_color", None)
@@ -148,10 +204,11 @@ class Scatter(
             default_tooltip_template = pl.concat_str(
                 default_tooltip_template,
                 pl.lit("<br>"),
-                pl.lit(f"{field_spec_constructor.column_name}="),
+                pl.lit(f"{field_spec_constructor.label}="),
                 pl.col(field_spec_constructor.column_name),
             )
 
+        n_renderers = len(figure.renderers)
         self.render_glyph(
             figure=figure,
             legend=legend,
@@ -162,3 +219,41 @@ class Scatter(
             level=level,
             default_tooltip_template=default_tooltip_template,
         )
+        if (
+            legend is not None
+            and sampled is not None
+            and sampled.ratio < 1
+            and self._sampling is not None
+            and self._sampling.get("show_ratio", True)
+        ):
+            legend.items.append(
+                bm.LegendItem(
+                    label=value(sampled.describe()),
+                    renderers=figure.renderers[n_renderers:],
+                )
+            )
+
+    def _sample(
+        self,
+        sampling: ScatterSamplingProps,
+        data: pl.DataFrame,
+        styles: dict[str, Any],
+        x: str,
+        y: str,
+    ) -> SamplingResult:
+        by = [
+            name
+            for name in dict.fromkeys(
+                c.column_name for c in get_field_props(styles).values()
+            )
+            if name in data.columns
+        ]
+        return sample_rows(
+            data,
+            n=sampling["n"],
+            strategy=sampling.get("strategy", "stratified"),
+            by=by,
+            x=x,
+            y=y,
+            seed=sampling.get("seed", 0),
+        )
@@ -19,9 +19,10 @@ import polars as pl
 from typing_extensions import NotRequired, Self, Sequence, Unpack
 
 from mas.libs.phanpy.plotting.composable.glyphs import GlyphSpec
-from mas.libs.phanpy.plotting.facet import FacetFilter
+from mas.libs.phanpy.plotting.facet import FacetFilter, facet_draw_scope
 from mas.libs.phanpy.plotting.layer.plot import Plot as BasePlot
 from mas.libs.phanpy.plotting.layer.plot import PlotConstructorProps
+from mas.libs.phanpy.plotting.profile import profile_stage
 from mas.libs.phanpy.types.typeddict import keysafe_typeddict
 
 
@@ -55,9 +56,13 @@ class Plot(BasePlot):
         facet_filter: FacetFilter | None,
     ) -> None:
         for glyph in self._glyphs:
-            glyph._draw(
-                figure=figure,
-                legend=legend,
-                data=data,
-                facet_filter=facet_filter,
-            )
+            with (
+                profile_stage("glyph", name=glyph.name or type(glyph).__name__),
+                facet_draw_scope(),
+            ):
+                glyph._draw(
+                    figure=figure,
+                    legend=legend,
+                    data=data,
+                    facet_filter=facet_filter,
+                )
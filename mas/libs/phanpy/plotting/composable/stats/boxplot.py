@@ -24,11 +24,17 @@ from mas.libs.phanpy.plotting.composable.glyphs.bar import BarGlyphStyles
 from mas.libs.phanpy.plotting.composable.plot import Plot
 from mas.libs.phanpy.plotting.constants import m_internal
 from mas.libs.phanpy.plotting.facet import FacetFilter, split_facet_filter_for_stats
+from mas.libs.phanpy.plotting.factor import (
+    as_factor_columns,
+    categorical_side,
+    ensure_factors,
+)
 from mas.libs.phanpy.plotting.field import (
     DataSpec,
     field_,
     get_field_props,
     interpret_data_spec,
+    materialize_field_props,
     replace_field_props,
 )
 from mas.libs.phanpy.plotting.layer.plot import PlotConstructorProps
@@ -91,6 +97,17 @@ class BoxPlotConstructorProps(BoxPlotSpec, RawBoxPlotConstructorProps):
     pass
 
 
+class BoxPlotStatsSpec(TypedDict):
+    """已经计算好的统计量，每一行为一个 box"""
+
+    q1: DataSpec
+    q3: DataSpec
+    lower: DataSpec
+    upper: DataSpec
+    # 每个 box 的离群值 (list 列)
+    outliers: NotRequired[DataSpec]
+
+
 class BoxPlot(
     Plot,
     FillStyleableTrait[BarGlyphStyles],
@@ -105,6 +122,41 @@ class BoxPlot(
         super().__init__(**props)
         self._spec = keysafe_typeddict(props, BoxPlotSpec)
         self._styles = keysafe_typeddict(props, BarGlyphStyles) or BoxPlot.Styles()
+        self._stats: BoxPlotStatsSpec | None = None
+
+    @classmethod
+    def from_stats(
+        cls,
+        q1: DataSpec,
+        q2: DataSpec,
+        q3: DataSpec,
+        lower: DataSpec,
+        upper: DataSpec,
+        outliers: DataSpec | None = None,
+        *,
+        x: DataSpec | None = None,
+        y: DataSpec | None = None,
+        hover_template: BoxPlotHoverTemplate | None = None,
+        **props: Unpack[RawBoxPlotConstructorProps],
+    ) -> Self:
+        """使用已经计算好的统计量 (例如数据库中的聚合结果)，`data` 中每一行为一个 box
+
+        分类列通过 `x` (竖直的 box) 或者 `y` (水平的 box) 指定
+        """
+        if (x is None) == (y is None):
+            raise ValueError("Exactly one of x/y must be provided as the category")
+        # 中位数作为数值轴的 data spec，用于判断 box 的方向
+        if x is not None:
+            self_ = cls(x=x, y=q2, **props)
+        else:
+            assert y is not None
+            self_ = cls(x=q2, y=y, **props)
+        if hover_template is not None:
+            self_._spec["hover_template"] = hover_template
+        self_._stats = BoxPlotStatsSpec(q1=q1, q3=q3, lower=lower, upper=upper)
+        if outliers is not None:
+            self_._stats["outliers"] = outliers
+        return self_
 
     def __call__(
         self,
@@ -120,20 +172,31 @@ class BoxPlot(
         )
 
         styles_d: dict[str, Any] = {"fill_alpha": 1, **self._styles}
+        styles_d, data = materialize_field_props(styles_d, data)
         field_props = get_field_props(styles_d)
 
-        if data[x_name].dtype.is_numeric() and not data[y_name].dtype.is_numeric():
+        if categorical_side(figure, data, x_name, y_name) == "y":
             # 对 x 进行统计
             stats_on_name = x_name
             cat_on_name = y_name
+            cat_on_spec = self._spec["y"]
             dimension = "width"
-        elif not data[x_name].dtype.is_numeric() and data[y_name].dtype.is_numeric():
+        else:
             # 对 y 进行统计
             stats_on_name = y_name
             cat_on_name = x_name
+            cat_on_spec = self._spec["x"]
             dimension = "height"
-        else:
-            raise ValueError("x/y must be a numeric/categorical pair")
+
+        # 没有指定 factors 时从 (未按 facet 过滤的) 数据中推断，各子图保持一致
+        ensure_factors(
+            figure.x_range if dimension == "height" else figure.y_range,
+            data,
+            cat_on_name,
+            source=self._data,
+            spec=(cat_on_spec,),
+        )
+        data = as_factor_columns(data, cat_on_name)
 
         q1_name = m_internal("mas.boxplot.q1")
         q2_name = m_internal("mas.boxplot.q2")
@@ -148,9 +211,6 @@ class BoxPlot(
         else:
             by = []
 
-        range_min = data[stats_on_name].nan_min()
-        range_max = data[stats_on_name].nan_max()
-
         group_columns = set([cat_on_name, *by])
         group_name = ",".join(set(group_columns))
 
@@ -162,23 +222,58 @@ class BoxPlot(
             facet_filter, group_columns
         )
         data = apply_facet_filter(data, stats_facet_filter)
-        stats_data = (
-            data.lazy()
-            .group_by(*group_columns)
-            .agg(
-                pl.col(stats_on_name),
-                pl.col(stats_on_name).quantile(q1_level).alias(q1_name),
-                pl.col(stats_on_name).quantile(q2_level).alias(q2_name),
-                pl.col(stats_on_name).quantile(q3_level).alias(q3_name),
+        if self._stats is None:
+            range_min = data[stats_on_name].nan_min()
+            range_max = data[stats_on_name].nan_max()
+            stats_data = (
+                data.lazy()
+                .group_by(*group_columns)
+                .agg(
+                    pl.col(stats_on_name),
+                    pl.col(stats_on_name).quantile(q1_level).alias(q1_name),
+                    pl.col(stats_on_name).quantile(q2_level).alias(q2_name),
+                    pl.col(stats_on_name).quantile(q3_level).alias(q3_name),
+                )
+                .with_columns(
+                    (pl.col(q3_name) - pl.col(q1_name)).alias(iqr_name),
+                )
+                .with_columns(
+                    (pl.col(q3_name) + q_outlier_level * pl.col(iqr_name)).alias(
+                        qmax_name
+                    ),
+                    (pl.col(q3_name) - q_outlier_level * pl.col(iqr_name)).alias(
+                        qmin_name
+                    ),
+                )
             )
-            .with_columns(
-                (pl.col(q3_name) - pl.col(q1_name)).alias(iqr_name),
+        else:
+            # 已经计算好的统计量，直接整理为与上面相同的列，离群值放在 stats_on_name 中
+            named_spec: dict[str, Any] = {**self._stats}
+            data, names = interpret_data_spec(data=data, **named_spec)
+            columns = dict(zip(named_spec.keys(), names))
+            outliers = (
+                pl.col(columns["outliers"]).cast(pl.List(pl.Float64))
+                if "outliers" in columns
+                else pl.lit(None, dtype=pl.List(pl.Float64))
             )
-            .with_columns(
-                (pl.col(q3_name) + q_outlier_level * pl.col(iqr_name)).alias(qmax_name),
-                (pl.col(q3_name) - q_outlier_level * pl.col(iqr_name)).alias(qmin_name),
+            stats_data = data.lazy().select(
+                *group_columns,
+                pl.col(columns["q1"]).alias(q1_name),
+                pl.col(stats_on_name).alias(q2_name),
+                pl.col(columns["q3"]).alias(q3_name),
+                (pl.col(columns["q3"]) - pl.col(columns["q1"])).alias(iqr_name),
+                pl.col(columns["upper"]).alias(qmax_name),
+                pl.col(columns["lower"]).alias(qmin_name),
+                outliers.alias(stats_on_name),
             )
-        )
+            outlier_values = stats_data.select(
+                pl.col(stats_on_name).explode()
+            ).collect()[stats_on_name]
+            range_min = outlier_values.nan_min()
+            range_max = outlier_values.nan_max()
+            if range_min is None or range_max is None:
+                range_min = data[stats_on_name].nan_min()
+                range_max = data[stats_on_name].nan_max()
         if group_name not in stats_data.collect_schema().names():
             stats_data = stats_data.with_columns(
                 pl.concat_str(
@@ -228,7 +323,7 @@ class BoxPlot(
                 pl.format("q(max)={}", pl.col(qmax_name)),
             )
 
-        for _, grouped_df in stats_data.group_by(cat_on_name):
+        for _, grouped_df in stats_data.group_by(cat_on_name, maintain_order=True):
             if len(by) > 0:
                 grouped_df = grouped_df.sort(*by)
             n_subgroups = grouped_df.height
@@ -0,0 +1,292 @@
+import math
+from dataclasses import dataclass
+from typing import Any, Literal, TypedDict
+
+import bokeh.models as bm
+import numpy as np
+import numpy.typing as npt
+import polars as pl
+from typing_extensions import NotRequired, Unpack
+
+from mas.libs.phanpy.plotting.composable.glyphs.area import VArea, VAreaGlyphStyles
+from mas.libs.phanpy.plotting.composable.plot import Plot
+from mas.libs.phanpy.plotting.constants import m_internal
+from mas.libs.phanpy.plotting.facet import (
+    FacetFilter,
+    apply_facet_filter,
+    split_facet_filter_for_stats,
+)
+from mas.libs.phanpy.plotting.field import (
+    StrictDataSpec,
+    get_field_props,
+    interpret_data_spec,
+    materialize_field_props,
+)
+from mas.libs.phanpy.plotting.layer.plot import PlotConstructorProps
+from mas.libs.phanpy.plotting.traits import FillStyleableTrait
+from mas.libs.phanpy.types.primitive import NumberLike
+from mas.libs.phanpy.types.typeddict import keysafe_typeddict
+
+BandwidthMethod = Literal["scott", "silverman"] | float
+
+
+@dataclass
+class GroupedKDE:
+    """分组的核密度估计结果
+
+    - `keys`: 每个分组的键
+    - `grid`: 所有分组共用的网格
+    - `density`: 形状为 (n_groups, gridsize)
+    - `support`: 每个分组有效的范围 (min - cut * bw, max + cut * bw)
+    """
+
+    keys: pl.DataFrame
+    grid: npt.NDArray[np.float64]
+    density: npt.NDArray[np.float64]
+    bandwidth: npt.NDArray[np.float64]
+    support: npt.NDArray[np.float64]
+    n: npt.NDArray[np.int64]
+
+
+def _bandwidth(
+    std: npt.NDArray[np.float64],
+    iqr: npt.NDArray[np.float64],
+    n: npt.NDArray[np.int64],
+    method: BandwidthMethod,
+) -> npt.NDArray[np.float64]:
+    if not isinstance(method, str):
+        return np.full(std.shape, float(method))
+    factor = np.power(np.maximum(n, 1), -0.2)
+    if method == "scott":
+        bw = 1.059 * std * factor
+    else:
+        # silverman
+        spread = np.where(iqr > 0, np.minimum(std, iqr / 1.349), std)
+        bw = 0.9 * spread * factor
+    # 只有一个值或者所有值都相同时，给一个很小的带宽
+    return np.where(bw > 0, bw, 1e-3 * np.maximum(np.abs(std), 1.0))
+
+
+def grouped_kde(
+    data: pl.DataFrame,
+    value: str,
+    by: list[str],
+    gridsize: int = 256,
+    bw_method: BandwidthMethod = "scott",
+    cut: float = 3.0,
+) -> GroupedKDE:
+    """对每个分组计算高斯核密度估计
+
+    先把所有分组一次性线性分箱到共用的网格上 (O(n))，再用 FFT 做卷积
+    (O(g log g))，避免直接计算的 O(n * g)
+    """
+    data = data.filter(pl.col(value).is_not_null() & pl.col(value).is_not_nan())
+    group_id = m_internal("mas.kde.group_id")
+    if len(by) > 0:
+        keys = data.select(by).unique(maintain_order=True).sort(by)
+        data = data.join(keys.with_row_index(group_id), on=by, how="left")
+    else:
+        keys = pl.DataFrame()
+        data = data.with_columns(pl.lit(0, dtype=pl.UInt32).alias(group_id))
+    n_groups = max(keys.height, 1)
+
+    stats = (
+        data.group_by(group_id)
+        .agg(
+            pl.len().alias("n"),
+            pl.col(value).std().fill_null(0).alias("std"),
+            (
+                pl.col(value).quantile(0.75, "linear")
+                - pl.col(value).quantile(0.25, "linear")
+            ).alias("iqr"),
+            pl.col(value).min().alias("min"),
+            pl.col(value).max().alias("max"),
+        )
+        .sort(group_id)
+    )
+    n = np.zeros(n_groups, dtype=np.int64)
+    std = np.zeros(n_groups)
+    iqr = np.zeros(n_groups)
+    low = np.full(n_groups, np.nan)
+    high = np.full(n_groups, np.nan)
+    index = stats[group_id].to_numpy()
+    n[index] = stats["n"].to_numpy()
+    std[index] = stats["std"].to_numpy()
+    iqr[index] = stats["iqr"].to_numpy()
+    low[index] = stats["min"].to_numpy()
+    high[index] = stats["max"].to_numpy()
+
+    bandwidth = _bandwidth(std, iqr, n, bw_method)
+    support = np.stack([low - cut * bandwidth, high + cut * bandwidth], axis=1)
+    if data.height == 0:
+        grid = np.linspace(0, 1, gridsize)
+        return GroupedKDE(
+            keys=keys,
+            grid=grid,
+            density=np.zeros((n_groups, gridsize)),
+            bandwidth=bandwidth,
+            support=support,
+            n=n,
+        )
+
+    grid_min = float(np.nanmin(support[:, 0]))
+    grid_max = float(np.nanmax(support[:, 1]))
+    grid = np.linspace(grid_min, grid_max, gridsize)
+    delta = grid[1] - grid[0]
+
+    # 线性分箱: 每个点按距离分配到相邻的两个格点上
+    values = data[value].cast(pl.Float64).to_numpy()
+    gid = data[group_id].cast(pl.Int64).to_numpy()
+    pos = (values - grid_min) / delta
+    left = np.clip(np.floor(pos).astype(np.int64), 0, gridsize - 2)
+    weight = pos - left
+    flat_left = gid * gridsize + left
+    counts = np.bincount(
+        flat_left, weights=1 - weight, minlength=n_groups * gridsize
+    ) + np.bincount(flat_left + 1, weights=weight, minlength=n_groups * gridsize)
+    counts = counts.reshape(n_groups, gridsize)
+
+    # 每个分组的高斯核，超过 4 倍带宽的部分忽略
+    half = int(min(gridsize - 1, math.ceil(4 * float(bandwidth.max()) / delta)))
+    offsets = np.arange(-half, half + 1) * delta
+    kernel = np.exp(-0.5 * (offsets[None, :] / bandwidth[:, None]) ** 2) / (
+        bandwidth[:, None] * math.sqrt(2 * math.pi)
+    )
+
+    size = 1 << math.ceil(math.log2(gridsize + 2 * half + 1))
+    convolved = np.fft.irfft(
+        np.fft.rfft(counts, size, axis=1) * np.fft.rfft(kernel, size, axis=1),
+        size,
+        axis=1,
+    )[:, half : half + gridsize]
+    density = np.maximum(convolved, 0) / np.maximum(n, 1)[:, None]
+
+    return GroupedKDE(
+        keys=keys,
+        grid=grid,
+        density=density,
+        bandwidth=bandwidth,
+        support=support,
+        n=n,
+    )
+
+
+class DensitySpec(TypedDict):
+    x: StrictDataSpec[NumberLike]
+    bw_method: NotRequired[BandwidthMethod]
+    gridsize: NotRequired[int]
+    cut: NotRequired[float]
+
+
+class DensityConstructorProps(
+    DensitySpec,
+    VAreaGlyphStyles,
+    PlotConstructorProps,
+):
+    pass
+
+
+class Density(
+    Plot,
+    FillStyleableTrait[VAreaGlyphStyles],
+):
+    """一维核密度估计曲线，每个分组分别归一化"""
+
+    Styles = VAreaGlyphStyles
+
+    def __init__(
+        self,
+        **props: Unpack[DensityConstructorProps],
+    ) -> None:
+        super().__init__(
+            **{
+                "y_ax": {
+                    "typ": "numeric",
+                    "range": (0, "auto"),
+                },
+                **keysafe_typeddict(props, PlotConstructorProps),
+            }
+        )
+        self._spec = keysafe_typeddict(props, DensitySpec)
+        self._styles = keysafe_typeddict(props, VAreaGlyphStyles) or Density.Styles()
+
+    def __call__(
+        self,
+        figure: bm.Plot,
+        legend: bm.Legend,
+        data: pl.DataFrame | None,
+        facet_filter: FacetFilter | None,
+    ) -> None:
+        data, (x_name,) = interpret_data_spec(data=self._data, x=self._spec["x"])
+
+        styles_d: dict[str, Any] = {"fill_alpha": 0.5, **self._styles}
+        styles_d, data = materialize_field_props(styles_d, data)
+        field_props = get_field_props(styles_d)
+        by = [*dict.fromkeys(c.column_name for c in field_props.values())]
+
+        stats_facet_filter, glyph_facet_filter = split_facet_filter_for_stats(
+            facet_filter, by
+        )
+        data = apply_facet_filter(data, stats_facet_filter)
+
+        kde = grouped_kde(
+            data,
+            x_name,
+            by=by,
+            gridsize=self._spec.get("gridsize", 256),
+            bw_method=self._spec.get("bw_method", "scott"),
+            cut=self._spec.get("cut", 3.0),
+        )
+
+        grid_name = m_internal("mas.density.x")
+        density_name = m_internal("mas.density.y")
+        zero_name = m_internal("mas.density.zero")
+        n_groups, gridsize = kde.density.shape
+        curves = pl.DataFrame(
+            {
+                grid_name: np.tile(kde.grid, n_groups),
+                density_name: kde.density.ravel(),
+                zero_name: np.zeros(n_groups * gridsize),
+            }
+        )
+        if len(by) > 0:
+            curves = pl.concat(
+                [kde.keys.select(pl.all().repeat_by(gridsize).explode()), curves],
+                how="horizontal",
+            )
+        # 只保留每个分组有效范围内的部分
+        lower = np.repeat(kde.support[:, 0], gridsize)
+        upper = np.repeat(kde.support[:, 1], gridsize)
+        grid = curves[grid_name].to_numpy()
+        curves = curves.filter(pl.Series((grid >= lower) & (grid <= upper)))
+        curves = apply_facet_filter(curves, glyph_facet_filter)
+
+        (
+            VArea(
+                x=pl.col(grid_name),
+                y1=pl.col(zero_name),
+                y2=pl.col(density_name),
+                name=",".join(by) or x_name,
+                **styles_d,
+            )
+            .with_hover_tooltip(
+                pl.format(
+                    f"{x_name}={{}}<br>density={{}}",
+                    pl.col(grid_name),
+                    pl.col(density_name),
+                )
+            )
+            ._draw(
+                figure=figure,
+                legend=legend,
+                data=curves,
+                facet_filter=None,
+            )
+        )
+
+        super().__call__(
+            figure=figure,
+            legend=legend,
+            data=data,
+            facet_filter=facet_filter,
+        )
@@ -0,0 +1,107 @@
+"""常用分布的分位数函数 (不依赖 scipy)"""
+
+import math
+
+import numpy as np
+import numpy.typing as npt
+
+# Acklam 有理函数近似的系数
+_A = (
+    -3.969683028665376e01,
+    2.209460984245205e02,
+    -2.759285104469687e02,
+    1.383577518672690e02,
+    -3.066479806614716e01,
+    2.506628277459239e00,
+)
+_B = (
+    -5.447609879822406e01,
+    1.615858368580409e02,
+    -1.556989798598866e02,
+    6.680131188771972e01,
+    -1.328068155288572e01,
+)
+_C = (
+    -7.784894002430293e-03,
+    -3.223964580411365e-01,
+    -2.400758277161838e00,
+    -2.549732539343734e00,
+    4.374664141464968e00,
+    2.938163982698783e00,
+)
+_D = (
+    7.784695709041462e-03,
+    3.224671290700398e-01,
+    2.445134137142996e00,
+    3.754408661907416e00,
+)
+_P_LOW = 0.02425
+
+_erfc = np.vectorize(math.erfc, otypes=[np.float64])
+
+
+def norm_ppf(p: npt.ArrayLike) -> npt.NDArray[np.float64]:
+    """标准正态分布的分位数函数
+
+    使用 Acklam 近似，再做一次 Halley 迭代，精度约 1e-15
+    """
+    p = np.asarray(p, dtype=np.float64)
+    z = np.full(p.shape, np.nan)
+
+    low = (p > 0) & (p < _P_LOW)
+    high = (p > 1 - _P_LOW) & (p < 1)
+    mid = (p >= _P_LOW) & (p <= 1 - _P_LOW)
+
+    q = np.sqrt(-2 * np.log(p[low]))
+    z[low] = (
+        ((((_C[0] * q + _C[1]) * q + _C[2]) * q + _C[3]) * q + _C[4]) * q + _C[5]
+    ) / ((((_D[0] * q + _D[1]) * q + _D[2]) * q + _D[3]) * q + 1)
+
+    q = np.sqrt(-2 * np.log(1 - p[high]))
+    z[high] = -(
+        ((((_C[0] * q + _C[1]) * q + _C[2]) * q + _C[3]) * q + _C[4]) * q + _C[5]
+    ) / ((((_D[0] * q + _D[1]) * q + _D[2]) * q + _D[3]) * q + 1)
+
+    q = p[mid] - 0.5
+    r = q * q
+    z[mid] = (
+        (((((_A[0] * r + _A[1]) * r + _A[2]) * r + _A[3]) * r + _A[4]) * r + _A[5])
+        * q
+        / (((((_B[0] * r + _B[1]) * r + _B[2]) * r + _B[3]) * r + _B[4]) * r + 1)
+    )
+
+    finite = low | high | mid
+    if finite.any():
+        zf = z[finite]
+        e = 0.5 * _erfc(-zf / math.sqrt(2)) - p[finite]
+        u = e * math.sqrt(2 * math.pi) * np.exp(zf * zf / 2)
+        z[finite] = zf - u / (1 + zf * u / 2)
+
+    z[p == 0] = -np.inf
+    z[p == 1] = np.inf
+    return z
+
+
+def t_ppf(p: npt.ArrayLike, df: npt.ArrayLike) -> npt.NDArray[np.float64]:
+    """Student t 分布的分位数函数
+
+    df = 1, 2 时使用解析解，其余使用 Cornish-Fisher 展开 (df >= 3 时相对误差约 0.1%)
+    """
+    p, df = np.broadcast_arrays(
+        np.asarray(p, dtype=np.float64), np.asarray(df, dtype=np.float64)
+    )
+    z = norm_ppf(p)
+    z2 = z * z
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = (
+            z
+            + z * (z2 + 1) / (4 * df)
+            + z * ((5 * z2 + 16) * z2 + 3) / (96 * df**2)
+            + z * (((3 * z2 + 19) * z2 + 17) * z2 - 15) / (384 * df**3)
+            + z
+            * ((((79 * z2 + 776) * z2 + 1482) * z2 - 1920) * z2 - 945)
+            / (92160 * df**4)
+        )
+        t = np.where(df == 1, np.tan(np.pi * (p - 0.5)), t)
+        t = np.where(df == 2, (2 * p - 1) / np.sqrt(2 * p * (1 - p)), t)
+    return np.where(df > 0, t, np.nan)
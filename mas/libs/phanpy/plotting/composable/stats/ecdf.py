@@ -0,0 +1,189 @@
+from dataclasses import dataclass
+from typing import Any, Protocol, TypedDict
+
+import bokeh.models as bm
+import polars as pl
+from typing_extensions import NotRequired, Self, Unpack
+
+from mas.libs.phanpy.plotting.composable.glyphs.line import LineGlyphStyles
+from mas.libs.phanpy.plotting.composable.glyphs.step import Step
+from mas.libs.phanpy.plotting.composable.plot import Plot
+from mas.libs.phanpy.plotting.constants import m_internal
+from mas.libs.phanpy.plotting.facet import (
+    FacetFilter,
+    apply_facet_filter,
+    split_facet_filter_for_stats,
+)
+from mas.libs.phanpy.plotting.field import (
+    StrictDataSpec,
+    get_field_props,
+    interpret_data_spec,
+    materialize_field_props,
+)
+from mas.libs.phanpy.plotting.layer.plot import PlotConstructorProps
+from mas.libs.phanpy.plotting.traits import LineStyleableTrait
+from mas.libs.phanpy.types.primitive import NumberLike
+from mas.libs.phanpy.types.typeddict import keysafe_typeddict
+
+# 每个分组默认最多保留的点数
+DEFAULT_MAX_POINTS = 2000
+
+
+def rank_within_groups(
+    data: pl.DataFrame,
+    value: str,
+    by: list[str],
+    rank_name: str,
+    n_name: str,
+    max_points: int | None = DEFAULT_MAX_POINTS,
+) -> pl.DataFrame:
+    """按 value 排序一次，得到每行在分组内的序号 (从 1 开始) 和分组大小
+
+    排序后各分组内部仍然有序，不需要再按分组列排序 (多列排序很慢)
+    分组大小超过 `max_points` 时按分位数等间隔抽取，保留首尾两点
+    """
+    rank = pl.int_range(1, pl.len() + 1, dtype=pl.Int64)
+    n = pl.len().cast(pl.Int64)
+    if len(by) > 0:
+        rank, n = rank.over(by), n.over(by)
+    data = (
+        data.lazy()
+        .filter(pl.col(value).is_not_null() & pl.col(value).is_not_nan())
+        .sort(value)
+        .with_columns(rank.alias(rank_name), n.alias(n_name))
+    )
+    if max_points is not None:
+        # rank * max_points // n 每增加 1 保留一个点，相当于按分位数等间隔抽取
+        bucket = pl.col(rank_name) * max_points // pl.col(n_name)
+        previous = (pl.col(rank_name) - 1) * max_points // pl.col(n_name)
+        data = data.filter(
+            (pl.col(n_name) <= max_points)
+            | (bucket != previous)
+            | (pl.col(rank_name) == 1)
+            | (pl.col(rank_name) == pl.col(n_name))
+        )
+    return data.collect()
+
+
+@dataclass
+class ECDFHoverTemplateParams:
+    value: pl.Expr
+    ecdf: pl.Expr
+    n: pl.Expr
+
+
+class ECDFHoverTemplate(Protocol):
+    def __call__(self, params: ECDFHoverTemplateParams) -> pl.Expr: ...
+
+
+class ECDFSpec(TypedDict):
+    x: StrictDataSpec[NumberLike]
+    # 为 True 时画 1 - F(x)
+    complementary: NotRequired[bool]
+    # 每个分组最多保留的点数，None 时不抽取
+    max_points: NotRequired[int | None]
+
+    hover_template: NotRequired[ECDFHoverTemplate]
+
+
+class ECDFConstructorProps(
+    ECDFSpec,
+    LineGlyphStyles,
+    PlotConstructorProps,
+):
+    pass
+
+
+class ECDF(
+    Plot,
+    LineStyleableTrait[LineGlyphStyles],
+):
+    """经验累积分布函数，样式中映射的列作为分组"""
+
+    Styles = LineGlyphStyles
+
+    def __init__(
+        self,
+        **props: Unpack[ECDFConstructorProps],
+    ) -> None:
+        super().__init__(**keysafe_typeddict(props, PlotConstructorProps))
+        self._spec = keysafe_typeddict(props, ECDFSpec)
+        self._styles = keysafe_typeddict(props, LineGlyphStyles) or ECDF.Styles()
+
+    def __call__(
+        self,
+        figure: bm.Plot,
+        legend: bm.Legend,
+        data: pl.DataFrame | None,
+        facet_filter: FacetFilter | None,
+    ) -> None:
+        data, (x_name,) = interpret_data_spec(data=self._data, x=self._spec["x"])
+
+        styles_d: dict[str, Any] = {**self._styles}
+        styles_d, data = materialize_field_props(styles_d, data)
+        field_props = get_field_props(styles_d)
+        by = [*dict.fromkeys(c.column_name for c in field_props.values())]
+
+        stats_facet_filter, glyph_facet_filter = split_facet_filter_for_stats(
+            facet_filter, by
+        )
+        data = apply_facet_filter(data, stats_facet_filter)
+
+        rank_name = m_internal("mas.ecdf.rank")
+        n_name = m_internal("mas.ecdf.n")
+        ecdf_name = m_internal("mas.ecdf.value")
+        ecdf = pl.col(rank_name) / pl.col(n_name)
+        if self._spec.get("complementary", False):
+            ecdf = 1 - ecdf
+        stats_data = rank_within_groups(
+            data.select(x_name, *by),
+            x_name,
+            by=by,
+            rank_name=rank_name,
+            n_name=n_name,
+            max_points=self._spec.get("max_points", DEFAULT_MAX_POINTS),
+        ).with_columns(ecdf.alias(ecdf_name))
+        stats_data = apply_facet_filter(stats_data, glyph_facet_filter)
+
+        hover_template = self._spec.get("hover_template", None)
+        if hover_template is not None:
+            tooltip_template = hover_template(
+                ECDFHoverTemplateParams(
+                    value=pl.col(x_name),
+                    ecdf=pl.col(ecdf_name),
+                    n=pl.col(n_name),
+                )
+            )
+        else:
+            tooltip_template = pl.format(
+                f"{x_name}={{}}<br>ecdf={{}}", pl.col(x_name), pl.col(ecdf_name)
+            )
+
+        (
+            Step(
+                x=pl.col(x_name),
+                y=pl.col(ecdf_name),
+                name=",".join(by) or x_name,
+                mode="after",
+                **styles_d,
+            )
+            .with_hover_tooltip(tooltip_template)
+            ._draw(
+                figure=figure,
+                legend=legend,
+                data=stats_data,
+                facet_filter=None,
+            )
+        )
+
+        super().__call__(
+            figure=figure,
+            legend=legend,
+            data=data,
+            facet_filter=facet_filter,
+        )
+
+    def with_hover_template(self, hover_callable: ECDFHoverTemplate) -> Self:
+        self_ = self.copy()
+        self_._spec["hover_template"] = hover_callable
+        return self_
@@ -0,0 +1,277 @@
+import math
+from dataclasses import dataclass
+from typing import Any, Literal, Protocol, Sequence, TypedDict
+
+import bokeh.models as bm
+import polars as pl
+from bokeh.util.hex import cartesian_to_axial
+from typing_extensions import NotRequired, Self, Unpack
+
+from mas.libs.phanpy.plotting.composable.plot import Plot
+from mas.libs.phanpy.plotting.constants import m_internal
+from mas.libs.phanpy.plotting.facet import (
+    FacetFilter,
+    apply_facet_filter,
+    split_facet_filter_for_stats,
+)
+from mas.libs.phanpy.plotting.field import (
+    StrictDataSpec,
+    field_,
+    get_field_props,
+    interpret_data_spec,
+    materialize_field_props,
+    replace_field_props,
+)
+from mas.libs.phanpy.plotting.layer.plot import PlotConstructorProps
+from mas.libs.phanpy.plotting.palette import NamedPaletteType, use_palette
+from mas.libs.phanpy.plotting.props import FillProps, LineProps
+from mas.libs.phanpy.plotting.render import render_glyph
+from mas.libs.phanpy.plotting.traits import FillStyleableTrait, LineStyleableTrait
+from mas.libs.phanpy.types.color import ColorLike
+from mas.libs.phanpy.types.primitive import NumberLike
+from mas.libs.phanpy.types.typeddict import keysafe_typeddict
+
+HexOrientation = Literal["pointytop", "flattop"]
+HexReduce = Literal["count", "sum", "mean", "median", "min", "max"]
+
+
+@dataclass
+class HexBinHoverTemplateParams:
+    q: pl.Expr
+    r: pl.Expr
+    value: pl.Expr
+
+
+class HexBinHoverTemplate(Protocol):
+    def __call__(self, params: HexBinHoverTemplateParams) -> pl.Expr: ...
+
+
+class HexBinGlyphStyles(FillProps, LineProps):
+    pass
+
+
+class HexBinSpec(TypedDict):
+    x: StrictDataSpec[NumberLike]
+    y: StrictDataSpec[NumberLike]
+    # 对 c 进行聚合，不提供时统计数量
+    c: NotRequired[StrictDataSpec[NumberLike]]
+    reduce: NotRequired[HexReduce]
+
+    # 六边形的大小 (中心到顶点的距离)，不提供时根据 gridsize 计算
+    size: NotRequired[float]
+    # x 方向上六边形的数量
+    gridsize: NotRequired[int]
+    orientation: NotRequired[HexOrientation]
+    aspect_scale: NotRequired[float]
+
+    palette: NotRequired[NamedPaletteType | Sequence[ColorLike]]
+    log: NotRequired[bool]
+
+    hover_template: NotRequired[HexBinHoverTemplate]
+
+
+class HexBinConstructorProps(
+    HexBinSpec,
+    HexBinGlyphStyles,
+    PlotConstructorProps,
+):
+    pass
+
+
+def hex_grid(
+    x: pl.Series,
+    y: pl.Series,
+    gridsize: int,
+    orientation: HexOrientation,
+) -> tuple[float, float]:
+    """根据数据范围计算 (size, aspect_scale)，使 x/y 方向上的六边形数量相近"""
+    x_extent = float(x.max() - x.min()) if x.len() > 0 else 0.0  # type: ignore[operator]
+    y_extent = float(y.max() - y.min()) if y.len() > 0 else 0.0  # type: ignore[operator]
+    x_extent = x_extent if x_extent > 0 and math.isfinite(x_extent) else 1.0
+    y_extent = y_extent if y_extent > 0 and math.isfinite(y_extent) else 1.0
+    aspect_scale = y_extent / x_extent
+    if orientation == "pointytop":
+        # 宽度为 sqrt(3) * size / aspect_scale
+        size = y_extent / (gridsize * math.sqrt(3))
+    else:
+        # 水平间距为 1.5 * size
+        size = x_extent / (gridsize * 1.5)
+    return size, aspect_scale
+
+
+class HexBin(
+    Plot,
+    LineStyleableTrait[HexBinGlyphStyles],
+    FillStyleableTrait[HexBinGlyphStyles],
+):
+    """二维分布的六边形分箱图
+
+    只向前端传递每个六边形的统计值，数据量和原始数据的行数无关
+    """
+
+    Styles = HexBinGlyphStyles
+
+    def __init__(
+        self,
+        **props: Unpack[HexBinConstructorProps],
+    ) -> None:
+        super().__init__(**keysafe_typeddict(props, PlotConstructorProps))
+        self._spec = keysafe_typeddict(props, HexBinSpec)
+        self._styles = keysafe_typeddict(props, HexBinGlyphStyles) or HexBin.Styles()
+
+    def __call__(
+        self,
+        figure: bm.Plot,
+        legend: bm.Legend,
+        data: pl.DataFrame | None,
+        facet_filter: FacetFilter | None,
+    ) -> None:
+        named_spec: dict[str, Any] = {"x": self._spec["x"], "y": self._spec["y"]}
+        if "c" in self._spec:
+            named_spec["c"] = self._spec["c"]
+        data, names = interpret_data_spec(data=self._data, **named_spec)
+        x_name, y_name = names[0], names[1]
+        c_name = names[2] if len(names) > 2 else None
+
+        reduce = self._spec.get("reduce", "count" if c_name is None else "mean")
+        if reduce != "count" and c_name is None:
+            raise ValueError(f"c must be provided with reduce='{reduce}'")
+        orientation = self._spec.get("orientation", "pointytop")
+
+        data = data.filter(
+            pl.col(x_name).is_not_null()
+            & pl.col(y_name).is_not_null()
+            & pl.col(x_name).is_not_nan()
+            & pl.col(y_name).is_not_nan()
+        )
+
+        # 网格根据全部数据计算，保证各个 facet 的网格一致
+        size = self._spec.get("size", None)
+        aspect_scale = self._spec.get("aspect_scale", None)
+        if size is None:
+            size, default_aspect_scale = hex_grid(
+                data[x_name],
+                data[y_name],
+                gridsize=self._spec.get("gridsize", 30),
+                orientation=orientation,
+            )
+            if aspect_scale is None:
+                aspect_scale = default_aspect_scale
+        if aspect_scale is None:
+            aspect_scale = 1.0
+
+        styles_d: dict[str, Any] = {**self._styles}
+        styles_d, data = materialize_field_props(styles_d, data)
+        field_props = get_field_props(styles_d)
+        by = [*dict.fromkeys(c.column_name for c in field_props.values())]
+
+        q_name = m_internal("mas.hexbin.q")
+        r_name = m_internal("mas.hexbin.r")
+        value_name = m_internal("mas.hexbin.value")
+        group_name = ",".join(by)
+
+        stats_facet_filter, glyph_facet_filter = split_facet_filter_for_stats(
+            facet_filter, by
+        )
+        # 统计值在全部数据上按 facet 分组计算，颜色的范围在各个 facet 之间一致
+        facet_keys = (
+            [*stats_facet_filter]
+            if stats_facet_filter and all(k in data.columns for k in stats_facet_filter)
+            else []
+        )
+
+        q, r = cartesian_to_axial(
+            data[x_name].cast(pl.Float64).to_numpy(),
+            data[y_name].cast(pl.Float64).to_numpy(),
+            size=size,
+            orientation=orientation,
+            aspect_scale=aspect_scale,
+        )
+        value_expr = (
+            pl.len() if c_name is None else getattr(pl.col(c_name), reduce)()
+        ).alias(value_name)
+        stats_data = (
+            data.select(*by, *facet_keys, *([c_name] if c_name is not None else []))
+            .with_columns(pl.Series(q_name, q), pl.Series(r_name, r))
+            .group_by(*by, *facet_keys, q_name, r_name)
+            .agg(value_expr)
+            .sort(*by, q_name, r_name)
+        )
+        values = stats_data[value_name]
+        value_range = (values.min(), values.max()) if values.len() > 0 else (0, 1)
+        stats_data = apply_facet_filter(stats_data, stats_facet_filter).drop(facet_keys)
+        data = apply_facet_filter(data, stats_facet_filter)
+        if len(by) > 1:
+            stats_data = stats_data.with_columns(
+                pl.concat_str([pl.col(name) for name in by], separator=",").alias(
+                    group_name
+                )
+            )
+        stats_data = apply_facet_filter(stats_data, glyph_facet_filter)
+        styles_d, stats_data = replace_field_props(styles_d, data=stats_data)
+
+        if "fill_color" not in styles_d:
+            # 没有指定颜色时按统计值映射颜色
+            palette = use_palette(n=256, palette=self._spec.get("palette", "Viridis"))
+            mapper_cls = (
+                bm.LogColorMapper if self._spec.get("log", False) else bm.LinearColorMapper
+            )
+            mapper = mapper_cls(
+                palette=[*palette], low=value_range[0], high=value_range[1]
+            )
+            styles_d["fill_color"] = field_(value_name, mapper)
+        styles_d.setdefault("line_color", None)
+        if len(by) > 0:
+            styles_d.setdefault("fill_alpha", 0.6)
+
+        value_label = "count" if c_name is None else f"{reduce}({c_name})"
+        hover_template = self._spec.get("hover_template", None)
+        if hover_template is not None:
+            tooltip_template = hover_template(
+                HexBinHoverTemplateParams(
+                    q=pl.col(q_name), r=pl.col(r_name), value=pl.col(value_name)
+                )
+            )
+        else:
+            tooltip_template = pl.format(f"{value_label}={{}}", pl.col(value_name))
+            if len(by) > 0:
+                tooltip_template = pl.concat_str(
+                    pl.lit("<b>"),
+                    pl.col(group_name).cast(pl.String),
+                    pl.lit("</b><br>"),
+                    tooltip_template,
+                )
+
+        render_glyph(
+            data=stats_data,
+            facet_filter=None,
+            glyph=bm.HexTile(
+                q=q_name,
+                r=r_name,
+                size=size,
+                orientation=orientation,
+                aspect_scale=aspect_scale,
+                **styles_d,
+            ),
+            figure=figure,
+            name=group_name or value_label,
+            legend=legend,
+            legend_spec=(
+                {"legend_type": "group", "legend_value": group_name}
+                if len(by) > 0
+                else None
+            ),
+            tooltip_template=tooltip_template,
+        )
+
+        super().__call__(
+            figure=figure,
+            legend=legend,
+            data=data,
+            facet_filter=facet_filter,
+        )
+
+    def with_hover_template(self, hover_callable: HexBinHoverTemplate) -> Self:
+        self_ = self.copy()
+        self_._spec["hover_template"] = hover_callable
+        return self_
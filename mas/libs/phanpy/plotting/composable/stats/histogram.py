@@ -36,6 +36,7 @@ from mas.libs.phanpy.plotting.field import (
     StrictDataSpec,
     get_field_props,
     interpret_data_spec,
+    materialize_field_props,
 )
 from mas.libs.phanpy.plotting.layer.plot import PlotConstructorProps
 from mas.libs.phanpy.plotting.traits import FillStyleableTrait, LineStyleableTrait
@@ -72,14 +73,25 @@ class HistogramSpec(TypedDict):
     hover_template: NotRequired[HistogramHoverTemplate]
 
 
-class HistogramConstructorProps(
-    HistogramSpec,
+class RawHistogramConstructorProps(
     RectangleGlyphStyles,
     PlotConstructorProps,
 ):
     pass
 
 
+class HistogramConstructorProps(HistogramSpec, RawHistogramConstructorProps):
+    pass
+
+
+class HistogramBinsSpec(TypedDict):
+    """已经计算好的分箱，每一行为一个 bin"""
+
+    left: StrictDataSpec[NumberLike]
+    right: StrictDataSpec[NumberLike]
+    count: StrictDataSpec[NumberLike]
+
+
 class Histogram(
     Plot,
     LineStyleableTrait[RectangleGlyphStyles],
@@ -102,6 +114,29 @@ class Histogram(
         )
         self._spec = keysafe_typeddict(props, HistogramSpec)
         self._styles = keysafe_typeddict(props, RectangleGlyphStyles) or self.Styles()
+        self._bins: HistogramBinsSpec | None = None
+
+    @classmethod
+    def from_bins(
+        cls,
+        left: StrictDataSpec[NumberLike],
+        right: StrictDataSpec[NumberLike],
+        count: StrictDataSpec[NumberLike],
+        *,
+        type: HistogramType = "count",
+        mode: BarMode = "stack",
+        hover_template: HistogramHoverTemplate | None = None,
+        **props: Unpack[RawHistogramConstructorProps],
+    ) -> Self:
+        """使用已经计算好的分箱 (例如数据库中的聚合结果)，`data` 中每一行为一个 bin
+
+        样式中映射的列作为分组，各分组需要使用相同的分箱才能堆叠
+        """
+        self_ = cls(x=left, type=type, mode=mode, **props)
+        if hover_template is not None:
+            self_._spec["hover_template"] = hover_template
+        self_._bins = HistogramBinsSpec(left=left, right=right, count=count)
+        return self_
 
     def __call__(
         self,
@@ -110,6 +145,15 @@ class Histogram(
         data: pl.DataFrame | None,
         facet_filter: FacetFilter | None,
     ) -> None:
+        if self._bins is not None:
+            self._draw_precomputed_bins(
+                figure=figure,
+                legend=legend,
+                bins=self._bins,
+                facet_filter=facet_filter,
+            )
+            return
+
         data, (x_name,) = interpret_data_spec(
             data=self._data,
             x=self._spec["x"],
@@ -123,13 +167,13 @@ class Histogram(
         if hist_type == "density":
             density = True
         styles_d: dict[str, Any] = {**self._styles}
+        styles_d, data = materialize_field_props(styles_d, data)
         field_props = get_field_props(styles_d)
 
         left_name = m_internal("mas.histogram.left")
         right_name = m_internal("mas.histogram.right")
         top_name = m_internal("mas.histogram.top")
         bottom_name = m_internal("mas.histogram.bottom")
-        hover_name = m_internal("mas.histogram.hover_text")
 
         # 如果有 field，那么需要叠
         if len(field_props) > 0:
@@ -194,40 +238,16 @@ class Histogram(
                 [left_name, right_name, top_name, bottom_name]
             )
 
-            hover_template = self._spec.pop(
-                "hover_template", default_histogram_hover_template
-            )
-            hover_tooltip = hover_template(
-                HistogramHoverTemplateParams(
-                    x1=pl.col(left_name), x2=pl.col(right_name), y=pl.col(top_name)
-                )
-            )
-
-            merged_df = merged_df.with_columns(hover_tooltip.alias(hover_name))
-
             # 筛选掉 高度为 0 的 矩形数
             merged_df = merged_df.filter(pl.col(top_name) != pl.col(bottom_name))
             merged_df = apply_facet_filter(merged_df, glyph_facet_filter)
-            (
-                Rectangle(
-                    left=pl.col(left_name),
-                    right=pl.col(right_name),
-                    top=pl.col(top_name),
-                    bottom=pl.col(bottom_name),
-                    name=group_name,
-                    legend_group=group_name,
-                    **{
-                        "fill_alpha": 0.6,
-                        **self._styles,
-                    },
-                )
-                .with_hover_tooltip(pl.col(hover_name))
-                ._draw(
-                    figure=figure,
-                    legend=legend,
-                    data=merged_df,
-                    facet_filter=facet_filter,
-                )
+            self._draw_bins(
+                figure=figure,
+                legend=legend,
+                data=merged_df,
+                name=group_name,
+                legend_group=group_name,
+                facet_filter=facet_filter,
             )
 
         else:
@@ -245,36 +265,150 @@ class Histogram(
                     bottom_name: np.zeros(hist.shape),
                 }
             )
-            hover_template = self._spec.pop(
-                "hover_template", default_histogram_hover_template
+            self._draw_bins(
+                figure=figure,
+                legend=legend,
+                data=data,
+                name=x_name,
+                legend_label=x_name,
+                facet_filter=None,
             )
-            hover_tooltip = hover_template(
-                HistogramHoverTemplateParams(
-                    x1=pl.col(left_name), x2=pl.col(right_name), y=pl.col(top_name)
-                )
+
+        super().__call__(
+            figure=figure,
+            legend=legend,
+            data=data,
+            facet_filter=facet_filter,
+        )
+
+    def _draw_bins(
+        self,
+        figure: bm.Plot,
+        legend: bm.Legend,
+        data: pl.DataFrame,
+        name: str,
+        legend_label: str | None = None,
+        legend_group: str | None = None,
+        facet_filter: FacetFilter | None = None,
+    ) -> None:
+        """画出包含 left/right/top/bottom 列的分箱"""
+        left_name = m_internal("mas.histogram.left")
+        right_name = m_internal("mas.histogram.right")
+        top_name = m_internal("mas.histogram.top")
+        bottom_name = m_internal("mas.histogram.bottom")
+        hover_name = m_internal("mas.histogram.hover_text")
+
+        hover_template = self._spec.get(
+            "hover_template", default_histogram_hover_template
+        )
+        hover_tooltip = hover_template(
+            HistogramHoverTemplateParams(
+                x1=pl.col(left_name), x2=pl.col(right_name), y=pl.col(top_name)
             )
-            data = data.with_columns(hover_tooltip.alias(hover_name))
-
-            (
-                Rectangle(
-                    left=pl.col(left_name),
-                    right=pl.col(right_name),
-                    top=pl.col(top_name),
-                    bottom=pl.col(bottom_name),
-                    name=x_name,
-                    legend_label=x_name,
-                    **{
-                        "fill_alpha": 0.6,
-                        **self._styles,
-                    },
-                )
-                .with_hover_tooltip(pl.col(hover_name))
-                ._draw(
-                    figure=figure,
-                    legend=legend,
-                    data=data,
-                    facet_filter=None,
+        )
+        data = data.with_columns(hover_tooltip.alias(hover_name))
+        (
+            Rectangle(
+                left=pl.col(left_name),
+                right=pl.col(right_name),
+                top=pl.col(top_name),
+                bottom=pl.col(bottom_name),
+                name=name,
+                legend_label=legend_label,
+                legend_group=legend_group,
+                **{
+                    "fill_alpha": 0.6,
+                    **self._styles,
+                },
+            )
+            .with_hover_tooltip(pl.col(hover_name))
+            ._draw(
+                figure=figure,
+                legend=legend,
+                data=data,
+                facet_filter=facet_filter,
+            )
+        )
+
+    def _draw_precomputed_bins(
+        self,
+        figure: bm.Plot,
+        legend: bm.Legend,
+        bins: HistogramBinsSpec,
+        facet_filter: FacetFilter | None,
+    ) -> None:
+        data, (left, right, count) = interpret_data_spec(
+            data=self._data,
+            left=bins["left"],
+            right=bins["right"],
+            count=bins["count"],
+        )
+        hist_type = self._spec.get("type", "count")
+        mode = self._spec.get("mode", "stack")
+        styles_d: dict[str, Any] = {**self._styles}
+        styles_d, data = materialize_field_props(styles_d, data)
+        field_names = [
+            *dict.fromkeys(c.column_name for c in get_field_props(styles_d).values())
+        ]
+        stats_facet_filter, glyph_facet_filter = split_facet_filter_for_stats(
+            facet_filter, field_names
+        )
+        data = apply_facet_filter(data, stats_facet_filter)
+
+        left_name = m_internal("mas.histogram.left")
+        right_name = m_internal("mas.histogram.right")
+        top_name = m_internal("mas.histogram.top")
+        bottom_name = m_internal("mas.histogram.bottom")
+
+        value = pl.col(count).cast(pl.Float64)
+        if hist_type != "count":
+            total = value.sum().over(field_names) if field_names else value.sum()
+            value = value / total
+        if hist_type == "density":
+            value = value / (pl.col(right) - pl.col(left))
+        bins_data = data.select(
+            *field_names,
+            pl.col(left).cast(pl.Float64).alias(left_name),
+            pl.col(right).cast(pl.Float64).alias(right_name),
+            value.alias(top_name),
+        ).sort(left_name, *field_names)
+        if len(field_names) > 0 and mode == "stack":
+            # 各分组在同一个 bin 中依次堆叠
+            bins_data = bins_data.with_columns(
+                pl.col(top_name).cum_sum().over(left_name)
+            ).with_columns(
+                (
+                    pl.col(top_name) - pl.col(top_name).diff().over(left_name)
+                ).fill_null(0).alias(bottom_name)
+            )
+        else:
+            bins_data = bins_data.with_columns(pl.lit(0.0).alias(bottom_name))
+
+        if len(field_names) == 0:
+            self._draw_bins(
+                figure=figure,
+                legend=legend,
+                data=bins_data,
+                name=count,
+                legend_label=count,
+            )
+        else:
+            group_name = ",".join(field_names)
+            if group_name not in field_names:
+                bins_data = bins_data.with_columns(
+                    pl.concat_str(
+                        [pl.col(name).cast(pl.String) for name in field_names],
+                        separator=",",
+                    ).alias(group_name)
                 )
+            bins_data = bins_data.filter(pl.col(top_name) != pl.col(bottom_name))
+            bins_data = apply_facet_filter(bins_data, glyph_facet_filter)
+            self._draw_bins(
+                figure=figure,
+                legend=legend,
+                data=bins_data,
+                name=group_name,
+                legend_group=group_name,
             )
 
         super().__call__(
@@ -0,0 +1,386 @@
+from dataclasses import dataclass
+from typing import Callable, Iterable, Literal, Protocol, Sequence, TypedDict
+
+import bokeh.models as bm
+import numpy as np
+import numpy.typing as npt
+import polars as pl
+from typing_extensions import NotRequired, Self, Unpack
+
+from mas.libs.phanpy.plotting.binning import bin_index, is_uniform_edges
+from mas.libs.phanpy.plotting.composable.plot import Plot
+from mas.libs.phanpy.plotting.constants import m_internal
+from mas.libs.phanpy.plotting.facet import FacetFilter, apply_facet_filter
+from mas.libs.phanpy.plotting.field import field_
+from mas.libs.phanpy.plotting.layer.plot import PlotConstructorProps
+from mas.libs.phanpy.plotting.palette import NamedPaletteType, use_palette
+from mas.libs.phanpy.plotting.props import FillProps, LineProps
+from mas.libs.phanpy.plotting.render import render_glyph
+from mas.libs.phanpy.plotting.traits import FillStyleableTrait, LineStyleableTrait
+from mas.libs.phanpy.types.color import ColorLike
+from mas.libs.phanpy.types.typeddict import keysafe_typeddict
+
+Histogram2DType = Literal["count", "probability", "density"]
+Histogram2DGlyph = Literal["image", "quad"]
+Bins1D = int | Sequence[float]
+BinsRange = tuple[tuple[float, float], tuple[float, float]]
+
+# 可以分批读取的数据，callable 每次渲染时重新生成迭代器
+BatchSource = Iterable[pl.DataFrame] | Callable[[], Iterable[pl.DataFrame]]
+Histogram2DSource = pl.DataFrame | pl.LazyFrame | BatchSource
+
+
+@dataclass
+class Histogram2DHoverTemplateParams:
+    x1: pl.Expr
+    x2: pl.Expr
+    y1: pl.Expr
+    y2: pl.Expr
+    value: pl.Expr
+
+
+class Histogram2DHoverTemplate(Protocol):
+    def __call__(self, params: Histogram2DHoverTemplateParams) -> pl.Expr: ...
+
+
+def default_histogram2d_hover_template(
+    params: Histogram2DHoverTemplateParams,
+) -> pl.Expr:
+    return pl.format(
+        "x = {} - {}<br>y = {} - {}<br>value = {}",
+        params.x1,
+        params.x2,
+        params.y1,
+        params.y2,
+        params.value,
+    )
+
+
+class Histogram2DGlyphStyles(FillProps, LineProps):
+    pass
+
+
+class Histogram2DSpec(TypedDict):
+    # 需要在 pl.LazyFrame 和分批数据上计算，只支持表达式
+    x: pl.Expr
+    y: pl.Expr
+    bins: NotRequired[Bins1D | tuple[Bins1D, Bins1D]]
+    # ((xmin, xmax), (ymin, ymax))，分批数据必须提供
+    range: NotRequired[BinsRange]
+    type: NotRequired[Histogram2DType]
+    glyph: NotRequired[Histogram2DGlyph]
+
+    palette: NotRequired[NamedPaletteType | Sequence[ColorLike]]
+    log: NotRequired[bool]
+
+    hover_template: NotRequired[Histogram2DHoverTemplate]
+
+
+class Histogram2DConstructorProps(
+    Histogram2DSpec,
+    Histogram2DGlyphStyles,
+    PlotConstructorProps,
+    total=False,
+):
+    source: Histogram2DSource
+
+
+@dataclass
+class Histogram2DResult:
+    """分箱的统计结果，`counts` 的形状为 (ny, nx)"""
+
+    x_edges: npt.NDArray[np.float64]
+    y_edges: npt.NDArray[np.float64]
+    counts: npt.NDArray[np.float64]
+    total: int
+
+    def normalize(self, hist_type: Histogram2DType) -> npt.NDArray[np.float64]:
+        if hist_type == "count" or self.total == 0:
+            return self.counts
+        if hist_type == "probability":
+            return self.counts / self.total
+        area = np.outer(np.diff(self.y_edges), np.diff(self.x_edges))
+        return self.counts / self.total / area
+
+
+def data_range(lazy: pl.LazyFrame, x: pl.Expr, y: pl.Expr) -> BinsRange:
+    bounds = lazy.select(
+        x.min().alias("x_min"),
+        x.max().alias("x_max"),
+        y.min().alias("y_min"),
+        y.max().alias("y_max"),
+    ).collect(streaming=True)
+    x_min, x_max, y_min, y_max = bounds.row(0)
+    # 没有数据时使用 [0, 1]
+    return (
+        (x_min if x_min is not None else 0.0, x_max if x_max is not None else 1.0),
+        (y_min if y_min is not None else 0.0, y_max if y_max is not None else 1.0),
+    )
+
+
+def accumulate_histogram2d(
+    source: Histogram2DSource,
+    x: pl.Expr,
+    y: pl.Expr,
+    bins: Bins1D | tuple[Bins1D, Bins1D] = 50,
+    range: BinsRange | None = None,
+) -> Histogram2DResult:
+    """累加二维直方图，内存占用只和 bin 的数量有关
+
+    - `pl.DataFrame`/`pl.LazyFrame`: 用 streaming 引擎计算每个 bin 的数量
+    - 分批数据: 逐批累加，必须提供 `range` 或者明确的 bin 边界
+    """
+    x_bins, y_bins = bins if isinstance(bins, tuple) else (bins, bins)
+
+    lazy: pl.LazyFrame | None = None
+    if isinstance(source, pl.DataFrame):
+        lazy = source.lazy()
+    elif isinstance(source, pl.LazyFrame):
+        lazy = source
+
+    if range is None and (isinstance(x_bins, int) or isinstance(y_bins, int)):
+        if lazy is None:
+            raise ValueError(
+                "range must be provided when accumulating histogram over batches"
+            )
+        range = data_range(lazy, x, y)
+
+    def _edges(b: Bins1D, r: tuple[float, float] | None) -> npt.NDArray[np.float64]:
+        if not isinstance(b, int):
+            return np.asarray(b, dtype=np.float64)
+        assert r is not None
+        low, high = float(r[0]), float(r[1])
+        if low == high:
+            low, high = low - 0.5, high + 0.5
+        return np.linspace(low, high, b + 1)
+
+    x_edges = _edges(x_bins, range[0] if range is not None else None)
+    y_edges = _edges(y_bins, range[1] if range is not None else None)
+    counts = np.zeros((len(y_edges) - 1, len(x_edges) - 1), dtype=np.float64)
+
+    if lazy is not None:
+        ix_name = m_internal("mas.histogram2d.ix")
+        iy_name = m_internal("mas.histogram2d.iy")
+        binned = (
+            lazy.select(x.cast(pl.Float64).alias("x"), y.cast(pl.Float64).alias("y"))
+            .filter(
+                pl.col("x").is_between(x_edges[0], x_edges[-1])
+                & pl.col("y").is_between(y_edges[0], y_edges[-1])
+            )
+            .select(
+                bin_index(pl.col("x"), x_edges, ix_name),
+                bin_index(pl.col("y"), y_edges, iy_name),
+            )
+            .group_by(ix_name, iy_name)
+            .len()
+            .collect(streaming=True)
+        )
+        counts[binned[iy_name].to_numpy(), binned[ix_name].to_numpy()] = binned[
+            "len"
+        ].to_numpy()
+    else:
+        batches = source() if callable(source) else source
+        for batch in batches:
+            values = batch.select(
+                x.cast(pl.Float64).alias("x"), y.cast(pl.Float64).alias("y")
+            ).drop_nulls()
+            hist, _, _ = np.histogram2d(
+                values["y"].to_numpy(),
+                values["x"].to_numpy(),
+                bins=(y_edges, x_edges),
+            )
+            counts += hist
+
+    return Histogram2DResult(
+        x_edges=x_edges,
+        y_edges=y_edges,
+        counts=counts,
+        total=int(counts.sum()),
+    )
+
+
+def _filter_source(
+    source: Histogram2DSource, facet_filter: FacetFilter | None
+) -> Histogram2DSource:
+    if isinstance(source, pl.DataFrame):
+        return apply_facet_filter(source, facet_filter)
+    if not facet_filter:
+        return source
+    if not isinstance(source, pl.LazyFrame):
+        raise ValueError(
+            "Histogram2D with batches as source does not support facet, "
+            "use pl.LazyFrame instead"
+        )
+    names = source.collect_schema().names()
+    # 与 apply_facet_filter 一致，缺少 facet 列时不过滤
+    if any(k not in names for k in facet_filter.keys()):
+        return source
+    for k, v in facet_filter.items():
+        source = source.filter(pl.col(k) == v)
+    return source
+
+
+class Histogram2D(
+    Plot,
+    LineStyleableTrait[Histogram2DGlyphStyles],
+    FillStyleableTrait[Histogram2DGlyphStyles],
+):
+    """矩形分箱的二维直方图 (热图)
+
+    大数据可以通过 `source` 传入 `pl.LazyFrame` 或者分批数据，逐批累加，
+    内存只和 bin 的数量有关；facet 只支持 `pl.DataFrame` 和 `pl.LazyFrame`
+    """
+
+    Styles = Histogram2DGlyphStyles
+
+    def __init__(
+        self,
+        **props: Unpack[Histogram2DConstructorProps],
+    ) -> None:
+        source = props.pop("source", None)
+        super().__init__(**keysafe_typeddict(props, PlotConstructorProps))
+        self._source = source
+        self._spec = keysafe_typeddict(props, Histogram2DSpec)
+        self._styles = (
+            keysafe_typeddict(props, Histogram2DGlyphStyles) or Histogram2D.Styles()
+        )
+
+    def __deepcopy_memo__(self) -> list[int]:
+        # 分批数据的迭代器无法复制
+        return [*super().__deepcopy_memo__(), id(self._source)]
+
+    def __call__(
+        self,
+        figure: bm.Plot,
+        legend: bm.Legend,
+        data: pl.DataFrame | None,
+        facet_filter: FacetFilter | None,
+    ) -> None:
+        source: Histogram2DSource
+        if self._source is not None:
+            source = self._source
+        elif self._data is not None:
+            source = self._data
+        else:
+            raise ValueError("Either data or source must be provided")
+
+        bins = self._spec.get("bins", 50)
+        range_ = self._spec.get("range", None)
+        if range_ is None and (
+            isinstance(source, pl.DataFrame)
+            or (isinstance(source, pl.LazyFrame) and facet_filter)
+        ):
+            # 各个 facet 使用相同的 bin
+            range_ = data_range(source.lazy(), self._spec["x"], self._spec["y"])
+
+        result = accumulate_histogram2d(
+            _filter_source(source, facet_filter),
+            self._spec["x"],
+            self._spec["y"],
+            bins=bins,
+            range=range_,
+        )
+        values = result.normalize(self._spec.get("type", "count"))
+
+        palette = use_palette(n=256, palette=self._spec.get("palette", "Viridis"))
+        nonzero = values[values > 0]
+        mapper_cls = (
+            bm.LogColorMapper if self._spec.get("log", False) else bm.LinearColorMapper
+        )
+        mapper = mapper_cls(
+            palette=[*palette],
+            low=float(nonzero.min()) if nonzero.size > 0 else 0.0,
+            high=float(nonzero.max()) if nonzero.size > 0 else 1.0,
+            nan_color="rgba(0, 0, 0, 0)",
+        )
+
+        glyph_type = self._spec.get("glyph", "image")
+        if glyph_type == "image" and not (
+            is_uniform_edges(result.x_edges) and is_uniform_edges(result.y_edges)
+        ):
+            # bm.Image 只能表示均匀的网格
+            glyph_type = "quad"
+
+        if glyph_type == "image":
+            x0, x1 = result.x_edges[0], result.x_edges[-1]
+            y0, y1 = result.y_edges[0], result.y_edges[-1]
+            extent = pl.DataFrame(
+                {"x": [x0], "y": [y0], "dw": [x1 - x0], "dh": [y1 - y0]}
+            )
+            render_glyph(
+                data=extent,
+                facet_filter=None,
+                glyph=bm.Image(
+                    image="image",
+                    x="x",
+                    y="y",
+                    dw="dw",
+                    dh="dh",
+                    color_mapper=mapper,
+                ),
+                figure=figure,
+                name=self._spec.get("type", "count"),
+                level="image",
+                # 二维数组无法放在 polars 的列中
+                source_data={
+                    "image": [np.where(values > 0, values, np.nan)],
+                    **extent.to_dict(as_series=False),
+                },
+            )
+        else:
+            left_name = m_internal("mas.histogram2d.left")
+            right_name = m_internal("mas.histogram2d.right")
+            bottom_name = m_internal("mas.histogram2d.bottom")
+            top_name = m_internal("mas.histogram2d.top")
+            value_name = m_internal("mas.histogram2d.value")
+            iy, ix = np.nonzero(values)
+            quads = pl.DataFrame(
+                {
+                    left_name: result.x_edges[ix],
+                    right_name: result.x_edges[ix + 1],
+                    bottom_name: result.y_edges[iy],
+                    top_name: result.y_edges[iy + 1],
+                    value_name: values[iy, ix],
+                }
+            )
+            hover_template = self._spec.get(
+                "hover_template", default_histogram2d_hover_template
+            )
+            render_glyph(
+                data=quads,
+                facet_filter=None,
+                glyph=bm.Quad(
+                    left=left_name,
+                    right=right_name,
+                    bottom=bottom_name,
+                    top=top_name,
+                    **{
+                        "line_color": None,
+                        **self._styles,
+                        "fill_color": field_(value_name, mapper),
+                    },
+                ),
+                figure=figure,
+                name=self._spec.get("type", "count"),
+                tooltip_template=hover_template(
+                    Histogram2DHoverTemplateParams(
+                        x1=pl.col(left_name),
+                        x2=pl.col(right_name),
+                        y1=pl.col(bottom_name),
+                        y2=pl.col(top_name),
+                        value=pl.col(value_name),
+                    )
+                ),
+            )
+
+        super().__call__(
+            figure=figure,
+            legend=legend,
+            data=data,
+            facet_filter=facet_filter,
+        )
+
+    def with_hover_template(self, hover_callable: Histogram2DHoverTemplate) -> Self:
+        self_ = self.copy()
+        self_._spec["hover_template"] = hover_callable
+        return self_
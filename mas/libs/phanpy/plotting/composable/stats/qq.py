@@ -0,0 +1,228 @@
+from dataclasses import dataclass
+from typing import Any, Protocol, TypedDict
+
+import bokeh.models as bm
+import polars as pl
+from typing_extensions import NotRequired, Self, Unpack
+
+from mas.libs.phanpy.plotting.composable.glyphs.scatter import (
+    Scatter,
+    ScatterGlyphStyles,
+)
+from mas.libs.phanpy.plotting.composable.plot import Plot
+from mas.libs.phanpy.plotting.composable.stats.distributions import norm_ppf
+from mas.libs.phanpy.plotting.composable.stats.ecdf import (
+    DEFAULT_MAX_POINTS,
+    rank_within_groups,
+)
+from mas.libs.phanpy.plotting.constants import m_internal
+from mas.libs.phanpy.plotting.facet import (
+    FacetFilter,
+    apply_facet_filter,
+    split_facet_filter_for_stats,
+)
+from mas.libs.phanpy.plotting.field import (
+    StrictDataSpec,
+    get_field_props,
+    interpret_data_spec,
+    materialize_field_props,
+    replace_field_props,
+)
+from mas.libs.phanpy.plotting.layer.plot import PlotConstructorProps
+from mas.libs.phanpy.plotting.props import LineProps
+from mas.libs.phanpy.plotting.render import render_glyph
+from mas.libs.phanpy.plotting.traits import (
+    FillStyleableTrait,
+    LineStyleableTrait,
+    MarkerStylableTrait,
+)
+from mas.libs.phanpy.types.primitive import NumberLike
+from mas.libs.phanpy.types.typeddict import keysafe_typeddict
+
+
+@dataclass
+class QQHoverTemplateParams:
+    theoretical: pl.Expr
+    sample: pl.Expr
+    n: pl.Expr
+
+
+class QQHoverTemplate(Protocol):
+    def __call__(self, params: QQHoverTemplateParams) -> pl.Expr: ...
+
+
+class QQSpec(TypedDict):
+    # 样本，与标准正态分布的分位数比较
+    y: StrictDataSpec[NumberLike]
+    # 是否画出经过 Q1/Q3 的参考线 (同 R 的 qqline)
+    line: NotRequired[bool]
+    # 每个分组最多保留的点数，None 时不抽取
+    max_points: NotRequired[int | None]
+
+    hover_template: NotRequired[QQHoverTemplate]
+
+
+class QQConstructorProps(
+    QQSpec,
+    ScatterGlyphStyles,
+    PlotConstructorProps,
+):
+    pass
+
+
+class QQ(
+    Plot,
+    LineStyleableTrait[ScatterGlyphStyles],
+    FillStyleableTrait[ScatterGlyphStyles],
+    MarkerStylableTrait[ScatterGlyphStyles],
+):
+    """正态 Q-Q 图，样式中映射的列作为分组"""
+
+    Styles = ScatterGlyphStyles
+
+    def __init__(
+        self,
+        **props: Unpack[QQConstructorProps],
+    ) -> None:
+        super().__init__(**keysafe_typeddict(props, PlotConstructorProps))
+        self._spec = keysafe_typeddict(props, QQSpec)
+        self._styles = keysafe_typeddict(props, ScatterGlyphStyles) or QQ.Styles()
+
+    def __call__(
+        self,
+        figure: bm.Plot,
+        legend: bm.Legend,
+        data: pl.DataFrame | None,
+        facet_filter: FacetFilter | None,
+    ) -> None:
+        data, (y_name,) = interpret_data_spec(data=self._data, y=self._spec["y"])
+
+        styles_d: dict[str, Any] = {**self._styles}
+        styles_d, data = materialize_field_props(styles_d, data)
+        field_props = get_field_props(styles_d)
+        by = [*dict.fromkeys(c.column_name for c in field_props.values())]
+
+        stats_facet_filter, glyph_facet_filter = split_facet_filter_for_stats(
+            facet_filter, by
+        )
+        data = apply_facet_filter(data, stats_facet_filter)
+
+        rank_name = m_internal("mas.qq.rank")
+        n_name = m_internal("mas.qq.n")
+        theoretical_name = m_internal("mas.qq.theoretical")
+        stats_data = rank_within_groups(
+            data.select(y_name, *by),
+            y_name,
+            by=by,
+            rank_name=rank_name,
+            n_name=n_name,
+            max_points=self._spec.get("max_points", DEFAULT_MAX_POINTS),
+        )
+        # plotting position 同 R 的 ppoints: (i - a) / (n + 1 - 2a)
+        a = pl.when(pl.col(n_name) <= 10).then(3 / 8).otherwise(0.5)
+        positions = stats_data.select(
+            (pl.col(rank_name) - a) / (pl.col(n_name) + 1 - 2 * a)
+        ).to_series()
+        stats_data = stats_data.with_columns(
+            pl.Series(theoretical_name, norm_ppf(positions.to_numpy()))
+        )
+        stats_data = apply_facet_filter(stats_data, glyph_facet_filter)
+
+        if self._spec.get("line", True):
+            self._draw_reference_line(
+                figure=figure,
+                data=data,
+                y_name=y_name,
+                by=by,
+                styles_d=styles_d,
+                facet_filter=glyph_facet_filter,
+            )
+
+        hover_template = self._spec.get("hover_template", None)
+        if hover_template is not None:
+            tooltip_template = hover_template(
+                QQHoverTemplateParams(
+                    theoretical=pl.col(theoretical_name),
+                    sample=pl.col(y_name),
+                    n=pl.col(n_name),
+                )
+            )
+        else:
+            tooltip_template = pl.format(
+                f"theoretical={{}}<br>{y_name}={{}}",
+                pl.col(theoretical_name),
+                pl.col(y_name),
+            )
+
+        (
+            Scatter(
+                x=pl.col(theoretical_name),
+                y=pl.col(y_name),
+                name=",".join(by) or y_name,
+                **styles_d,
+            )
+            .with_hover_tooltip(tooltip_template)
+            ._draw(
+                figure=figure,
+                legend=legend,
+                data=stats_data,
+                facet_filter=None,
+            )
+        )
+
+        super().__call__(
+            figure=figure,
+            legend=legend,
+            data=data,
+            facet_filter=facet_filter,
+        )
+
+    def _draw_reference_line(
+        self,
+        figure: bm.Plot,
+        data: pl.DataFrame,
+        y_name: str,
+        by: list[str],
+        styles_d: dict[str, Any],
+        facet_filter: FacetFilter | None,
+    ) -> None:
+        # 经过 (z(0.25), Q1) 和 (z(0.75), Q3) 的直线，画在 z = ±3 之间
+        z1, z3 = norm_ppf([0.25, 0.75])
+        q1 = pl.col(y_name).quantile(0.25, "linear")
+        q3 = pl.col(y_name).quantile(0.75, "linear")
+        slope = (q3 - q1) / (z3 - z1)
+        intercept = q1 - slope * z1
+        x0, y0, x1, y1 = (
+            m_internal(f"mas.qq.{name}") for name in ("x0", "y0", "x1", "y1")
+        )
+        aggs = [
+            pl.lit(-3.0).alias(x0),
+            (intercept - 3 * slope).alias(y0),
+            pl.lit(3.0).alias(x1),
+            (intercept + 3 * slope).alias(y1),
+        ]
+        data = data.filter(pl.col(y_name).is_not_null() & pl.col(y_name).is_not_nan())
+        lines = (
+            data.group_by(by).agg(*aggs).sort(by)
+            if len(by) > 0
+            else data.select(*aggs)
+        )
+        lines = apply_facet_filter(lines, facet_filter)
+        line_styles: dict[str, Any] = {**keysafe_typeddict(styles_d, LineProps)}
+        if "line_color" not in line_styles and "fill_color" in styles_d:
+            line_styles["line_color"] = styles_d["fill_color"]
+        line_styles.setdefault("line_dash", "dashed")
+        line_styles, lines = replace_field_props(line_styles, data=lines)
+        # 所有分组的参考线放在同一个 renderer 中
+        render_glyph(
+            name="qqline",
+            data=lines,
+            facet_filter=None,
+            glyph=bm.Segment(x0=x0, y0=y0, x1=x1, y1=y1, **line_styles),
+            figure=figure,
+        )
+
+    def with_hover_template(self, hover_callable: QQHoverTemplate) -> Self:
+        self_ = self.copy()
+        self_._spec["hover_template"] = hover_callable
+        return self_
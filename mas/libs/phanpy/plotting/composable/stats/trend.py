@@ -13,13 +13,39 @@
 # Copyright (c) 2024 Maspectra Dev Team
 ############################################################
 
-from typing import Any
+import logging as logger
+import math
+from dataclasses import dataclass
+from typing import Any, Literal, Protocol, Sequence, TypedDict
 
+import bokeh.models as bm
 import numpy as np
 import numpy.typing as npt
 import polars as pl
+from typing_extensions import NotRequired, Self, Unpack
 
 from mas.libs.phanpy.plotting.composable.glyphs.line import Segment
+from mas.libs.phanpy.plotting.composable.plot import Plot
+from mas.libs.phanpy.plotting.composable.stats.distributions import t_ppf
+from mas.libs.phanpy.plotting.constants import m_internal
+from mas.libs.phanpy.plotting.facet import (
+    FacetFilter,
+    apply_facet_filter,
+    split_facet_filter_for_stats,
+)
+from mas.libs.phanpy.plotting.field import (
+    StrictDataSpec,
+    get_field_props,
+    interpret_data_spec,
+    materialize_field_props,
+    replace_field_props,
+)
+from mas.libs.phanpy.plotting.layer.plot import PlotConstructorProps
+from mas.libs.phanpy.plotting.props import FillProps, LineProps
+from mas.libs.phanpy.plotting.render import GlyphLegendSpec, render_glyph
+from mas.libs.phanpy.plotting.traits import FillStyleableTrait, LineStyleableTrait
+from mas.libs.phanpy.types.primitive import NumberLike
+from mas.libs.phanpy.types.typeddict import keysafe_typeddict
 
 
 def trend_line(data: pl.DataFrame, x: str, y: str) -> Segment:
@@ -40,3 +66,406 @@ def trend_line(data: pl.DataFrame, x: str, y: str) -> Segment:
     y2 = k * x2 + b
 
     return Segment(x0=x1, y0=y1, x1=x2, y1=y2)
+
+
+TrendMethod = Literal["ols", "poly", "loess"]
+
+
+@dataclass
+class TrendHoverTemplateParams:
+    group: pl.Expr
+    # 多项式系数 (从常数项开始)，method="loess" 时为空
+    coef: list[pl.Expr]
+    r2: pl.Expr
+    n: pl.Expr
+
+
+class TrendHoverTemplate(Protocol):
+    def __call__(self, params: TrendHoverTemplateParams) -> pl.Expr: ...
+
+
+class TrendGlyphStyles(LineProps, FillProps):
+    pass
+
+
+class TrendSpec(TypedDict):
+    x: StrictDataSpec[NumberLike]
+    y: StrictDataSpec[NumberLike]
+    # 额外的分组列 (例如受试者 ID)，样式中映射的列会自动参与分组
+    by: NotRequired[str | Sequence[str]]
+
+    method: NotRequired[TrendMethod]
+    # method="poly" 时的阶数
+    degree: NotRequired[int]
+    # method="loess" 时每个点使用的数据比例
+    span: NotRequired[float]
+    # 置信区间的水平，例如 0.95，不提供时不画置信带
+    ci: NotRequired[float]
+    # 每条曲线的点数
+    n_points: NotRequired[int]
+
+    hover_template: NotRequired[TrendHoverTemplate]
+
+
+class TrendConstructorProps(
+    TrendSpec,
+    TrendGlyphStyles,
+    PlotConstructorProps,
+):
+    pass
+
+
+@dataclass
+class GroupedPolyFit:
+    """分组多项式拟合的结果，x 以每组的均值为中心
+
+    - `coef`: 形状为 (n_groups, degree + 1)，中心化后的系数
+    - `xtx_inv`: 形状为 (n_groups, degree + 1, degree + 1)
+    """
+
+    keys: pl.DataFrame
+    center: npt.NDArray[np.float64]
+    coef: npt.NDArray[np.float64]
+    xtx_inv: npt.NDArray[np.float64]
+    sigma2: npt.NDArray[np.float64]
+    r2: npt.NDArray[np.float64]
+    n: npt.NDArray[np.int64]
+    x_min: npt.NDArray[np.float64]
+    x_max: npt.NDArray[np.float64]
+
+    @property
+    def degree(self) -> int:
+        return self.coef.shape[1] - 1
+
+    def predict(
+        self, x: npt.NDArray[np.float64]
+    ) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+        """x 的形状为 (n_groups, n_points)，返回 (预测值, 标准误)"""
+        design = (x - self.center[:, None])[..., None] ** np.arange(self.degree + 1)
+        y = np.einsum("gnp,gp->gn", design, self.coef)
+        variance = np.einsum("gnp,gpq,gnq->gn", design, self.xtx_inv, design)
+        return y, np.sqrt(np.maximum(variance, 0) * self.sigma2[:, None])
+
+    def raw_coef(self) -> npt.NDArray[np.float64]:
+        """还原为原始 x 的系数: sum(b_k * (x - m)^k) = sum(a_j * x^j)"""
+        a = np.zeros_like(self.coef)
+        for k in range(self.degree + 1):
+            for j in range(k + 1):
+                a[:, j] += self.coef[:, k] * math.comb(k, j) * (-self.center) ** (k - j)
+        return a
+
+
+def fit_grouped_polynomial(
+    data: pl.DataFrame, x: str, y: str, by: list[str], degree: int = 1
+) -> GroupedPolyFit:
+    """一次分组聚合得到所有分组的正规方程 (sum x^k, sum x^k * y)，再批量求解"""
+    group_id = m_internal("mas.trend.group_id")
+    xc = m_internal("mas.trend.xc")
+    if len(by) == 0:
+        data = data.with_columns(pl.lit(0, dtype=pl.UInt32).alias(group_id))
+        by_ = [group_id]
+    else:
+        by_ = by
+
+    p = degree + 1
+    stats = (
+        data.lazy()
+        .select(
+            *by_,
+            pl.col(x).cast(pl.Float64),
+            pl.col(y).cast(pl.Float64),
+            (pl.col(x) - pl.col(x).mean().over(by_)).alias(xc),
+        )
+        .group_by(by_)
+        .agg(
+            pl.len().alias("n"),
+            pl.col(x).mean().alias("center"),
+            pl.col(x).min().alias("x_min"),
+            pl.col(x).max().alias("x_max"),
+            (pl.col(y) ** 2).sum().alias("syy"),
+            pl.col(y).mean().alias("y_mean"),
+            *[(pl.col(xc) ** k).sum().alias(f"sx{k}") for k in range(1, 2 * p - 1)],
+            *[(pl.col(xc) ** k * pl.col(y)).sum().alias(f"sxy{k}") for k in range(p)],
+        )
+        .sort(by_)
+        .collect()
+    )
+
+    n = stats["n"].to_numpy().astype(np.int64)
+    sx = np.stack(
+        [n.astype(np.float64)]
+        + [stats[f"sx{k}"].to_numpy() for k in range(1, 2 * p - 1)],
+        axis=1,
+    )
+    sxy = np.stack([stats[f"sxy{k}"].to_numpy() for k in range(p)], axis=1)
+    index = np.arange(p)
+    xtx = sx[:, index[:, None] + index[None, :]]
+    # 点数不足或 x 全部相同时矩阵奇异，pinv 给出最小范数解
+    xtx_inv = np.linalg.pinv(xtx)
+    coef = np.einsum("gpq,gq->gp", xtx_inv, sxy)
+
+    sse = np.maximum(stats["syy"].to_numpy() - np.einsum("gp,gp->g", coef, sxy), 0)
+    sst = stats["syy"].to_numpy() - n * stats["y_mean"].to_numpy() ** 2
+    dof = n - p
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sigma2 = np.where(dof > 0, sse / dof, np.nan)
+        r2 = np.where(sst > 0, 1 - sse / sst, np.nan)
+
+    return GroupedPolyFit(
+        keys=stats.select(by),
+        center=stats["center"].to_numpy(),
+        coef=coef,
+        xtx_inv=xtx_inv,
+        sigma2=sigma2,
+        r2=r2,
+        n=n,
+        x_min=stats["x_min"].to_numpy(),
+        x_max=stats["x_max"].to_numpy(),
+    )
+
+
+def _loess(
+    x: npt.NDArray[np.float64],
+    y: npt.NDArray[np.float64],
+    x_eval: npt.NDArray[np.float64],
+    span: float,
+) -> npt.NDArray[np.float64]:
+    """局部线性回归 (tricube 权重)"""
+    k = min(x.size, max(2, math.ceil(span * x.size)))
+    distance = np.abs(x[None, :] - x_eval[:, None])
+    h = np.partition(distance, k - 1, axis=1)[:, k - 1]
+    h = np.where(h > 0, h, 1.0)
+    w = np.clip(1 - (distance / h[:, None]) ** 3, 0, None) ** 3
+    sw = w.sum(axis=1)
+    sx = w @ x
+    sy = w @ y
+    sxx = w @ (x * x)
+    sxy = w @ (x * y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        denominator = sw * sxx - sx * sx
+        slope = np.where(
+            np.abs(denominator) > 1e-12, (sw * sxy - sx * sy) / denominator, 0
+        )
+        return (sy - slope * sx) / sw + slope * x_eval
+
+
+class Trend(
+    Plot,
+    LineStyleableTrait[TrendGlyphStyles],
+    FillStyleableTrait[TrendGlyphStyles],
+):
+    """分组趋势线
+
+    所有分组的拟合在一次分组聚合中完成，并且只生成一个 MultiLine
+    (以及一个置信带的 Patches)，与分组数量无关
+    """
+
+    Styles = TrendGlyphStyles
+
+    def __init__(
+        self,
+        **props: Unpack[TrendConstructorProps],
+    ) -> None:
+        super().__init__(**keysafe_typeddict(props, PlotConstructorProps))
+        self._spec = keysafe_typeddict(props, TrendSpec)
+        self._styles = keysafe_typeddict(props, TrendGlyphStyles) or Trend.Styles()
+
+    def __call__(
+        self,
+        figure: bm.Plot,
+        legend: bm.Legend,
+        data: pl.DataFrame | None,
+        facet_filter: FacetFilter | None,
+    ) -> None:
+        data, (x_name, y_name) = interpret_data_spec(
+            data=self._data,
+            x=self._spec["x"],
+            y=self._spec["y"],
+        )
+        data = data.filter(
+            pl.col(x_name).is_not_null()
+            & pl.col(y_name).is_not_null()
+            & pl.col(x_name).is_not_nan()
+            & pl.col(y_name).is_not_nan()
+        )
+
+        styles_d: dict[str, Any] = {**self._styles}
+        if "line_color" in styles_d:
+            # 置信带默认与线同色
+            styles_d.setdefault("fill_color", styles_d["line_color"])
+        styles_d, data = materialize_field_props(styles_d, data)
+        field_props = get_field_props(styles_d)
+        style_by = [*dict.fromkeys(c.column_name for c in field_props.values())]
+        by_spec = self._spec.get("by", [])
+        by = [
+            *dict.fromkeys(
+                [*([by_spec] if isinstance(by_spec, str) else by_spec), *style_by]
+            )
+        ]
+        group_name = ",".join(by)
+        # 图例只按样式分组，避免按受试者等分组时生成大量图例
+        legend_name = ",".join(style_by)
+
+        stats_facet_filter, glyph_facet_filter = split_facet_filter_for_stats(
+            facet_filter, by
+        )
+        data = apply_facet_filter(data, stats_facet_filter)
+
+        method = self._spec.get("method", "ols")
+        degree = self._spec.get("degree", 2) if method == "poly" else 1
+        ci = self._spec.get("ci", None)
+        n_points = self._spec.get(
+            "n_points", 2 if method == "ols" and ci is None else 50
+        )
+        steps = np.linspace(0, 1, n_points)
+
+        xs_name = m_internal("mas.trend.xs")
+        ys_name = m_internal("mas.trend.ys")
+        band_xs_name = m_internal("mas.trend.band_xs")
+        band_ys_name = m_internal("mas.trend.band_ys")
+        r2_name = m_internal("mas.trend.r2")
+        n_name = m_internal("mas.trend.n")
+        coef_names = [m_internal(f"mas.trend.coef{k}") for k in range(degree + 1)]
+
+        fit = fit_grouped_polynomial(data, x_name, y_name, by=by, degree=degree)
+        xs = fit.x_min[:, None] + (fit.x_max - fit.x_min)[:, None] * steps
+        if method == "loess":
+            ys = np.empty_like(xs)
+            grouped = (
+                data.group_by(by).agg(pl.col(x_name), pl.col(y_name)).sort(by)
+                if len(by) > 0
+                else data.select(pl.col(x_name).implode(), pl.col(y_name).implode())
+            )
+            for i, (x_values, y_values) in enumerate(
+                zip(grouped[x_name].to_list(), grouped[y_name].to_list())
+            ):
+                ys[i] = _loess(
+                    np.asarray(x_values, dtype=np.float64),
+                    np.asarray(y_values, dtype=np.float64),
+                    xs[i],
+                    span=self._spec.get("span", 0.75),
+                )
+            if ci is not None:
+                logger.warning("Trend: ci is not supported with method='loess'")
+                ci = None
+            se = None
+        else:
+            ys, se = fit.predict(xs)
+
+        stats_data = fit.keys.hstack(
+            [
+                pl.Series(xs_name, xs.tolist(), dtype=pl.List(pl.Float64)),
+                pl.Series(ys_name, ys.tolist(), dtype=pl.List(pl.Float64)),
+                pl.Series(r2_name, fit.r2),
+                pl.Series(n_name, fit.n),
+                *[
+                    pl.Series(name, values)
+                    for name, values in zip(coef_names, fit.raw_coef().T)
+                ],
+            ]
+        )
+        if ci is not None and se is not None:
+            # 置信带为一个闭合的多边形: 上边界从左到右，下边界从右到左
+            t = t_ppf(1 - (1 - ci) / 2, np.maximum(fit.n - degree - 1, 1))[:, None]
+            band_xs = np.concatenate([xs, xs[:, ::-1]], axis=1)
+            band_ys = np.concatenate([ys + t * se, (ys - t * se)[:, ::-1]], axis=1)
+            valid = np.isfinite(band_ys).all(axis=1)
+            stats_data = stats_data.with_columns(
+                pl.Series(band_xs_name, band_xs.tolist(), dtype=pl.List(pl.Float64)),
+                pl.Series(band_ys_name, band_ys.tolist(), dtype=pl.List(pl.Float64)),
+                pl.Series(m_internal("mas.trend.valid"), valid),
+            )
+        for names in {tuple(by), tuple(style_by)}:
+            if len(names) > 1:
+                stats_data = stats_data.with_columns(
+                    pl.concat_str(
+                        [pl.col(name) for name in names], separator=","
+                    ).alias(",".join(names))
+                )
+        stats_data = apply_facet_filter(stats_data, glyph_facet_filter)
+        styles_d, stats_data = replace_field_props(styles_d, data=stats_data)
+
+        hover_template = self._spec.get("hover_template", None)
+        if hover_template is not None:
+            tooltip_template = hover_template(
+                TrendHoverTemplateParams(
+                    group=pl.col(group_name) if len(by) > 0 else pl.lit(y_name),
+                    coef=[] if method == "loess" else [pl.col(c) for c in coef_names],
+                    r2=pl.col(r2_name),
+                    n=pl.col(n_name),
+                )
+            )
+        else:
+            powers = ["", f" * {x_name}"]
+            powers += [f" * {x_name}^{k}" for k in range(2, degree + 1)]
+            terms = [
+                pl.format("{}" + power, pl.col(c).round_sig_figs(4))
+                for power, c in zip(powers, coef_names)
+            ]
+            tooltip_template = pl.concat_str(
+                pl.lit(f"{y_name} = "),
+                (
+                    pl.lit(f"loess({x_name})")
+                    if method == "loess"
+                    else pl.concat_str(terms, separator=" + ")
+                ),
+                pl.lit("<br>"),
+                pl.format(
+                    "R²={}, n={}", pl.col(r2_name).round_sig_figs(4), pl.col(n_name)
+                ),
+            )
+            if len(by) > 0:
+                tooltip_template = pl.concat_str(
+                    pl.lit("<b>"),
+                    pl.col(group_name).cast(pl.String),
+                    pl.lit("</b><br>"),
+                    tooltip_template,
+                )
+
+        legend_spec: GlyphLegendSpec | None = (
+            {"legend_type": "group", "legend_value": legend_name}
+            if len(style_by) > 0
+            else None
+        )
+        if ci is not None:
+            band_styles = keysafe_typeddict(styles_d, FillProps)
+            band_styles.setdefault("fill_alpha", 0.2)
+            render_glyph(
+                name="ci",
+                data=stats_data.filter(pl.col(m_internal("mas.trend.valid"))),
+                facet_filter=None,
+                glyph=bm.Patches(
+                    xs=band_xs_name,
+                    ys=band_ys_name,
+                    line_color=None,
+                    **band_styles,
+                ),
+                figure=figure,
+                level="underlay",
+            )
+        render_glyph(
+            name=group_name or y_name,
+            data=stats_data,
+            facet_filter=None,
+            glyph=bm.MultiLine(
+                xs=xs_name,
+                ys=ys_name,
+                **keysafe_typeddict(styles_d, LineProps),
+            ),
+            figure=figure,
+            legend=legend,
+            legend_spec=legend_spec,
+            tooltip_template=tooltip_template,
+        )
+
+        super().__call__(
+            figure=figure,
+            legend=legend,
+            data=data,
+            facet_filter=facet_filter,
+        )
+
+    def with_hover_template(self, hover_callable: TrendHoverTemplate) -> Self:
+        self_ = self.copy()
+        self_._spec["hover_template"] = hover_callable
+        return self_
@@ -0,0 +1,279 @@
+from dataclasses import dataclass
+from typing import Any, Literal, Protocol, TypedDict
+
+import bokeh.models as bm
+import numpy as np
+import polars as pl
+from typing_extensions import NotRequired, Self, Unpack
+
+from mas.libs.phanpy.plotting.composable.glyphs.area import (
+    HArea,
+    VArea,
+    VAreaGlyphStyles,
+)
+from mas.libs.phanpy.plotting.composable.plot import Plot
+from mas.libs.phanpy.plotting.composable.stats.density import (
+    BandwidthMethod,
+    grouped_kde,
+)
+from mas.libs.phanpy.plotting.constants import m_internal
+from mas.libs.phanpy.plotting.facet import (
+    FacetFilter,
+    apply_facet_filter,
+    split_facet_filter_for_stats,
+)
+from mas.libs.phanpy.plotting.factor import (
+    as_factor_columns,
+    categorical_side,
+    ensure_factors,
+)
+from mas.libs.phanpy.plotting.field import (
+    DataSpec,
+    get_field_props,
+    interpret_data_spec,
+    materialize_field_props,
+)
+from mas.libs.phanpy.plotting.layer.plot import PlotConstructorProps
+from mas.libs.phanpy.plotting.traits import FillStyleableTrait
+from mas.libs.phanpy.types.typeddict import keysafe_typeddict
+
+ViolinScale = Literal["width", "area", "count"]
+
+
+@dataclass
+class ViolinHoverTemplateParams:
+    cat: pl.Expr
+    value: pl.Expr
+    density: pl.Expr
+
+
+class ViolinHoverTemplate(Protocol):
+    def __call__(self, params: ViolinHoverTemplateParams) -> pl.Expr: ...
+
+
+class ViolinSpec(TypedDict):
+    x: DataSpec
+    y: DataSpec
+
+    bw_method: NotRequired[BandwidthMethod]
+    gridsize: NotRequired[int]
+    cut: NotRequired[float]
+    # width: 每个 violin 的最大宽度相同
+    # area: 每个 violin 的面积相同
+    # count: 面积和样本数量成正比
+    scale: NotRequired[ViolinScale]
+    # 每个 violin 的宽度，默认与 BoxPlot 相同
+    width: NotRequired[float]
+
+    hover_template: NotRequired[ViolinHoverTemplate]
+
+
+class ViolinConstructorProps(
+    ViolinSpec,
+    VAreaGlyphStyles,
+    PlotConstructorProps,
+):
+    pass
+
+
+def _factor_centers(range_: bm.Range) -> dict[Any, float]:
+    """FactorRange 中每个 factor 的中心在 synthetic 坐标中的位置"""
+    if not isinstance(range_, bm.FactorRange):
+        raise ValueError(
+            "Violin requires a categorical axis, "
+            'e.g. x_ax={"typ": "categorical"}'
+        )
+    centers: dict[Any, float] = {}
+    for idx, factor in enumerate(range_.factors):
+        if not isinstance(factor, str):
+            raise ValueError("Violin only supports single level factors")
+        centers[factor] = 0.5 + idx * (1 + range_.factor_padding)
+    return centers
+
+
+class Violin(
+    Plot,
+    FillStyleableTrait[VAreaGlyphStyles],
+):
+    """小提琴图，每个分类 (以及样式分组) 的核密度估计沿分类轴对称展开"""
+
+    Styles = VAreaGlyphStyles
+
+    def __init__(
+        self,
+        **props: Unpack[ViolinConstructorProps],
+    ) -> None:
+        super().__init__(**keysafe_typeddict(props, PlotConstructorProps))
+        self._spec = keysafe_typeddict(props, ViolinSpec)
+        self._styles = keysafe_typeddict(props, VAreaGlyphStyles) or Violin.Styles()
+
+    def __call__(
+        self,
+        figure: bm.Plot,
+        legend: bm.Legend,
+        data: pl.DataFrame | None,
+        facet_filter: FacetFilter | None,
+    ) -> None:
+        data, (x_name, y_name) = interpret_data_spec(
+            data=self._data,
+            x=self._spec["x"],
+            y=self._spec["y"],
+        )
+
+        if categorical_side(figure, data, x_name, y_name) == "y":
+            stats_on_name = x_name
+            cat_on_name = y_name
+            ensure_factors(
+                figure.y_range,
+                data,
+                cat_on_name,
+                source=self._data,
+                spec=(self._spec["y"],),
+            )
+            centers = _factor_centers(figure.y_range)
+            dimension = "width"
+        else:
+            stats_on_name = y_name
+            cat_on_name = x_name
+            ensure_factors(
+                figure.x_range,
+                data,
+                cat_on_name,
+                source=self._data,
+                spec=(self._spec["x"],),
+            )
+            centers = _factor_centers(figure.x_range)
+            dimension = "height"
+        data = as_factor_columns(data, cat_on_name)
+
+        styles_d: dict[str, Any] = {"fill_alpha": 0.7, **self._styles}
+        styles_d, data = materialize_field_props(styles_d, data)
+        field_props = get_field_props(styles_d)
+        by = [
+            *dict.fromkeys(
+                c.column_name
+                for c in field_props.values()
+                if c.column_name != cat_on_name
+            )
+        ]
+
+        stats_facet_filter, glyph_facet_filter = split_facet_filter_for_stats(
+            facet_filter, [cat_on_name, *by]
+        )
+        data = apply_facet_filter(data, stats_facet_filter)
+
+        # 所有 violin 一次性计算核密度
+        kde = grouped_kde(
+            data,
+            stats_on_name,
+            by=[cat_on_name, *by],
+            gridsize=self._spec.get("gridsize", 256),
+            bw_method=self._spec.get("bw_method", "scott"),
+            cut=self._spec.get("cut", 2.0),
+        )
+
+        scale = self._spec.get("scale", "width")
+        density = kde.density
+        if scale == "count":
+            density = density * kde.n[:, None]
+        if scale == "width":
+            peak = density.max(axis=1, keepdims=True)
+            density = density / np.where(peak > 0, peak, 1.0)
+        else:
+            peak = density.max() if density.size > 0 else 0.0
+            density = density / (peak if peak > 0 else 1.0)
+
+        value_name = m_internal("mas.violin.value")
+        density_name = m_internal("mas.violin.density")
+        lower_name = m_internal("mas.violin.lower")
+        upper_name = m_internal("mas.violin.upper")
+
+        hover_template = self._spec.get("hover_template", None)
+        if hover_template is not None:
+            tooltip_template = hover_template(
+                ViolinHoverTemplateParams(
+                    cat=pl.col(cat_on_name),
+                    value=pl.col(value_name),
+                    density=pl.col(density_name),
+                )
+            )
+        else:
+            tooltip_template = pl.concat_str(
+                pl.lit("<b>"),
+                pl.concat_str([pl.col(c) for c in [cat_on_name, *by]], separator=","),
+                pl.lit("</b><br>"),
+                pl.format(f"{stats_on_name}={{}}", pl.col(value_name)),
+            )
+
+        keys = kde.keys.with_row_index(m_internal("mas.violin.index"))
+        for (cat,), grouped_keys in keys.group_by(cat_on_name, maintain_order=True):
+            if cat not in centers:
+                continue
+            if len(by) > 0:
+                grouped_keys = grouped_keys.sort(*by)
+            n_subgroups = grouped_keys.height
+            size = self._spec.get("width", 0.5 / n_subgroups)
+            if n_subgroups == 1:
+                dodge_values = [0.0]
+            else:
+                dodge_values = np.linspace(-0.25, 0.25, n_subgroups)
+
+            for idx, dodge_value in enumerate(dodge_values):
+                key = grouped_keys[idx]
+                i = key[0, 0]
+                if kde.n[i] == 0:
+                    continue
+                # 每个 violin 只画在自身数据范围 (加上 cut * bw) 内
+                mask = (kde.grid >= kde.support[i, 0]) & (
+                    kde.grid <= kde.support[i, 1]
+                )
+                center = centers[cat] + dodge_value
+                half_width = density[i, mask] * size / 2
+                violin_data = pl.DataFrame(
+                    {
+                        value_name: kde.grid[mask],
+                        density_name: kde.density[i, mask],
+                        lower_name: center - half_width,
+                        upper_name: center + half_width,
+                    }
+                ).with_columns(
+                    pl.lit(key[name][0]).alias(name) for name in [cat_on_name, *by]
+                )
+                violin_data = apply_facet_filter(violin_data, glyph_facet_filter)
+                if violin_data.height == 0:
+                    continue
+
+                if dimension == "height":
+                    glyph = HArea(
+                        x1=pl.col(lower_name),
+                        x2=pl.col(upper_name),
+                        y=pl.col(value_name),
+                        name=str(cat),
+                        **styles_d,
+                    )
+                else:
+                    glyph = VArea(
+                        x=pl.col(value_name),
+                        y1=pl.col(lower_name),
+                        y2=pl.col(upper_name),
+                        name=str(cat),
+                        **styles_d,
+                    )
+                glyph.with_hover_tooltip(tooltip_template)._draw(
+                    figure=figure,
+                    legend=legend,
+                    data=violin_data,
+                    facet_filter=None,
+                )
+
+        super().__call__(
+            figure=figure,
+            legend=legend,
+            data=data,
+            facet_filter=facet_filter,
+        )
+
+    def with_hover_template(self, hover_callable: ViolinHoverTemplate) -> Self:
+        self_ = self.copy()
+        self_._spec["hover_template"] = hover_callable
+        return self_
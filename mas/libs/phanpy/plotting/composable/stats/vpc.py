@@ -0,0 +1,373 @@
+from dataclasses import dataclass
+from typing import Any, Literal, Sequence, TypedDict
+
+import bokeh.models as bm
+import numpy as np
+import numpy.typing as npt
+import polars as pl
+from typing_extensions import NotRequired, Unpack
+
+from mas.libs.phanpy.plotting.binning import bin_index
+from mas.libs.phanpy.plotting.composable.glyphs.area import VArea
+from mas.libs.phanpy.plotting.composable.glyphs.line import Line
+from mas.libs.phanpy.plotting.composable.glyphs.scatter import Scatter
+from mas.libs.phanpy.plotting.composable.plot import Plot
+from mas.libs.phanpy.plotting.constants import m_internal
+from mas.libs.phanpy.plotting.facet import FacetFilter, apply_facet_filter
+from mas.libs.phanpy.plotting.field import interpret_data_spec
+from mas.libs.phanpy.plotting.layer.plot import PlotConstructorProps
+from mas.libs.phanpy.plotting.props import FillProps, LineProps
+from mas.libs.phanpy.plotting.traits import FillStyleableTrait, LineStyleableTrait
+from mas.libs.phanpy.types.color import ColorLike
+from mas.libs.phanpy.types.typeddict import keysafe_typeddict
+
+VPCBinning = Literal["quantile", "uniform"]
+VPCSimulated = pl.DataFrame | pl.LazyFrame
+
+# 模拟数据为 pl.LazyFrame 时每次读取的重复次数
+REPLICATES_PER_CHUNK = 50
+
+# 与 PsN/xpose 的配色一致: 中位数为红色，两侧的分位数为蓝色
+DEFAULT_MEDIAN_COLOR = "#e6550d"
+DEFAULT_OUTER_COLOR = "#3182bd"
+
+
+class VPCGlyphStyles(FillProps, LineProps):
+    pass
+
+
+class VPCSpec(TypedDict):
+    # 同时作用于观测数据和 (可能是 pl.LazyFrame 的) 模拟数据，只支持表达式
+    x: pl.Expr
+    y: pl.Expr
+    # 模拟数据中表示第几次重复的列
+    replicate: str
+
+    # bin 的数量 (按 binning 划分) 或者 bin 的边界
+    bins: NotRequired[int | Sequence[float]]
+    # quantile: 每个 bin 中的观测值数量相近; uniform: 等宽
+    binning: NotRequired[VPCBinning]
+    percentiles: NotRequired[Sequence[float]]
+    # 每个分位数在各次重复之间的置信区间
+    ci: NotRequired[float]
+    # 是否画出观测值
+    show_observed: NotRequired[bool]
+
+
+class VPCConstructorProps(
+    VPCSpec,
+    VPCGlyphStyles,
+    PlotConstructorProps,
+    total=False,
+):
+    simulated: VPCSimulated
+
+
+@dataclass
+class VPCResult:
+    """每个 bin 的观测分位数，以及模拟分位数在各次重复之间的置信区间
+
+    `observed` 的形状为 (n_bins, n_percentiles)，`simulated` 的形状为
+    (n_bins, n_percentiles, 3)，最后一维为 (下限, 中位数, 上限)
+    """
+
+    edges: npt.NDArray[np.float64]
+    x: npt.NDArray[np.float64]
+    percentiles: list[float]
+    observed: npt.NDArray[np.float64]
+    simulated: npt.NDArray[np.float64]
+
+
+def vpc_bin_edges(
+    x: pl.Series, bins: int | Sequence[float], binning: VPCBinning
+) -> npt.NDArray[np.float64]:
+    if not isinstance(bins, int):
+        return np.asarray(bins, dtype=np.float64)
+    x = x.drop_nulls().drop_nans().cast(pl.Float64)
+    if x.len() == 0:
+        return np.linspace(0, 1, bins + 1)
+    if binning == "uniform":
+        return np.linspace(x.min(), x.max(), bins + 1)  # pyright: ignore[reportArgumentType]
+    # 相同的时间点 (例如计划采样时间) 不会被分到两个 bin 中
+    edges = np.unique(np.quantile(x.to_numpy(), np.linspace(0, 1, bins + 1)))
+    if edges.size < 2:
+        # 所有观测值的 x 相同
+        return np.array([edges[0] - 0.5, edges[0] + 0.5])
+    return edges
+
+
+def compute_vpc(
+    observed: pl.DataFrame,
+    simulated: VPCSimulated,
+    x: pl.Expr,
+    y: pl.Expr,
+    replicate: str,
+    edges: npt.NDArray[np.float64],
+    percentiles: Sequence[float] = (0.05, 0.5, 0.95),
+    ci: float = 0.95,
+    replicates_per_chunk: int = REPLICATES_PER_CHUNK,
+) -> VPCResult:
+    """两次分组聚合完成所有 bin 和重复的计算
+
+    1. 按 (replicate, bin) 计算模拟数据的分位数
+    2. 按 bin 计算各个分位数在重复之间的置信区间
+
+    分位数的聚合无法用 streaming 引擎分块执行，所以模拟数据为 `pl.LazyFrame` 时
+    每次只读取 `replicates_per_chunk` 次重复完成第一步，内存只和一批重复的行数有关，
+    代价是数据源会被读取多次
+    """
+    n_bins = len(edges) - 1
+    bin_name = m_internal("mas.vpc.bin")
+    x_name = m_internal("mas.vpc.x")
+    y_name = m_internal("mas.vpc.y")
+    percentiles = [*percentiles]
+    p_names = [m_internal(f"mas.vpc.p{i}") for i in range(len(percentiles))]
+
+    def _binned(lazy: pl.LazyFrame, *columns: str) -> pl.LazyFrame:
+        lazy = lazy.select(
+            *columns,
+            x.cast(pl.Float64).alias(x_name),
+            y.cast(pl.Float64).alias(y_name),
+        ).filter(
+            pl.col(x_name).is_not_null()
+            & pl.col(y_name).is_not_null()
+            & pl.col(x_name).is_not_nan()
+            & pl.col(y_name).is_not_nan()
+        )
+        # 超出观测数据范围的模拟值归入第一个/最后一个 bin
+        return lazy.with_columns(
+            bin_index(pl.col(x_name), edges, bin_name).clip(0, n_bins - 1)
+        )
+
+    def _percentiles() -> list[pl.Expr]:
+        return [
+            pl.col(y_name).quantile(p, "linear").alias(name)
+            for p, name in zip(percentiles, p_names)
+        ]
+
+    obs = (
+        _binned(observed.lazy())
+        .group_by(bin_name)
+        .agg(pl.col(x_name).mean(), *_percentiles())
+        .collect()
+    )
+
+    def _replicate_percentiles(lazy: pl.LazyFrame) -> pl.DataFrame:
+        return (
+            _binned(lazy, replicate)
+            .group_by(replicate, bin_name)
+            .agg(*_percentiles())
+            .collect()
+        )
+
+    if isinstance(simulated, pl.DataFrame):
+        per_replicate = _replicate_percentiles(simulated.lazy())
+    else:
+        replicates = (
+            simulated.select(pl.col(replicate).unique().sort())
+            .collect(streaming=True)
+            .to_series()
+        )
+        # 空的结果保证没有任何重复时 schema 仍然正确
+        chunks = [_replicate_percentiles(simulated.clear())]
+        for i in range(0, replicates.len(), replicates_per_chunk):
+            chunk = replicates.slice(i, replicates_per_chunk)
+            chunks.append(
+                _replicate_percentiles(simulated.filter(pl.col(replicate).is_in(chunk)))
+            )
+        per_replicate = pl.concat(chunks)
+
+    lower, upper = (1 - ci) / 2, 1 - (1 - ci) / 2
+    sim = per_replicate.group_by(bin_name).agg(
+        *[
+            pl.col(name).quantile(q, "linear").alias(f"{name}.{i}")
+            for name in p_names
+            for i, q in enumerate((lower, 0.5, upper))
+        ]
+    )
+
+    bin_x = np.full(n_bins, np.nan)
+    observed_ = np.full((n_bins, len(percentiles)), np.nan)
+    simulated_ = np.full((n_bins, len(percentiles), 3), np.nan)
+    index = obs[bin_name].to_numpy()
+    bin_x[index] = obs[x_name].to_numpy()
+    for j, name in enumerate(p_names):
+        observed_[index, j] = obs[name].to_numpy()
+    index = sim[bin_name].to_numpy()
+    for j, name in enumerate(p_names):
+        for i in range(3):
+            simulated_[index, j, i] = sim[f"{name}.{i}"].to_numpy()
+    # 没有观测数据的 bin 放在中点
+    mid = (edges[:-1] + edges[1:]) / 2
+    bin_x = np.where(np.isnan(bin_x), mid, bin_x)
+
+    return VPCResult(
+        edges=edges,
+        x=bin_x,
+        percentiles=percentiles,
+        observed=observed_,
+        simulated=simulated_,
+    )
+
+
+def _filter_simulated(
+    simulated: VPCSimulated, facet_filter: FacetFilter | None
+) -> VPCSimulated:
+    if isinstance(simulated, pl.DataFrame):
+        return apply_facet_filter(simulated, facet_filter)
+    if facet_filter is None:
+        return simulated
+    names = simulated.collect_schema().names()
+    # 与 apply_facet_filter 一致，缺少 facet 列时不过滤
+    if any(k not in names for k in facet_filter.keys()):
+        return simulated
+    for k, v in facet_filter.items():
+        simulated = simulated.filter(pl.col(k) == v)
+    return simulated
+
+
+class VPC(
+    Plot,
+    LineStyleableTrait[VPCGlyphStyles],
+    FillStyleableTrait[VPCGlyphStyles],
+):
+    """Visual predictive check
+
+    `data` 为观测数据，`simulated` 为模拟数据 (包含 `replicate` 列)，可以是
+    `pl.LazyFrame`；facet 同时作用于观测数据和模拟数据
+    """
+
+    Styles = VPCGlyphStyles
+
+    def __init__(
+        self,
+        **props: Unpack[VPCConstructorProps],
+    ) -> None:
+        simulated = props.pop("simulated")
+        super().__init__(**keysafe_typeddict(props, PlotConstructorProps))
+        self._simulated = simulated
+        self._spec = keysafe_typeddict(props, VPCSpec)
+        self._styles = keysafe_typeddict(props, VPCGlyphStyles) or VPC.Styles()
+
+    def __deepcopy_memo__(self) -> list[int]:
+        # 模拟数据通常很大，复制时共享
+        return [*super().__deepcopy_memo__(), id(self._simulated)]
+
+    def __call__(
+        self,
+        figure: bm.Plot,
+        legend: bm.Legend,
+        data: pl.DataFrame | None,
+        facet_filter: FacetFilter | None,
+    ) -> None:
+        if self._data is None:
+            raise ValueError("VPC requires the observed data")
+        x_spec, y_spec = self._spec["x"], self._spec["y"]
+
+        # bin 根据全部观测数据计算，保证各个 facet 的 bin 一致
+        edges = vpc_bin_edges(
+            self._data.select(x_spec).to_series(),
+            bins=self._spec.get("bins", 8),
+            binning=self._spec.get("binning", "quantile"),
+        )
+        observed = apply_facet_filter(self._data, facet_filter)
+        result = compute_vpc(
+            observed,
+            _filter_simulated(self._simulated, facet_filter),
+            x=x_spec,
+            y=y_spec,
+            replicate=self._spec["replicate"],
+            edges=edges,
+            percentiles=self._spec.get("percentiles", (0.05, 0.5, 0.95)),
+            ci=self._spec.get("ci", 0.95),
+        )
+
+        x_name = m_internal("mas.vpc.x")
+        lower_name = m_internal("mas.vpc.lower")
+        median_name = m_internal("mas.vpc.median")
+        upper_name = m_internal("mas.vpc.upper")
+        observed_name = m_internal("mas.vpc.observed")
+        fill_styles: dict[str, Any] = {
+            "fill_alpha": 0.3,
+            **keysafe_typeddict(self._styles, FillProps),
+        }
+        line_styles: dict[str, Any] = {
+            "line_width": 2,
+            **keysafe_typeddict(self._styles, LineProps),
+        }
+
+        median_index = int(np.argmin(np.abs(np.asarray(result.percentiles) - 0.5)))
+        for j, p in enumerate(result.percentiles):
+            default_color: ColorLike = (
+                DEFAULT_MEDIAN_COLOR if j == median_index else DEFAULT_OUTER_COLOR
+            )
+            bin_data = pl.DataFrame(
+                {
+                    x_name: result.x,
+                    lower_name: result.simulated[:, j, 0],
+                    median_name: result.simulated[:, j, 1],
+                    upper_name: result.simulated[:, j, 2],
+                    observed_name: result.observed[:, j],
+                }
+            )
+            label = f"p{p * 100:g}"
+            VArea(
+                x=pl.col(x_name),
+                y1=pl.col(lower_name),
+                y2=pl.col(upper_name),
+                name=f"{label} simulated",
+                **{"fill_color": default_color, **fill_styles},
+            ).with_hover_tooltip(
+                pl.format(
+                    f"{label} simulated: {{}} [{{}}, {{}}]",
+                    pl.col(median_name),
+                    pl.col(lower_name),
+                    pl.col(upper_name),
+                )
+            )._draw(
+                figure=figure,
+                legend=legend,
+                data=bin_data,
+                facet_filter=None,
+            )
+            Line(
+                x=pl.col(x_name),
+                y=pl.col(observed_name),
+                name=f"{label} observed",
+                **{
+                    "line_color": "#252525",
+                    "line_dash": "solid" if j == median_index else "dashed",
+                    **line_styles,
+                },
+            ).with_hover_tooltip(
+                pl.format(f"{label} observed: {{}}", pl.col(observed_name))
+            )._draw(
+                figure=figure,
+                legend=legend,
+                data=bin_data.filter(pl.col(observed_name).is_not_nan()),
+                facet_filter=None,
+            )
+
+        if self._spec.get("show_observed", True):
+            data_, (x_, y_) = interpret_data_spec(data=observed, x=x_spec, y=y_spec)
+            Scatter(
+                x=pl.col(x_),
+                y=pl.col(y_),
+                name="observed",
+                size=3,
+                fill_color="#969696",
+                line_color=None,
+                fill_alpha=0.5,
+            )._draw(
+                figure=figure,
+                legend=legend,
+                data=data_,
+                facet_filter=None,
+            )
+
+        super().__call__(
+            figure=figure,
+            legend=legend,
+            data=observed,
+            facet_filter=facet_filter,
+        )
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import threading
+import weakref
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Callable, Hashable, TypeVar
+
+from mas.libs.phanpy.plotting.options import plotting_options
+
+T = TypeVar("T")
+
+__all__ = [
+    "RenderCancelledError",
+    "raise_if_render_cancelled",
+    "run_render",
+]
+
+
+class RenderCancelledError(Exception):
+    """渲染被取消 (例如同一个 key 发起了新的渲染请求)"""
+
+
+# 当前线程中正在执行的渲染对应的取消标记，渲染过程中在合适的位置检查
+_cancel_event: contextvars.ContextVar[threading.Event | None] = contextvars.ContextVar(
+    "mas.plotting.render.cancel_event", default=None
+)
+
+
+def raise_if_render_cancelled() -> None:
+    """在耗时的渲染循环中调用 (例如每个子图)，如果渲染已被取消则中断"""
+    event = _cancel_event.get()
+    if event is not None and event.is_set():
+        raise RenderCancelledError()
+
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def _default_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(thread_name_prefix="mas.plotting.render")
+        return _executor
+
+
+# asyncio.Semaphore 绑定在 event loop 上，所以每个 loop 单独维护
+_semaphores: weakref.WeakKeyDictionary[
+    asyncio.AbstractEventLoop, tuple[int, asyncio.Semaphore]
+] = weakref.WeakKeyDictionary()
+
+
+def _render_semaphore(loop: asyncio.AbstractEventLoop) -> asyncio.Semaphore:
+    limit = plotting_options.max_concurrent_renders
+    cached = _semaphores.get(loop, None)
+    if cached is None or cached[0] != limit:
+        cached = (limit, asyncio.Semaphore(limit))
+        _semaphores[loop] = cached
+    return cached[1]
+
+
+class _InflightRender:
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        self.loop = loop
+        self.cancel_event = threading.Event()
+        # 当前等待的 future (信号量或渲染结果)，取消时只取消它，不影响调用方的 task
+        self.waiter: asyncio.Future[object] | None = None
+
+    def supersede(self) -> None:
+        self.cancel_event.set()
+        waiter = self.waiter
+        if waiter is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            waiter.cancel()
+        else:
+            try:
+                self.loop.call_soon_threadsafe(waiter.cancel)
+            except RuntimeError:  # loop 已经关闭
+                pass
+
+
+_inflight: dict[Hashable, _InflightRender] = {}
+
+
+async def run_render(
+    fn: Callable[[], T],
+    key: Hashable | None = None,
+    executor: Executor | None = None,
+) -> T:
+    """在 executor 中执行 `fn`，不阻塞 event loop
+
+    - 同时执行的渲染数量由 `plotting_options.max_concurrent_renders` 限制
+    - 如果提供了 `key`，同一个 key 上新的请求会取消还未完成的旧请求，
+      旧请求的 await 会抛出 `asyncio.CancelledError` (调用方的 task 本身不会被取消)
+    """
+    loop = asyncio.get_running_loop()
+    inflight = _InflightRender(loop)
+    if key is not None:
+        previous = _inflight.get(key, None)
+        if previous is not None:
+            previous.supersede()
+        _inflight[key] = inflight
+
+    semaphore = _render_semaphore(loop)
+    try:
+        acquire = asyncio.ensure_future(semaphore.acquire())
+        inflight.waiter = acquire
+        try:
+            await acquire
+        finally:
+            inflight.waiter = None
+        if inflight.cancel_event.is_set():
+            semaphore.release()
+            raise asyncio.CancelledError()
+
+        def _run() -> T:
+            _cancel_event.set(inflight.cancel_event)
+            return fn()
+
+        ctx = contextvars.copy_context()
+        try:
+            future: Future[T] = (executor or _default_executor()).submit(
+                ctx.run, _run
+            )
+        except BaseException:
+            # 例如 executor 已经 shutdown，没有线程会释放信号量
+            semaphore.release()
+            raise
+
+        # 信号量要等到线程真正结束才释放，而不是 await 被取消的时候
+        def _release(_: Future[T]) -> None:
+            try:
+                loop.call_soon_threadsafe(semaphore.release)
+            except RuntimeError:  # loop 已经关闭
+                pass
+
+        future.add_done_callback(_release)
+
+        wrapped = asyncio.wrap_future(future, loop=loop)
+        inflight.waiter = wrapped
+        try:
+            return await wrapped
+        except asyncio.CancelledError:
+            inflight.cancel_event.set()
+            raise
+        except RenderCancelledError:
+            raise asyncio.CancelledError()
+        finally:
+            inflight.waiter = None
+    finally:
+        if key is not None and _inflight.get(key, None) is inflight:
+            del _inflight[key]
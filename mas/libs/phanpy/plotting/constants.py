@@ -25,6 +25,8 @@ def is_internal(s: str) -> bool:
 
 
 RENDERER_TAG: Final = m_internal("mas.plotting.renderer")
+# 根据数据预先计算的 Range1d (替代 DataRange1d)，共享轴时可以重新计算
+AUTO_RANGE_TAG: Final = m_internal("mas.plotting.range.auto")
 
 
 GLYPH_FIELD_TOOLTIPS_TAG: Final = m_internal("mas.plotting.glyph.tooltips.field")
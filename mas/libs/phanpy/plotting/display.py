@@ -1,25 +1,61 @@
-import json
+from __future__ import annotations
+
+import os
+import threading
+import weakref
+
+import bokeh.models as bm
 
 from mas.libs.phanpy.plotting.layer.renderable import RenderableTrait
 from mas.libs.phanpy.plotting.options import plotting_options
+from mas.libs.phanpy.plotting.profile import profile_stage
 from mas.libs.phanpy.plotting.setup import setup, setup_notebook
 
 
+# 对象 -> (渲染时的 plotting_options, 渲染结果)
+# 构建方法都是 copy-on-write，返回的新对象不会带上旧的结果
+_display_models: weakref.WeakKeyDictionary[
+    PlotDisplay, tuple[str, bm.LayoutDOM]
+] = weakref.WeakKeyDictionary()
+_display_lock = threading.Lock()
+
+
 class PlotDisplay(RenderableTrait):
+    def _display_model(self) -> bm.LayoutDOM:
+        """用于展示和导出的渲染结果，同一个对象只渲染一次
+
+        IPython 可能同时调用 `_ipython_display_` 和 `_repr_html_`；
+        `plotting_options` 变化后重新渲染。需要修改模型时使用 `render`
+        """
+        options = plotting_options.model_dump_json()
+        with _display_lock:
+            cached = _display_models.get(self, None)
+        if cached is not None and cached[0] == options:
+            return cached[1]
+        model = self.render()
+        with _display_lock:
+            _display_models[self] = (options, model)
+        return model
+
     def _ipython_display_(self) -> None:
         """Display in ipython"""
 
         if plotting_options.static_in_nb:
-            from bokeh.embed import json_item
             from IPython.display import publish_display_data
 
-            publish_display_data(
-                {
-                    "application/vnd.bokehjs.mas.v1+json": json.dumps(
-                        json_item(self.render())
-                    ),
-                }
-            )
+            from mas.libs.phanpy.plotting.payload import static_mime_bundle
+
+            model = self._display_model()
+            with profile_stage("serialize") as stage:
+                mime_type, payload = static_mime_bundle(
+                    model, plotting_options.static_payload
+                )
+                stage.update(
+                    document_bytes=len(
+                        payload if isinstance(payload, str) else payload["data"]
+                    )
+                )
+            publish_display_data({mime_type: payload})
         else:
             self.show()
 
@@ -28,7 +64,7 @@ class PlotDisplay(RenderableTrait):
 
         setup_notebook()
 
-        display = show(self.render())
+        display = show(self._display_model())
         if not display:
             return ""
 
@@ -39,4 +75,21 @@ class PlotDisplay(RenderableTrait):
 
         setup()
 
-        show(self.render())
+        show(self._display_model())
+
+    def to_png(
+        self,
+        filename: str | os.PathLike[str] | None = None,
+        *,
+        scale: float = 1.0,
+    ) -> bytes:
+        """导出为 PNG，不需要浏览器；`scale` 为像素密度"""
+        from mas.libs.phanpy.plotting.export import export_png
+
+        return export_png(self._display_model(), filename, scale=scale)
+
+    def to_svg(self, filename: str | os.PathLike[str] | None = None) -> str:
+        """导出为 SVG，不需要浏览器"""
+        from mas.libs.phanpy.plotting.export import export_svg
+
+        return export_svg(self._display_model(), filename)
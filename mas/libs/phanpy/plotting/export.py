@@ -0,0 +1,2682 @@
+"""不依赖浏览器的静态图片导出 (PNG/SVG)
+
+直接遍历渲染得到的 bokeh 模型树，用 numpy 把支持的 glyph 画到 RGBA 缓冲区
+(PNG) 或者生成 SVG 元素，不需要 selenium/webdriver
+
+- 布局只近似 BokehJS：文字宽度按字号估算，不绘制 toolbar
+- PNG 中的文字需要 Pillow (可选依赖) 提供字体，没有安装时省略文字
+"""
+
+from __future__ import annotations
+
+import abc
+import base64
+import contextlib
+import functools
+import html
+import logging as logger
+import math
+import os
+import re
+import struct
+import zlib
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator, Literal, Sequence
+
+import bokeh.models as bm
+import numpy as np
+import polars as pl
+from bokeh.colors import named
+from bokeh.core.property.vectorization import Field, Unspecified, Value
+
+from mas.libs.phanpy.plotting.profile import profile_stage
+from mas.libs.phanpy.plotting.ranges import _EXTENTS, _FIELDS
+
+__all__ = [
+    "ExportFormat",
+    "export",
+    "export_png",
+    "export_svg",
+]
+
+ExportFormat = Literal["png", "svg"]
+
+# 文字宽度的估算值，相对于字号
+CHAR_WIDTH = 0.6
+LINE_HEIGHT = 1.2
+# 与 bm.DataRange1d 默认的 range_padding 一致
+RANGE_PADDING = 0.1
+# 与 BokehJS 中 renderer level 的绘制顺序一致
+_LEVELS = ("image", "underlay", "glyph", "guide", "annotation", "overlay")
+
+RGBA = np.ndarray  # (n, 4) float64，取值 0 ~ 1
+
+_warned: set[str] = set()
+
+
+def _warn_once(key: str, message: str) -> None:
+    if key not in _warned:
+        _warned.add(key)
+        logger.warning(message)
+
+
+# region colors
+
+
+@functools.lru_cache(maxsize=1024)
+def _parse_color(color: str) -> tuple[float, float, float, float]:
+    c = color.strip().lower()
+    if c.startswith("#"):
+        h = c[1:]
+        if len(h) in (3, 4):
+            h = "".join(ch * 2 for ch in h)
+        if len(h) in (6, 8):
+            r, g, b = (int(h[i : i + 2], 16) / 255 for i in (0, 2, 4))
+            a = int(h[6:8], 16) / 255 if len(h) == 8 else 1.0
+            return r, g, b, a
+    elif c.startswith("rgb"):
+        parts = re.split(r"[\s,/]+", c[c.find("(") + 1 : c.rfind(")")].strip())
+        if len(parts) in (3, 4):
+            r, g, b = (float(p) / 255 for p in parts[:3])
+            a = 1.0
+            if len(parts) == 4:
+                a = float(parts[3].rstrip("%")) / (100 if "%" in parts[3] else 1)
+            return r, g, b, a
+    elif c in ("transparent", "none"):
+        return 0.0, 0.0, 0.0, 0.0
+    else:
+        nc = getattr(named, c, None)
+        if isinstance(nc, named.NamedColor):
+            return nc.r / 255, nc.g / 255, nc.b / 255, 1.0
+    _warn_once(f"color:{color}", f"unknown color {color!r}, drawn as transparent")
+    return 0.0, 0.0, 0.0, 0.0
+
+
+def _color_tuple(color: Any) -> tuple[float, float, float, float]:
+    if color is None:
+        return 0.0, 0.0, 0.0, 0.0
+    if isinstance(color, str):
+        return _parse_color(color)
+    if isinstance(color, (tuple, list)) and len(color) in (
+        3,
+        4,
+    ):  # pyright: ignore[reportUnknownArgumentType]
+        r, g, b = (
+            float(v) / 255 for v in color[:3]
+        )  # pyright: ignore[reportUnknownVariableType]
+        return (
+            r,
+            g,
+            b,
+            float(color[3]) if len(color) == 4 else 1.0,
+        )  # pyright: ignore[reportUnknownArgumentType]
+    if hasattr(color, "to_rgb"):
+        rgb = color.to_rgb()
+        return rgb.r / 255, rgb.g / 255, rgb.b / 255, float(rgb.a)
+    return _parse_color(str(color))
+
+
+def _rgba(color: Any, alpha: Any, n: int) -> RGBA:
+    """把标量或者逐行的颜色/透明度转换为 (n, 4) 的数组"""
+    if isinstance(color, np.ndarray) and color.ndim == 2:
+        # 已经由 color mapper 转换为 RGBA
+        out = color.astype(np.float64, copy=True)
+    elif isinstance(color, np.ndarray):
+        # None 被转换为 "None"，按 "none" 解析为透明
+        values, inverse = np.unique(color.astype(str), return_inverse=True)
+        table = np.array([_parse_color(v) for v in values], dtype=np.float64)
+        out = table[inverse.reshape(-1)]
+    else:
+        out = np.tile(np.asarray(_color_tuple(color), dtype=np.float64), (n, 1))
+    if alpha is not None:
+        out[:, 3] *= np.broadcast_to(np.asarray(alpha, dtype=np.float64), n)
+    return out
+
+
+def _palette_rgba(palette: Sequence[Any]) -> RGBA:
+    return np.array([_color_tuple(c) for c in palette], dtype=np.float64)
+
+
+def _map_colors(mapper: bm.ColorMapper, values: np.ndarray) -> RGBA:
+    nan_color = np.asarray(_color_tuple(mapper.nan_color))
+    if isinstance(mapper, bm.CategoricalColorMapper):
+        palette = _palette_rgba(mapper.palette)
+        index = {f: i % len(palette) for i, f in enumerate(mapper.factors)}
+        return _map_factors(values, index, palette, nan_color)
+    if isinstance(mapper, (bm.LinearColorMapper, bm.LogColorMapper)):
+        palette = _palette_rgba(mapper.palette)
+        v = np.asarray(values, dtype=np.float64)
+        log = isinstance(mapper, bm.LogColorMapper)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            finite = np.isfinite(v) & ((v > 0) if log else True)
+            low = (
+                mapper.low
+                if mapper.low is not None
+                else np.nanmin(v[finite], initial=np.inf)
+            )
+            high = (
+                mapper.high
+                if mapper.high is not None
+                else np.nanmax(v[finite], initial=-np.inf)
+            )
+            if log:
+                v, low, high = (
+                    np.log(v),
+                    math.log(max(low, 1e-300)),
+                    math.log(max(high, 1e-300)),
+                )
+            span = (high - low) or 1.0
+            k = np.floor((v - low) / span * len(palette))
+        k = np.clip(np.nan_to_num(k, nan=0), 0, len(palette) - 1).astype(np.intp)
+        out = palette[k]
+        out[~finite] = nan_color
+        return out
+    _warn_once(
+        f"mapper:{type(mapper).__name__}",
+        f"color mapper {type(mapper).__name__} is not supported in static export",
+    )
+    return np.tile(nan_color, (len(values), 1))
+
+
+def _map_factors(
+    values: np.ndarray, index: dict[Any, int], table: np.ndarray, default: Any
+) -> np.ndarray:
+    keys = [_factor_key(v) for v in values]
+    k = np.array([index.get(v, -1) for v in keys], dtype=np.intp)
+    out = (
+        table[np.maximum(k, 0)]
+        if len(table) > 0
+        else np.empty((len(k), *np.shape(default)))
+    )
+    out[k < 0] = default
+    return out
+
+
+# endregion
+
+# region data
+
+
+def _factor_key(value: Any) -> Any:
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return tuple(value)  # pyright: ignore[reportUnknownArgumentType]
+    return value
+
+
+def _column(values: Any) -> np.ndarray:
+    if isinstance(values, np.ndarray):
+        return values
+    if isinstance(values, pl.Series):
+        if not isinstance(values.dtype, (pl.List, pl.Array)):
+            return values.to_numpy()
+        # 列表列 (MultiLine/Patches 的 xs/ys)：展开一次再按长度切分
+        out = np.empty(len(values), dtype=object)
+        lengths = values.list.len().fill_null(0).to_numpy()
+        if (lengths == 0).any():
+            # 空列表展开后是一个 null，无法按长度切分
+            out[:] = [np.asarray(v if v is not None else []) for v in values.to_list()]
+        else:
+            out[:] = np.split(values.list.explode().to_numpy(), np.cumsum(lengths)[:-1])
+        return out
+    values = list(values)
+    if len(values) > 0 and isinstance(values[0], (list, tuple, np.ndarray)):
+        # 每行是一个数组 (MultiLine/Patches 等)，保持为 object 数组
+        out = np.empty(len(values), dtype=object)
+        out[:] = [np.asarray(v) for v in values]
+        return out
+    return np.asarray(values)
+
+
+def _filter_mask(filter_: Any, data: dict[str, Any], n: int) -> np.ndarray:
+    if filter_ is None or isinstance(filter_, bm.AllIndices):
+        return np.ones(n, dtype=bool)
+    if isinstance(filter_, bm.IndexFilter):
+        mask = np.zeros(n, dtype=bool)
+        if filter_.indices is not None:
+            mask[np.asarray(filter_.indices, dtype=np.intp)] = True
+        return mask
+    if isinstance(filter_, bm.BooleanFilter):
+        if filter_.booleans is None:
+            return np.ones(n, dtype=bool)
+        return np.asarray(filter_.booleans, dtype=bool)
+    if isinstance(filter_, bm.GroupFilter):
+        return _column(data[filter_.column_name]) == filter_.group
+    if isinstance(filter_, bm.IntersectionFilter):
+        mask = np.ones(n, dtype=bool)
+        for operand in filter_.operands:
+            mask &= _filter_mask(operand, data, n)
+        return mask
+    if isinstance(filter_, bm.UnionFilter):
+        mask = np.zeros(n, dtype=bool)
+        for operand in filter_.operands:
+            mask |= _filter_mask(operand, data, n)
+        return mask
+    if isinstance(filter_, bm.InversionFilter):
+        return ~_filter_mask(filter_.operand, data, n)
+    _warn_once(
+        f"filter:{type(filter_).__name__}",
+        f"filter {type(filter_).__name__} is not supported in static export, ignored",
+    )
+    return np.ones(n, dtype=bool)
+
+
+class _GlyphData:
+    """renderer (或 Whisker 等带有 source 的 annotation) 的数据，按 view 过滤后的行"""
+
+    def __init__(self, model: bm.GlyphRenderer | bm.DataAnnotation) -> None:
+        if isinstance(model, bm.GlyphRenderer):
+            source, view = model.data_source, model.view
+        else:
+            source, view = model.source, None
+        self.data: dict[str, Any] = dict(getattr(source, "data", {}))
+        n = max((len(v) for v in self.data.values()), default=0)
+        filter_ = getattr(view, "filter", None) if view is not None else None
+        self.indices = np.flatnonzero(_filter_mask(filter_, self.data, n))
+        self.n = len(self.indices)
+        self._cache: dict[str, np.ndarray] = {}
+
+    def column(self, name: str) -> np.ndarray:
+        if name not in self._cache:
+            self._cache[name] = _column(self.data[name])[self.indices]
+        return self._cache[name]
+
+    def resolve(self, glyph: bm.Glyph, name: str) -> tuple[Any, Any]:
+        """返回 (值, transform)，值为标量或者逐行的数组"""
+        if name not in glyph.properties():
+            return None, None
+        v = getattr(glyph, name)
+        if isinstance(v, Field):
+            if v.field not in self.data:
+                return None, None
+            transform = v.transform if v.transform is not Unspecified else None
+            return self.column(v.field), transform
+        if isinstance(v, Value):
+            return v.value, None
+        if isinstance(v, dict):
+            if "field" in v and v["field"] in self.data:
+                return self.column(v["field"]), v.get(
+                    "transform", None
+                )  # pyright: ignore[reportUnknownMemberType]
+            return (
+                v.get("value", None),
+                None,
+            )  # pyright: ignore[reportUnknownMemberType]
+        if isinstance(v, str) and v in self.data:
+            return self.column(v), None
+        return v, None
+
+    def value(self, glyph: bm.Glyph, name: str, default: Any = None) -> Any:
+        """不是坐标的属性 (颜色/大小/文字等)，transform 在这里应用"""
+        v, transform = self.resolve(glyph, name)
+        if v is None:
+            return default
+        if transform is None:
+            return v
+        values = (
+            np.asarray(v)
+            if isinstance(v, np.ndarray)
+            else np.full(self.n, v, dtype=object)
+        )
+        if isinstance(transform, bm.ColorMapper):
+            return _map_colors(transform, values)
+        if isinstance(transform, bm.CategoricalMarkerMapper):
+            index = {f: i for i, f in enumerate(transform.factors)}
+            markers = np.asarray(transform.markers, dtype=object)
+            return _map_factors(values, index, markers, transform.default_value)
+        _warn_once(
+            f"transform:{type(transform).__name__}",
+            f"transform {type(transform).__name__} is not supported in static export",
+        )
+        return v
+
+
+# endregion
+
+# region text
+
+
+def _font_px(size: Any) -> float:
+    if isinstance(size, Value):
+        size = size.value
+    if isinstance(size, dict):
+        size = size.get("value", None)  # pyright: ignore[reportUnknownMemberType]
+    if size is None:
+        return 11.0
+    if isinstance(size, (int, float)):
+        return float(size)
+    m = re.fullmatch(r"\s*([\d.]+)\s*(px|pt|em|rem)?\s*", str(size))
+    if m is None:
+        return 11.0
+    v = float(m.group(1))
+    unit = m.group(2) or "px"
+    return v * {"px": 1.0, "pt": 4 / 3, "em": 16.0, "rem": 16.0}[unit]
+
+
+def _text_size(text: str, px: float) -> tuple[float, float]:
+    if px <= 0 or text == "":
+        return 0.0, 0.0
+    lines = text.split("\n")
+    return max(len(s) for s in lines) * px * CHAR_WIDTH, len(lines) * px * LINE_HEIGHT
+
+
+def _label_text(label: Any) -> str:
+    if label is None:
+        return ""
+    if isinstance(label, Value):
+        return str(label.value)
+    if isinstance(label, dict):
+        return str(label.get("value", ""))  # pyright: ignore[reportUnknownMemberType]
+    if isinstance(label, str):
+        return label
+    return str(label)
+
+
+# endregion
+
+# region canvas
+
+
+class _Canvas(abc.ABC):
+    """绘制图元的后端，坐标单位为 CSS 像素，原点在左上角"""
+
+    def __init__(self, width: float, height: float) -> None:
+        self.width = width
+        self.height = height
+
+    @abc.abstractmethod
+    def clip(
+        self, x: float, y: float, w: float, h: float
+    ) -> contextlib.AbstractContextManager[None]: ...
+
+    @abc.abstractmethod
+    def rects(
+        self,
+        x0: np.ndarray,
+        y0: np.ndarray,
+        x1: np.ndarray,
+        y1: np.ndarray,
+        fill: RGBA | None,
+        line: RGBA | None,
+        line_width: float,
+    ) -> None: ...
+
+    @abc.abstractmethod
+    def lines(
+        self,
+        lines: Sequence[tuple[np.ndarray, np.ndarray]],
+        line: RGBA,
+        line_width: float,
+    ) -> None:
+        """折线，NaN 处断开；`line` 为每条折线的颜色"""
+
+    @abc.abstractmethod
+    def polygons(
+        self,
+        polygons: Sequence[tuple[np.ndarray, np.ndarray]],
+        fill: RGBA | None,
+        line: RGBA | None,
+        line_width: float,
+    ) -> None: ...
+
+    @abc.abstractmethod
+    def markers(
+        self,
+        x: np.ndarray,
+        y: np.ndarray,
+        size: np.ndarray,
+        marker: np.ndarray,
+        fill: RGBA,
+        line: RGBA,
+        line_width: float,
+    ) -> None: ...
+
+    @abc.abstractmethod
+    def text(
+        self,
+        x: float,
+        y: float,
+        text: str,
+        px: float,
+        color: tuple[float, float, float, float],
+        align: str = "left",
+        baseline: str = "middle",
+        angle: float = 0.0,
+        italic: bool = False,
+    ) -> None:
+        """`angle` 为逆时针旋转的角度 (弧度)"""
+
+    @abc.abstractmethod
+    def image(
+        self, x0: float, y0: float, x1: float, y1: float, rgba: np.ndarray
+    ) -> None:
+        """`rgba` 为 (h, w, 4) uint8，第一行在上"""
+
+    def fill(
+        self, x: float, y: float, w: float, h: float, color: Any, alpha: Any = None
+    ) -> None:
+        rgba = _rgba(color, alpha, 1)
+        if rgba[0, 3] <= 0:
+            return
+        self.rects(
+            np.array([x]),
+            np.array([y]),
+            np.array([x + w]),
+            np.array([y + h]),
+            rgba,
+            None,
+            0,
+        )
+
+
+def _marker_mask(shape: str, r: float, dx: np.ndarray, dy: np.ndarray) -> np.ndarray:
+    """以 (0, 0) 为中心、半径为 r 的 marker 覆盖的像素"""
+    if r <= 0:
+        return np.zeros(dx.shape, dtype=bool)
+    if shape in ("square", "square_x", "square_cross", "square_dot"):
+        return np.maximum(np.abs(dx), np.abs(dy)) <= r
+    if shape in ("diamond", "diamond_cross", "diamond_dot"):
+        return np.abs(dx) / 1.5 + np.abs(dy) <= r
+    if shape in ("triangle", "triangle_dot", "inverted_triangle"):
+        ty = -dy if shape == "inverted_triangle" else dy
+        # 顶点在上的等边三角形
+        return (ty <= r / 2) & (ty >= -r + np.abs(dx) * math.sqrt(3))
+    if shape in ("plus", "cross"):
+        return (np.abs(dx) <= r) & (np.abs(dy) <= r)
+    return dx * dx + dy * dy <= r * r
+
+
+_LINE_MARKERS = ("plus", "cross", "x", "y", "asterisk", "dash")
+
+
+class _RasterCanvas(_Canvas):
+    def __init__(self, width: float, height: float, scale: float = 1.0) -> None:
+        super().__init__(width, height)
+        self.scale = scale
+        self.w = max(int(math.ceil(width * scale)), 1)
+        self.h = max(int(math.ceil(height * scale)), 1)
+        self.buf = np.ones((self.h, self.w, 4), dtype=np.float32)
+        self._clip = (0, 0, self.w, self.h)
+
+    @contextlib.contextmanager
+    def clip(self, x: float, y: float, w: float, h: float) -> Iterator[None]:
+        s = self.scale
+        old = self._clip
+        self._clip = (
+            max(old[0], int(round(x * s))),
+            max(old[1], int(round(y * s))),
+            min(old[2], int(round((x + w) * s))),
+            min(old[3], int(round((y + h) * s))),
+        )
+        try:
+            yield
+        finally:
+            self._clip = old
+
+    def _blend(self, ys: np.ndarray, xs: np.ndarray, rgba: RGBA) -> None:
+        x0, y0, x1, y1 = self._clip
+        keep = (xs >= x0) & (xs < x1) & (ys >= y0) & (ys < y1) & (rgba[:, 3] > 0)
+        if not keep.all():
+            ys, xs, rgba = ys[keep], xs[keep], rgba[keep]
+        if ys.size == 0:
+            return
+        if (rgba[:, 3] >= 1).all():
+            # 不透明时直接覆盖，重复的像素以最后一次为准
+            self.buf[ys, xs] = rgba.astype(np.float32)
+            return
+        # 同一像素只画最后一次，避免半透明的像素被重复叠加
+        lin = ys * self.w + xs
+        _, last = np.unique(lin[::-1], return_index=True)
+        last = lin.size - 1 - last
+        ys, xs, rgba = ys[last], xs[last], rgba[last].astype(np.float32)
+        a = rgba[:, 3:4]
+        dst = self.buf[ys, xs]
+        out = np.empty_like(dst)
+        out[:, :3] = rgba[:, :3] * a + dst[:, :3] * (1 - a)
+        out[:, 3:] = a + dst[:, 3:] * (1 - a)
+        self.buf[ys, xs] = out
+
+    def _blend_block(
+        self, x0: int, y0: int, x1: int, y1: int, rgba: np.ndarray
+    ) -> None:
+        cx0, cy0, cx1, cy1 = self._clip
+        x0, y0, x1, y1 = max(x0, cx0), max(y0, cy0), min(x1, cx1), min(y1, cy1)
+        if x1 <= x0 or y1 <= y0:
+            return
+        block = self.buf[y0:y1, x0:x1]
+        a = rgba[3]
+        block[..., :3] = rgba[:3] * a + block[..., :3] * (1 - a)
+        block[..., 3] = a + block[..., 3] * (1 - a)
+
+    def rects(
+        self,
+        x0: np.ndarray,
+        y0: np.ndarray,
+        x1: np.ndarray,
+        y1: np.ndarray,
+        fill: RGBA | None,
+        line: RGBA | None,
+        line_width: float,
+    ) -> None:
+        s = self.scale
+        lx, hx = np.minimum(x0, x1) * s, np.maximum(x0, x1) * s
+        ly, hy = np.minimum(y0, y1) * s, np.maximum(y0, y1) * s
+        ok = np.isfinite(lx) & np.isfinite(hx) & np.isfinite(ly) & np.isfinite(hy)
+        cx0, cy0, cx1, cy1 = self._clip
+        ix0 = np.clip(np.round(lx), cx0, cx1).astype(np.intp)
+        ix1 = np.clip(np.round(hx), cx0, cx1).astype(np.intp)
+        iy0 = np.clip(np.round(ly), cy0, cy1).astype(np.intp)
+        iy1 = np.clip(np.round(hy), cy0, cy1).astype(np.intp)
+        if fill is not None:
+            for i in np.flatnonzero(ok & (fill[:, 3] > 0) & (ix1 > ix0) & (iy1 > iy0)):
+                self._blend_block(
+                    ix0[i], iy0[i], ix1[i], iy1[i], fill[i].astype(np.float32)
+                )
+        if line is not None and line_width > 0:
+            idx = np.flatnonzero(ok & (line[:, 3] > 0))
+            if idx.size == 0:
+                return
+            a, b, c, d = x0[idx], y0[idx], x1[idx], y1[idx]
+            self._segments(
+                np.concatenate([a, c, c, a]),
+                np.concatenate([b, b, d, d]),
+                np.concatenate([c, c, a, a]),
+                np.concatenate([b, d, d, b]),
+                np.tile(line[idx], (4, 1)),
+                line_width,
+            )
+
+    def _segments(
+        self,
+        x0: np.ndarray,
+        y0: np.ndarray,
+        x1: np.ndarray,
+        y1: np.ndarray,
+        rgba: RGBA,
+        line_width: float,
+    ) -> None:
+        s = self.scale
+        x0, y0, x1, y1 = x0 * s, y0 * s, x1 * s, y1 * s
+        # 先裁剪到可见区域 (Liang-Barsky)，避免很长的线段生成大量采样点
+        cx0, cy0, cx1, cy1 = self._clip
+        pad = line_width * s
+        dx, dy = x1 - x0, y1 - y0
+        t0 = np.zeros_like(x0)
+        t1 = np.ones_like(x0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for p, q in (
+                (-dx, x0 - (cx0 - pad)),
+                (dx, (cx1 + pad) - x0),
+                (-dy, y0 - (cy0 - pad)),
+                (dy, (cy1 + pad) - y0),
+            ):
+                r = q / p
+                t0 = np.where(p < 0, np.maximum(t0, r), t0)
+                t1 = np.where(p > 0, np.minimum(t1, r), t1)
+                t1 = np.where((p == 0) & (q < 0), -1.0, t1)
+        ok = (
+            np.isfinite(x0)
+            & np.isfinite(y0)
+            & np.isfinite(x1)
+            & np.isfinite(y1)
+            & (t0 <= t1)
+        )
+        if not ok.any():
+            return
+        x0, y0, dx, dy, t0, t1, rgba = (
+            x0[ok],
+            y0[ok],
+            dx[ok],
+            dy[ok],
+            t0[ok],
+            t1[ok],
+            rgba[ok],
+        )
+        x0, y0 = x0 + t0 * dx, y0 + t0 * dy
+        dx, dy = dx * (t1 - t0), dy * (t1 - t0)
+
+        steps = np.ceil(np.maximum(np.abs(dx), np.abs(dy))).astype(np.intp) + 1
+        seg = np.repeat(np.arange(steps.size), steps)
+        start = np.cumsum(steps) - steps
+        t = (np.arange(seg.size) - start[seg]) / np.maximum(steps - 1, 1)[seg]
+        # 加上一个很小的值，避免端点为整数时的舍入误差跳过像素
+        px = np.floor(x0[seg] + t * dx[seg] + 1e-6).astype(np.intp)
+        py = np.floor(y0[seg] + t * dy[seg] + 1e-6).astype(np.intp)
+        oy, ox = _disc_offsets(line_width * s / 2)
+        self._blend(
+            (py[:, None] + oy[None, :]).reshape(-1),
+            (px[:, None] + ox[None, :]).reshape(-1),
+            np.repeat(rgba[seg], oy.size, axis=0),
+        )
+
+    def lines(
+        self,
+        lines: Sequence[tuple[np.ndarray, np.ndarray]],
+        line: RGBA,
+        line_width: float,
+    ) -> None:
+        if line_width <= 0 or len(lines) == 0:
+            return
+        x0s, y0s, x1s, y1s, colors = [], [], [], [], []
+        for (x, y), color in zip(lines, line):
+            if x.size < 2 or color[3] <= 0:
+                continue
+            x0s.append(x[:-1])
+            y0s.append(y[:-1])
+            x1s.append(x[1:])
+            y1s.append(y[1:])
+            colors.append(np.repeat(color[None, :], x.size - 1, axis=0))
+        if len(x0s) == 0:
+            return
+        self._segments(
+            np.concatenate(x0s),
+            np.concatenate(y0s),
+            np.concatenate(x1s),
+            np.concatenate(y1s),
+            np.concatenate(colors),
+            line_width,
+        )
+
+    def polygons(
+        self,
+        polygons: Sequence[tuple[np.ndarray, np.ndarray]],
+        fill: RGBA | None,
+        line: RGBA | None,
+        line_width: float,
+    ) -> None:
+        s = self.scale
+        cx0, cy0, cx1, cy1 = self._clip
+        for i, (x, y) in enumerate(polygons):
+            ok = np.isfinite(x) & np.isfinite(y)
+            x, y = x[ok] * s, y[ok] * s
+            if x.size < 3:
+                continue
+            if fill is not None and fill[i, 3] > 0:
+                # 扫描线填充 (even-odd)：每行与各条边的交点处翻转
+                r0 = max(int(np.floor(y.min())), cy0)
+                r1 = min(int(np.ceil(y.max())), cy1)
+                c0 = max(int(np.floor(x.min())), cx0)
+                c1 = min(int(np.ceil(x.max())), cx1)
+                if r1 <= r0 or c1 <= c0:
+                    continue
+                ex0, ey0 = x, y
+                ex1, ey1 = np.roll(x, -1), np.roll(y, -1)
+                yc = np.arange(r0, r1) + 0.5
+                lo, hi = np.minimum(ey0, ey1), np.maximum(ey0, ey1)
+                cross = (yc[:, None] >= lo[None, :]) & (yc[:, None] < hi[None, :])
+                rows, edges = np.nonzero(cross)
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    xi = ex0[edges] + (yc[rows] - ey0[edges]) * (
+                        ex1[edges] - ex0[edges]
+                    ) / (ey1[edges] - ey0[edges])
+                cols = np.clip(np.ceil(xi - 0.5).astype(np.intp) - c0, 0, c1 - c0)
+                toggles = np.zeros((r1 - r0, c1 - c0 + 1), dtype=np.int32)
+                np.add.at(toggles, (rows, cols), 1)
+                inside = (np.cumsum(toggles, axis=1)[:, :-1] % 2).astype(bool)
+                py, px = np.nonzero(inside)
+                self._blend(
+                    py + r0, px + c0, np.repeat(fill[i : i + 1], py.size, axis=0)
+                )
+            if line is not None and line_width > 0 and line[i, 3] > 0:
+                xs, ys = np.append(x, x[0]) / s, np.append(y, y[0]) / s
+                self.lines([(xs, ys)], line[i : i + 1], line_width)
+
+    def markers(
+        self,
+        x: np.ndarray,
+        y: np.ndarray,
+        size: np.ndarray,
+        marker: np.ndarray,
+        fill: RGBA,
+        line: RGBA,
+        line_width: float,
+    ) -> None:
+        s = self.scale
+        px = (
+            np.floor(x * s).astype(np.intp, copy=False) if x.size else x.astype(np.intp)
+        )
+        py = (
+            np.floor(y * s).astype(np.intp, copy=False) if y.size else y.astype(np.intp)
+        )
+        ok = np.isfinite(x) & np.isfinite(y) & np.isfinite(size)
+        radius = np.round(np.where(ok, size, 0) * s / 2 * 2) / 2
+        lw = line_width * s
+        # 形状和大小相同的点共用一个模板，一次画完
+        groups: dict[tuple[str, float], list[int]] = {}
+        keys = np.char.add(marker.astype(str), np.char.mod("|%g", radius))
+        uniq, inverse = np.unique(keys, return_inverse=True)
+        for k, key in enumerate(uniq):
+            shape, r = key.rsplit("|", 1)
+            groups[(shape, float(r))] = np.flatnonzero((inverse == k) & ok).tolist()
+        for (shape, r), members in groups.items():
+            if len(members) == 0 or r <= 0:
+                continue
+            idx = np.asarray(members, dtype=np.intp)
+            k = int(math.ceil(r + lw))
+            g = np.arange(-k, k + 1)
+            dy, dx = np.meshgrid(g + 0.5, g + 0.5, indexing="ij")
+            if shape in _LINE_MARKERS:
+                body = np.zeros(dx.shape, dtype=bool)
+                if shape in ("x", "asterisk", "y"):
+                    u, v = (dx + dy) / math.sqrt(2), (dx - dy) / math.sqrt(2)
+                    edge = (
+                        (np.abs(u) <= lw / 2 + 0.5) | (np.abs(v) <= lw / 2 + 0.5)
+                    ) & (np.maximum(np.abs(u), np.abs(v)) <= r)
+                else:
+                    edge = ((np.abs(dx) <= lw / 2 + 0.5) & (np.abs(dy) <= r)) | (
+                        (np.abs(dy) <= lw / 2 + 0.5) & (np.abs(dx) <= r)
+                    )
+                    if shape == "dash":
+                        edge = (np.abs(dy) <= lw / 2 + 0.5) & (np.abs(dx) <= r)
+            else:
+                body = _marker_mask(shape, r, dx, dy)
+                edge = np.zeros(dx.shape, dtype=bool)
+                if lw > 0:
+                    # 边框画在形状的内侧
+                    inner = _marker_mask(shape, r - lw, dx, dy)
+                    body, edge = inner, body & ~inner
+            for mask, colors in ((body, fill), (edge, line)):
+                oy, ox = np.nonzero(mask)
+                if oy.size == 0:
+                    continue
+                sel = idx[colors[idx, 3] > 0]
+                if sel.size == 0:
+                    continue
+                self._blend(
+                    (py[sel, None] + (oy - k)[None, :]).reshape(-1),
+                    (px[sel, None] + (ox - k)[None, :]).reshape(-1),
+                    np.repeat(colors[sel], oy.size, axis=0),
+                )
+
+    def text(
+        self,
+        x: float,
+        y: float,
+        text: str,
+        px: float,
+        color: tuple[float, float, float, float],
+        align: str = "left",
+        baseline: str = "middle",
+        angle: float = 0.0,
+        italic: bool = False,
+    ) -> None:
+        if text == "" or px <= 0 or color[3] <= 0:
+            return
+        mask = _text_mask(
+            text, max(int(round(px * self.scale)), 1), round(math.degrees(angle))
+        )
+        if mask is None:
+            return
+        h, w = mask.shape
+        ax = {"left": 0.0, "start": 0.0, "center": 0.5, "right": 1.0, "end": 1.0}.get(
+            align, 0.0
+        )
+        ay = {"top": 0.0, "middle": 0.5, "bottom": 1.0, "alphabetic": 0.8}.get(
+            baseline, 0.5
+        )
+        if abs(math.sin(angle)) > 0.5:
+            # 竖排时对齐方向也随之旋转
+            ax, ay = (ay, 1 - ax) if math.sin(angle) > 0 else (1 - ay, ax)
+        x0 = int(round(x * self.scale - ax * w))
+        y0 = int(round(y * self.scale - ay * h))
+        ys, xs = np.nonzero(mask)
+        rgba = np.repeat(np.asarray([color], dtype=np.float64), ys.size, axis=0)
+        rgba[:, 3] *= mask[ys, xs] / 255
+        self._blend(ys + y0, xs + x0, rgba)
+
+    def image(
+        self, x0: float, y0: float, x1: float, y1: float, rgba: np.ndarray
+    ) -> None:
+        s = self.scale
+        lx, hx = sorted((x0 * s, x1 * s))
+        ly, hy = sorted((y0 * s, y1 * s))
+        cx0, cy0, cx1, cy1 = self._clip
+        c0, c1 = max(int(math.floor(lx)), cx0), min(int(math.ceil(hx)), cx1)
+        r0, r1 = max(int(math.floor(ly)), cy0), min(int(math.ceil(hy)), cy1)
+        if c1 <= c0 or r1 <= r0 or hx <= lx or hy <= ly:
+            return
+        h, w = rgba.shape[:2]
+        # 最近邻采样
+        ci = (
+            ((np.arange(c0, c1) + 0.5 - lx) / (hx - lx) * w)
+            .astype(np.intp)
+            .clip(0, w - 1)
+        )
+        ri = (
+            ((np.arange(r0, r1) + 0.5 - ly) / (hy - ly) * h)
+            .astype(np.intp)
+            .clip(0, h - 1)
+        )
+        if x1 < x0:
+            ci = w - 1 - ci
+        if y1 < y0:
+            ri = h - 1 - ri
+        src = rgba[ri[:, None], ci[None, :]].reshape(-1, 4).astype(np.float64) / 255
+        yy, xx = np.meshgrid(np.arange(r0, r1), np.arange(c0, c1), indexing="ij")
+        self._blend(yy.reshape(-1), xx.reshape(-1), src)
+
+    def to_rgba(self) -> np.ndarray:
+        return (np.clip(self.buf, 0, 1) * 255 + 0.5).astype(np.uint8)
+
+
+@functools.lru_cache(maxsize=16)
+def _disc_offsets(r: float) -> tuple[np.ndarray, np.ndarray]:
+    """半径为 r 的圆覆盖的像素偏移，线宽为 1 时只有一个像素"""
+    if r <= 0.5:
+        return np.zeros(1, dtype=np.intp), np.zeros(1, dtype=np.intp)
+    k = int(math.ceil(r))
+    g = np.arange(-k, k + 1)
+    dy, dx = np.meshgrid(g, g, indexing="ij")
+    inside = dx * dx + dy * dy <= r * r
+    return dy[inside].astype(np.intp), dx[inside].astype(np.intp)
+
+
+@functools.lru_cache(maxsize=64)
+def _font(px: int) -> Any:
+    try:
+        from PIL import ImageFont
+    except ImportError:
+        return None
+    try:
+        return ImageFont.load_default(size=px)
+    except (TypeError, OSError):
+        return ImageFont.load_default()
+
+
+@functools.lru_cache(maxsize=4096)
+def _text_mask(text: str, px: int, degrees: int) -> np.ndarray | None:
+    font = _font(px)
+    if font is None:
+        _warn_once("pillow", "Pillow is not installed, text is omitted in PNG export")
+        return None
+    from PIL import Image, ImageDraw
+
+    left, top, right, bottom = font.getbbox(text)
+    image = Image.new("L", (max(right - left, 1), max(bottom - top, 1) + 2), 0)
+    ImageDraw.Draw(image).text((-left, -top + 1), text, fill=255, font=font)
+    if degrees != 0:
+        image = image.rotate(degrees, expand=True)
+    return np.asarray(image, dtype=np.uint8)
+
+
+def _svg_color(rgba: Sequence[float], attr: str) -> str:
+    r, g, b, a = (float(v) for v in rgba)
+    color = f'{attr}="rgb({round(r * 255)},{round(g * 255)},{round(b * 255)})"'
+    if a < 1:
+        color += f' {attr}-opacity="{a:.3g}"'
+    return color
+
+
+def _svg_points(x: np.ndarray, y: np.ndarray) -> str:
+    return " ".join(f"{a:.2f},{b:.2f}" for a, b in zip(x.tolist(), y.tolist()))
+
+
+def _svg_marker_path(shape: str, x: float, y: float, r: float) -> str:
+    if shape in ("square", "square_x", "square_cross", "square_dot"):
+        return f"M{x - r:.2f},{y - r:.2f}h{2 * r:.2f}v{2 * r:.2f}h{-2 * r:.2f}Z"
+    if shape in ("diamond", "diamond_cross", "diamond_dot"):
+        w = r * 1.5
+        return f"M{x:.2f},{y - r:.2f}L{x + w:.2f},{y:.2f}L{x:.2f},{y + r:.2f}L{x - w:.2f},{y:.2f}Z"
+    if shape in ("triangle", "triangle_dot", "inverted_triangle"):
+        d = -1 if shape == "inverted_triangle" else 1
+        h = r * 2 / math.sqrt(3) * 0.75
+        return (
+            f"M{x:.2f},{y - d * r:.2f}L{x + h:.2f},{y + d * r / 2:.2f}"
+            f"L{x - h:.2f},{y + d * r / 2:.2f}Z"
+        )
+    if shape in ("plus", "cross"):
+        return f"M{x - r:.2f},{y:.2f}H{x + r:.2f}M{x:.2f},{y - r:.2f}V{y + r:.2f}"
+    if shape in ("x", "asterisk", "y"):
+        d = r / math.sqrt(2)
+        return (
+            f"M{x - d:.2f},{y - d:.2f}L{x + d:.2f},{y + d:.2f}"
+            f"M{x - d:.2f},{y + d:.2f}L{x + d:.2f},{y - d:.2f}"
+        )
+    if shape == "dash":
+        return f"M{x - r:.2f},{y:.2f}H{x + r:.2f}"
+    return f"M{x - r:.2f},{y:.2f}a{r:.2f},{r:.2f} 0 1,0 {2 * r:.2f},0a{r:.2f},{r:.2f} 0 1,0 {-2 * r:.2f},0Z"
+
+
+class _SvgCanvas(_Canvas):
+    def __init__(self, width: float, height: float) -> None:
+        super().__init__(width, height)
+        self._parts: list[str] = []
+        self._n_clips = 0
+
+    @contextlib.contextmanager
+    def clip(self, x: float, y: float, w: float, h: float) -> Iterator[None]:
+        self._n_clips += 1
+        clip_id = f"clip{self._n_clips}"
+        self._parts.append(
+            f'<clipPath id="{clip_id}"><rect x="{x:.2f}" y="{y:.2f}" '
+            f'width="{max(w, 0):.2f}" height="{max(h, 0):.2f}"/></clipPath>'
+            f'<g clip-path="url(#{clip_id})">'
+        )
+        try:
+            yield
+        finally:
+            self._parts.append("</g>")
+
+    def rects(
+        self,
+        x0: np.ndarray,
+        y0: np.ndarray,
+        x1: np.ndarray,
+        y1: np.ndarray,
+        fill: RGBA | None,
+        line: RGBA | None,
+        line_width: float,
+    ) -> None:
+        lx, hx = np.minimum(x0, x1), np.maximum(x0, x1)
+        ly, hy = np.minimum(y0, y1), np.maximum(y0, y1)
+        ok = np.isfinite(lx) & np.isfinite(hx) & np.isfinite(ly) & np.isfinite(hy)
+        for i in np.flatnonzero(ok):
+            style = _svg_color(fill[i], "fill") if fill is not None else 'fill="none"'
+            if line is not None and line_width > 0 and line[i, 3] > 0:
+                style += (
+                    f' {_svg_color(line[i], "stroke")} stroke-width="{line_width:g}"'
+                )
+            self._parts.append(
+                f'<rect x="{lx[i]:.2f}" y="{ly[i]:.2f}" width="{hx[i] - lx[i]:.2f}" '
+                f'height="{hy[i] - ly[i]:.2f}" {style}/>'
+            )
+
+    def lines(
+        self,
+        lines: Sequence[tuple[np.ndarray, np.ndarray]],
+        line: RGBA,
+        line_width: float,
+    ) -> None:
+        if line_width <= 0:
+            return
+        for (x, y), color in zip(lines, line):
+            if color[3] <= 0:
+                continue
+            ok = np.isfinite(x) & np.isfinite(y)
+            # NaN 处断开为多段
+            breaks = np.flatnonzero(
+                np.diff(np.concatenate([[0], ok.astype(np.int8), [0]]))
+            )
+            for start, end in zip(breaks[::2], breaks[1::2]):
+                if end - start < 2:
+                    continue
+                self._parts.append(
+                    f'<polyline points="{_svg_points(x[start:end], y[start:end])}" '
+                    f'fill="none" {_svg_color(color, "stroke")} stroke-width="{line_width:g}"/>'
+                )
+
+    def polygons(
+        self,
+        polygons: Sequence[tuple[np.ndarray, np.ndarray]],
+        fill: RGBA | None,
+        line: RGBA | None,
+        line_width: float,
+    ) -> None:
+        for i, (x, y) in enumerate(polygons):
+            ok = np.isfinite(x) & np.isfinite(y)
+            if ok.sum() < 3:
+                continue
+            style = _svg_color(fill[i], "fill") if fill is not None else 'fill="none"'
+            if line is not None and line_width > 0 and line[i, 3] > 0:
+                style += (
+                    f' {_svg_color(line[i], "stroke")} stroke-width="{line_width:g}"'
+                )
+            self._parts.append(
+                f'<polygon points="{_svg_points(x[ok], y[ok])}" fill-rule="evenodd" {style}/>'
+            )
+
+    def markers(
+        self,
+        x: np.ndarray,
+        y: np.ndarray,
+        size: np.ndarray,
+        marker: np.ndarray,
+        fill: RGBA,
+        line: RGBA,
+        line_width: float,
+    ) -> None:
+        ok = np.isfinite(x) & np.isfinite(y) & np.isfinite(size)
+        self._parts.append(f'<g stroke-width="{line_width:g}">')
+        for i in np.flatnonzero(ok):
+            shape = str(marker[i])
+            if shape in _LINE_MARKERS:
+                style = f'fill="none" {_svg_color(line[i], "stroke")}'
+            else:
+                style = _svg_color(fill[i], "fill")
+                if line[i, 3] > 0:
+                    style += f' {_svg_color(line[i], "stroke")}'
+            if shape in ("circle", "dot"):
+                self._parts.append(
+                    f'<circle cx="{x[i]:.2f}" cy="{y[i]:.2f}" r="{size[i] / 2:g}" {style}/>'
+                )
+            else:
+                path = _svg_marker_path(
+                    shape, float(x[i]), float(y[i]), float(size[i]) / 2
+                )
+                self._parts.append(f'<path d="{path}" {style}/>')
+        self._parts.append("</g>")
+
+    def text(
+        self,
+        x: float,
+        y: float,
+        text: str,
+        px: float,
+        color: tuple[float, float, float, float],
+        align: str = "left",
+        baseline: str = "middle",
+        angle: float = 0.0,
+        italic: bool = False,
+    ) -> None:
+        if text == "" or px <= 0 or color[3] <= 0:
+            return
+        anchor = {"center": "middle", "right": "end", "end": "end"}.get(align, "start")
+        dominant = {
+            "top": "hanging",
+            "middle": "central",
+            "bottom": "text-after-edge",
+        }.get(baseline, "alphabetic")
+        transform = (
+            f' transform="rotate({-math.degrees(angle):g} {x:.2f} {y:.2f})"'
+            if angle
+            else ""
+        )
+        style = ' font-style="italic"' if italic else ""
+        self._parts.append(
+            f'<text x="{x:.2f}" y="{y:.2f}" font-size="{px:g}px" font-family="sans-serif" '
+            f'text-anchor="{anchor}" dominant-baseline="{dominant}"{style} '
+            f'{_svg_color(color, "fill")}{transform}>{html.escape(text)}</text>'
+        )
+
+    def image(
+        self, x0: float, y0: float, x1: float, y1: float, rgba: np.ndarray
+    ) -> None:
+        if x1 < x0:
+            rgba, x0, x1 = rgba[:, ::-1], x1, x0
+        if y1 < y0:
+            rgba, y0, y1 = rgba[::-1], y1, y0
+        href = base64.b64encode(_encode_png(np.ascontiguousarray(rgba))).decode()
+        self._parts.append(
+            f'<image x="{x0:.2f}" y="{y0:.2f}" width="{x1 - x0:.2f}" height="{y1 - y0:.2f}" '
+            f'preserveAspectRatio="none" style="image-rendering:pixelated" '
+            f'href="data:image/png;base64,{href}"/>'
+        )
+
+    def to_svg(self) -> str:
+        w, h = self.width, self.height
+        return (
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{w:g}" height="{h:g}" '
+            f'viewBox="0 0 {w:g} {h:g}">'
+            f'<rect width="100%" height="100%" fill="#ffffff"/>{"".join(self._parts)}</svg>'
+        )
+
+
+def _encode_png(rgba: np.ndarray) -> bytes:
+    h, w = rgba.shape[:2]
+    # 每行前面加上 filter type 0
+    raw = np.concatenate(
+        [np.zeros((h, 1), dtype=np.uint8), rgba.reshape(h, w * 4)], axis=1
+    ).tobytes()
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        crc = zlib.crc32(tag + data) & 0xFFFFFFFF
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", crc)
+
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 6, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw, 6))
+        + chunk(b"IEND", b"")
+    )
+
+
+# endregion
+
+# region scales
+
+
+@dataclass
+class _Interval:
+    """一个方向上的可见范围，log 轴时 lo/hi 为 log10 后的值"""
+
+    lo: float
+    hi: float
+    log: bool = False
+    factors: dict[Any, float] | None = None
+
+    def synthetic(self, values: Any) -> np.ndarray:
+        """数据值 -> 连续坐标 (分类轴上每个 factor 占 1 个单位)"""
+        arr = values if isinstance(values, np.ndarray) else np.asarray(values)
+        if self.factors is not None and arr.dtype.kind in "OUS":
+            if arr.ndim == 2:
+                keys = [tuple(row) for row in arr.tolist()]
+            else:
+                keys = [_factor_key(v) for v in arr.tolist()]
+            return np.array(
+                [self.factors.get(k, np.nan) for k in keys], dtype=np.float64
+            )
+        try:
+            out = arr.astype(np.float64)
+        except (TypeError, ValueError):
+            return np.full(arr.shape, np.nan)
+        if self.log:
+            with np.errstate(invalid="ignore", divide="ignore"):
+                out = np.where(out > 0, np.log10(out), np.nan)
+        return out
+
+
+def _factor_centers(factors: Sequence[Any]) -> dict[Any, float]:
+    centers: dict[Any, float] = {}
+    for i, f in enumerate(factors):
+        key = _factor_key(f)
+        centers[key] = i + 0.5
+        if isinstance(key, tuple):
+            # 多层 factor 时也可以只用最后一层引用
+            centers.setdefault(key[-1], i + 0.5)
+    return centers
+
+
+@dataclass
+class _Mapper:
+    interval: _Interval
+    start: float
+    length: float
+    flip: bool = False
+
+    def __call__(self, synthetic: np.ndarray) -> np.ndarray:
+        lo, hi = self.interval.lo, self.interval.hi
+        t = (synthetic - lo) / ((hi - lo) or 1.0)
+        if self.flip:
+            t = 1 - t
+        return self.start + t * self.length
+
+
+# endregion
+
+# region ticks
+
+
+def _nice_step(span: float, n: int) -> float:
+    raw = span / max(n, 1)
+    mag = 10 ** math.floor(math.log10(raw))
+    return min((m * mag for m in (1, 2, 5, 10)), key=lambda step: abs(span / step - n))
+
+
+def _ticks(interval: _Interval, ticker: Any) -> tuple[np.ndarray, list[str]]:
+    """刻度的位置 (连续坐标) 和文字"""
+    if interval.factors is not None:
+        seen: dict[float, str] = {}
+        for k, v in interval.factors.items():
+            seen.setdefault(v, str(k[-1] if isinstance(k, tuple) else k))
+        ticks = np.array(sorted(seen), dtype=np.float64)
+        return ticks, [seen[t] for t in ticks.tolist()]
+
+    lo, hi = sorted((interval.lo, interval.hi))
+    if not (math.isfinite(lo) and math.isfinite(hi)) or hi <= lo:
+        return np.zeros(0), []
+    n = getattr(ticker, "desired_num_ticks", 6) or 6
+    if interval.log and hi - lo >= 1:
+        step = max(1, math.ceil((hi - lo) / n))
+        ticks = np.arange(math.ceil(lo), math.floor(hi) + 1, step, dtype=np.float64)
+        return ticks, [f"{10**t:g}" for t in ticks.tolist()]
+
+    if interval.log:
+        vlo, vhi = 10**lo, 10**hi
+    else:
+        vlo, vhi = lo, hi
+    step = _nice_step(vhi - vlo, n)
+    values = (
+        np.arange(math.ceil(vlo / step - 1e-9), math.floor(vhi / step + 1e-9) + 1)
+        * step
+    )
+    labels = [_format_number(v, step) for v in values.tolist()]
+    if interval.log:
+        values = np.log10(values[values > 0])
+        labels = labels[-values.size :] if values.size else []
+    return values, labels
+
+
+def _format_number(v: float, step: float) -> str:
+    if v == 0:
+        return "0"
+    if abs(v) >= 1e5 or abs(v) < 1e-3:
+        return f"{v:.1e}".replace("e+0", "e").replace("e-0", "e-")
+    decimals = max(0, -math.floor(math.log10(step) + 1e-9))
+    return f"{v:.{decimals}f}"
+
+
+# endregion
+
+# region layout
+
+_SIDES = ("above", "below", "left", "right")
+
+
+def _margin(model: bm.LayoutDOM) -> tuple[float, float, float, float]:
+    """(top, right, bottom, left)"""
+    m = getattr(model, "margin", None)
+    if m is None:
+        return 0.0, 0.0, 0.0, 0.0
+    if isinstance(m, (int, float)):
+        return (float(m),) * 4
+    if len(m) == 2:
+        return float(m[0]), float(m[1]), float(m[0]), float(m[1])
+    return tuple(float(v) for v in m)  # type: ignore
+
+
+class _Node(abc.ABC):
+    """布局树的节点，大小包括 margin"""
+
+    @abc.abstractmethod
+    def size(self) -> tuple[float, float]: ...
+
+    @abc.abstractmethod
+    def paint(
+        self, canvas: _Canvas, x: float, y: float, w: float, h: float
+    ) -> None: ...
+
+
+def _node(model: Any) -> _Node:
+    if isinstance(model, bm.Plot):
+        return _PlotNode(model)
+    if isinstance(model, bm.GridPlot):
+        return _GridNode([(c[0], *c[1:]) for c in model.children], model.spacing)
+    if isinstance(model, bm.GridBox):
+        return _GridNode([(c[0], *c[1:]) for c in model.children], model.spacing)
+    if isinstance(model, bm.Row):
+        return _GridNode(
+            [(c, 0, i) for i, c in enumerate(model.children)], model.spacing
+        )
+    if isinstance(model, bm.Column):
+        return _GridNode(
+            [(c, i, 0) for i, c in enumerate(model.children)], model.spacing
+        )
+    if isinstance(model, bm.Div):
+        return _DivNode(model)
+    _warn_once(
+        f"layout:{type(model).__name__}",
+        f"{type(model).__name__} is not supported in static export, left blank",
+    )
+    return _EmptyNode()
+
+
+class _EmptyNode(_Node):
+    def size(self) -> tuple[float, float]:
+        return 0.0, 0.0
+
+    def paint(self, canvas: _Canvas, x: float, y: float, w: float, h: float) -> None:
+        pass
+
+
+class _DivNode(_Node):
+    def __init__(self, div: bm.Div) -> None:
+        self._div = div
+        styles = dict(div.styles) if isinstance(div.styles, dict) else {}
+        self._text = html.unescape(re.sub(r"<[^>]+>", "", div.text or ""))
+        self._px = _font_px(styles.get("font-size", "13px"))
+        self._color = _color_tuple(styles.get("color", "#444444"))
+        self._italic = styles.get("font-style", None) == "italic"
+        self._vertical = str(styles.get("writing-mode", "")).startswith("vertical")
+
+    def size(self) -> tuple[float, float]:
+        top, right, bottom, left = _margin(self._div)
+        tw, th = _text_size(self._text, self._px)
+        if self._vertical:
+            tw, th = th, tw
+        w = self._div.width if self._div.width is not None else tw
+        h = self._div.height if self._div.height is not None else th
+        return w + left + right, h + top + bottom
+
+    def paint(self, canvas: _Canvas, x: float, y: float, w: float, h: float) -> None:
+        top, right, bottom, left = _margin(self._div)
+        cx = x + left + (w - left - right) / 2
+        cy = y + top + (h - top - bottom) / 2
+        canvas.text(
+            cx,
+            cy,
+            self._text,
+            self._px,
+            self._color,
+            align="center",
+            baseline="middle",
+            angle=math.pi / 2 if self._vertical else 0.0,
+            italic=self._italic,
+        )
+
+
+class _GridNode(_Node):
+    def __init__(self, children: Sequence[tuple[Any, ...]], spacing: Any) -> None:
+        self._cells: list[tuple[_Node, int, int, int, int]] = []
+        for child in children:
+            model, row, col = child[0], int(child[1]), int(child[2])
+            row_span = int(child[3]) if len(child) > 3 else 1
+            col_span = int(child[4]) if len(child) > 4 else 1
+            self._cells.append((_node(model), row, col, row_span, col_span))
+        if isinstance(spacing, (tuple, list)):
+            self._spacing = (
+                float(spacing[0]),
+                float(spacing[1]),
+            )  # pyright: ignore[reportUnknownArgumentType]
+        else:
+            self._spacing = (float(spacing or 0), float(spacing or 0))
+        self._tracks: tuple[list[float], list[float]] | None = None
+
+    def _layout(self) -> tuple[list[float], list[float]]:
+        if self._tracks is not None:
+            return self._tracks
+        n_rows = max((r + rs for _, r, _, rs, _ in self._cells), default=0)
+        n_cols = max((c + cs for _, _, c, _, cs in self._cells), default=0)
+        heights = [0.0] * n_rows
+        widths = [0.0] * n_cols
+        sizes = [cell[0].size() for cell in self._cells]
+        # 先按只占一格的子图确定行高列宽，跨多格的子图不够时补到最后一格
+        for span_pass in (False, True):
+            for (_, r, c, rs, cs), (w, h) in zip(self._cells, sizes):
+                if (rs > 1) == span_pass:
+                    need = h - sum(heights[r : r + rs]) - self._spacing[0] * (rs - 1)
+                    if need > 0:
+                        heights[r + rs - 1] += need
+                if (cs > 1) == span_pass:
+                    need = w - sum(widths[c : c + cs]) - self._spacing[1] * (cs - 1)
+                    if need > 0:
+                        widths[c + cs - 1] += need
+        self._tracks = (heights, widths)
+        return self._tracks
+
+    def size(self) -> tuple[float, float]:
+        heights, widths = self._layout()
+        return (
+            sum(widths) + self._spacing[1] * max(len(widths) - 1, 0),
+            sum(heights) + self._spacing[0] * max(len(heights) - 1, 0),
+        )
+
+    def paint(self, canvas: _Canvas, x: float, y: float, w: float, h: float) -> None:
+        heights, widths = self._layout()
+        ys = np.concatenate([[0.0], np.cumsum(np.asarray(heights) + self._spacing[0])])
+        xs = np.concatenate([[0.0], np.cumsum(np.asarray(widths) + self._spacing[1])])
+        for node, r, c, rs, cs in self._cells:
+            cw = xs[c + cs] - xs[c] - self._spacing[1]
+            ch = ys[r + rs] - ys[r] - self._spacing[0]
+            node.paint(canvas, x + xs[c], y + ys[r], cw, ch)
+
+
+@dataclass
+class _AxisBand:
+    model: bm.Axis | bm.Legend | bm.Title
+    side: str
+    size: float
+    ticks: np.ndarray
+    labels: list[str]
+
+
+class _PlotNode(_Node):
+    def __init__(self, figure: bm.Plot) -> None:
+        self._figure = figure
+        self._renderers = [r for r in figure.renderers if r.visible]
+        # frame 中按 level 依次绘制的 glyph 和 annotation
+        self._layers: list[bm.GlyphRenderer | bm.Whisker] = sorted(
+            [
+                *self._renderers,
+                *(a for a in figure.center if isinstance(a, bm.Whisker) and a.visible),
+            ],
+            key=lambda r: _LEVELS.index(r.level) if r.level in _LEVELS else 2,
+        )
+        self._data: dict[str, _GlyphData] = {}
+        self._bands: dict[str, list[_AxisBand]] = {side: [] for side in _SIDES}
+        for side in _SIDES:
+            for model in getattr(figure, side):
+                band = self._band(model, side)
+                if band is not None:
+                    self._bands[side].append(band)
+
+    def _glyph_data(self, renderer: bm.GlyphRenderer | bm.DataAnnotation) -> _GlyphData:
+        if renderer.id not in self._data:
+            self._data[renderer.id] = _GlyphData(renderer)
+        return self._data[renderer.id]
+
+    # region ranges
+
+    @functools.cached_property
+    def _intervals(self) -> dict[str, _Interval]:
+        # 只在有轴或者需要画 glyph 时计算，图例使用的图不需要
+        figure = self._figure
+        return {
+            "x": self._interval("x", figure.x_range, figure.x_scale),
+            "y": self._interval("y", figure.y_range, figure.y_scale),
+        }
+
+    def _interval(
+        self, dim: Literal["x", "y"], range_: bm.Range, scale: bm.Scale
+    ) -> _Interval:
+        log = isinstance(scale, bm.LogScale)
+        if isinstance(range_, bm.FactorRange):
+            factors = [*range_.factors]
+            return _Interval(0.0, float(len(factors)), factors=_factor_centers(factors))
+        start = getattr(range_, "start", None)
+        end = getattr(range_, "end", None)
+        if isinstance(range_, bm.Range1d) or (start is not None and end is not None):
+            return _Interval(*self._log_pair(start, end, log), log=log)
+
+        # DataRange1d：按数据计算，与 BokehJS 一样加上 range_padding
+        interval = _Interval(0.0, 1.0, log=log)
+        lo, hi = math.inf, -math.inf
+        for renderer in self._renderers:
+            if not isinstance(renderer, bm.GlyphRenderer):
+                continue
+            for v in self._glyph_extent(renderer, dim, interval):
+                finite = v[np.isfinite(v)]
+                if finite.size > 0:
+                    lo, hi = min(lo, float(finite.min())), max(hi, float(finite.max()))
+        if start is not None:
+            lo = self._log_pair(start, start, log)[0]
+        if end is not None:
+            hi = self._log_pair(end, end, log)[0]
+        if not (math.isfinite(lo) and math.isfinite(hi)):
+            lo, hi = 0.0, 1.0
+        padding = getattr(range_, "range_padding", RANGE_PADDING)
+        if getattr(range_, "range_padding_units", "percent") == "percent":
+            pad = (hi - lo) * padding / 2 if hi > lo else 0.5
+        else:
+            pad = padding / 2
+        lo, hi = lo - (pad if start is None else 0), hi + (pad if end is None else 0)
+        if getattr(range_, "flipped", False):
+            lo, hi = hi, lo
+        return _Interval(lo, hi, log=log)
+
+    @staticmethod
+    def _log_pair(start: Any, end: Any, log: bool) -> tuple[float, float]:
+        lo, hi = float(start), float(end)
+        if log:
+            lo = math.log10(lo) if lo > 0 else math.nan
+            hi = math.log10(hi) if hi > 0 else math.nan
+        return lo, hi
+
+    def _glyph_extent(
+        self, renderer: bm.GlyphRenderer, dim: Literal["x", "y"], interval: _Interval
+    ) -> Iterator[np.ndarray]:
+        glyph = renderer.glyph
+        if isinstance(glyph, (bm.Image, bm.ImageRGBA)):
+            data = self._glyph_data(renderer)
+            v, _ = data.resolve(glyph, dim)
+            d, _ = data.resolve(glyph, "dw" if dim == "x" else "dh")
+            if v is not None and d is not None:
+                v = np.atleast_1d(np.asarray(v, dtype=np.float64))
+                yield interval.synthetic(v)
+                yield interval.synthetic(v + np.asarray(d, dtype=np.float64))
+            return
+        data = self._glyph_data(renderer)
+        for name in _FIELDS[dim]:
+            v, _ = data.resolve(glyph, name)
+            if v is None or isinstance(v, str):
+                continue
+            if (
+                isinstance(v, np.ndarray)
+                and v.dtype == object
+                and v.size > 0
+                and isinstance(v[0], np.ndarray)
+            ):
+                v = np.concatenate([*v]) if v.size > 0 else np.zeros(0)
+            v = interval.synthetic(np.atleast_1d(v))
+            for cls, extent in _EXTENTS[dim]:
+                if isinstance(glyph, cls):
+                    e = np.asarray(data.value(glyph, extent, 0.0), dtype=np.float64)
+                    yield v - e / 2
+                    yield v + e / 2
+                    break
+            else:
+                yield v
+
+    # endregion
+
+    # region panels
+
+    def _band(self, model: Any, side: str) -> _AxisBand | None:
+        vertical = side in ("left", "right")
+        if isinstance(model, bm.Axis):
+            if not model.visible:
+                return None
+            interval = self._intervals["y" if vertical else "x"]
+            label_px = _font_px(model.major_label_text_font_size)
+            ticks, labels = _ticks(interval, model.ticker)
+            size = 0.0
+            if model.major_tick_line_color is not None:
+                size += model.major_tick_out
+            if label_px > 0 and len(labels) > 0:
+                tw = max(_text_size(s, label_px)[0] for s in labels)
+                th = label_px * LINE_HEIGHT
+                size += model.major_label_standoff + (tw if vertical else th)
+            axis_label = _label_text(model.axis_label)
+            if axis_label != "":
+                size += (
+                    model.axis_label_standoff
+                    + _text_size(axis_label, _font_px(model.axis_label_text_font_size))[
+                        1
+                    ]
+                )
+            return _AxisBand(model, side, size, ticks, labels)
+        if isinstance(model, bm.Legend):
+            if not model.visible or len(self._legend_entries(model)) == 0:
+                return None
+            w, h = self._legend_size(model)
+            return _AxisBand(
+                model, side, (w if vertical else h) + 2 * model.margin, np.zeros(0), []
+            )
+        if isinstance(model, bm.Title):
+            text = _label_text(model.text)
+            if not model.visible or text == "":
+                return None
+            px = _font_px(model.text_font_size)
+            return _AxisBand(
+                model, side, px * LINE_HEIGHT + 2 * model.offset + 10, np.zeros(0), []
+            )
+        return None
+
+    def _panel(self, side: str) -> float:
+        size = sum(b.size for b in self._bands[side])
+        border = getattr(
+            self._figure,
+            f"min_border_{side.replace('above', 'top').replace('below', 'bottom')}",
+        )
+        if border is None:
+            border = self._figure.min_border or 0
+        return max(size, float(border))
+
+    def size(self) -> tuple[float, float]:
+        fig = self._figure
+        top, right, bottom, left = _margin(fig)
+        width, height = fig.width, fig.height
+        if fig.width_policy in ("min", "fit") or width is None:
+            width = self._panel("left") + self._panel("right")
+        if fig.height_policy in ("min", "fit") or height is None:
+            height = self._panel("above") + self._panel("below")
+        return width + left + right, height + top + bottom
+
+    # endregion
+
+    def paint(self, canvas: _Canvas, x: float, y: float, w: float, h: float) -> None:
+        fig = self._figure
+        top, right, bottom, left = _margin(fig)
+        x, y = x + left, y + top
+        nw, nh = self.size()
+        # 固定大小的图不拉伸，最小化的图填满所在的格子
+        w = (
+            w - left - right
+            if fig.width_policy in ("min", "fit", "max")
+            else nw - left - right
+        )
+        h = (
+            h - top - bottom
+            if fig.height_policy in ("min", "fit", "max")
+            else nh - top - bottom
+        )
+
+        fx = x + self._panel("left")
+        fy = y + self._panel("above")
+        fw = w - self._panel("left") - self._panel("right")
+        fh = h - self._panel("above") - self._panel("below")
+
+        canvas.fill(x, y, w, h, fig.border_fill_color, fig.border_fill_alpha)
+        if fw > 0 and fh > 0:
+            canvas.fill(
+                fx, fy, fw, fh, fig.background_fill_color, fig.background_fill_alpha
+            )
+        mappers = {
+            "x": _Mapper(self._intervals["x"], fx, fw),
+            "y": _Mapper(self._intervals["y"], fy, fh, flip=True),
+        }
+
+        if fw > 0 and fh > 0:
+            with canvas.clip(fx, fy, fw, fh):
+                for renderer in fig.center:
+                    if isinstance(renderer, bm.Grid) and renderer.visible:
+                        self._paint_grid(canvas, renderer, mappers, fx, fy, fw, fh)
+                for layer in self._layers:
+                    if isinstance(layer, bm.Whisker):
+                        self._paint_whisker(canvas, layer, mappers)
+                    elif isinstance(layer, bm.GlyphRenderer):
+                        self._paint_glyph(canvas, layer, mappers, (fx, fy, fw, fh))
+            if fig.outline_line_color is not None and fig.outline_line_width > 0:
+                canvas.rects(
+                    np.array([fx]),
+                    np.array([fy]),
+                    np.array([fx + fw]),
+                    np.array([fy + fh]),
+                    None,
+                    _rgba(fig.outline_line_color, fig.outline_line_alpha, 1),
+                    fig.outline_line_width,
+                )
+
+        for side in _SIDES:
+            offset = 0.0
+            for band in self._bands[side]:
+                self._paint_band(canvas, band, mappers, (fx, fy, fw, fh), offset)
+                offset += band.size
+        for model in fig.center:
+            if isinstance(model, bm.Legend) and model.visible:
+                self._paint_legend(canvas, model, (fx, fy, fw, fh), None)
+
+    # region guides
+
+    def _paint_grid(
+        self,
+        canvas: _Canvas,
+        grid: bm.Grid,
+        mappers: dict[str, _Mapper],
+        fx: float,
+        fy: float,
+        fw: float,
+        fh: float,
+    ) -> None:
+        if grid.grid_line_color is None:
+            return
+        dim = "x" if grid.dimension == 0 else "y"
+        ticker = getattr(grid.axis, "ticker", None) if grid.axis is not None else None
+        ticks, _ = _ticks(self._intervals[dim], ticker or grid.ticker)
+        pos = mappers[dim](ticks)
+        color = _rgba(grid.grid_line_color, grid.grid_line_alpha, len(pos))
+        if dim == "x":
+            lines = [(np.array([p, p]), np.array([fy, fy + fh])) for p in pos]
+        else:
+            lines = [(np.array([fx, fx + fw]), np.array([p, p])) for p in pos]
+        canvas.lines(lines, color, grid.grid_line_width)
+
+    def _paint_band(
+        self,
+        canvas: _Canvas,
+        band: _AxisBand,
+        mappers: dict[str, _Mapper],
+        frame: tuple[float, float, float, float],
+        offset: float,
+    ) -> None:
+        fx, fy, fw, fh = frame
+        side = band.side
+        # 从靠近 frame 的一边向外
+        if side == "below":
+            x0, y0, x1, y1, out = (
+                fx,
+                fy + fh + offset,
+                fx + fw,
+                fy + fh + offset + band.size,
+                (0, 1),
+            )
+        elif side == "above":
+            x0, y0, x1, y1, out = (
+                fx,
+                fy - offset - band.size,
+                fx + fw,
+                fy - offset,
+                (0, -1),
+            )
+        elif side == "left":
+            x0, y0, x1, y1, out = (
+                fx - offset - band.size,
+                fy,
+                fx - offset,
+                fy + fh,
+                (-1, 0),
+            )
+        else:
+            x0, y0, x1, y1, out = (
+                fx + fw + offset,
+                fy,
+                fx + fw + offset + band.size,
+                fy + fh,
+                (1, 0),
+            )
+        model = band.model
+        if isinstance(model, bm.Legend):
+            self._paint_legend(canvas, model, (x0, y0, x1 - x0, y1 - y0), side)
+            return
+        if isinstance(model, bm.Title):
+            canvas.text(
+                (x0 + x1) / 2 if model.align == "center" else x0,
+                (y0 + y1) / 2,
+                _label_text(model.text),
+                _font_px(model.text_font_size),
+                _color_tuple(model.text_color),
+                align="center" if model.align == "center" else "left",
+                baseline="middle",
+                italic=model.text_font_style == "italic",
+            )
+            return
+        self._paint_axis(canvas, model, band, mappers, (x0, y0, x1, y1), out)
+
+    def _paint_axis(
+        self,
+        canvas: _Canvas,
+        axis: bm.Axis,
+        band: _AxisBand,
+        mappers: dict[str, _Mapper],
+        box: tuple[float, float, float, float],
+        out: tuple[int, int],
+    ) -> None:
+        x0, y0, x1, y1 = box
+        vertical = out[0] != 0
+        color = getattr(axis, "background_fill_color", None)
+        if color is not None:
+            canvas.fill(
+                x0,
+                y0,
+                x1 - x0,
+                y1 - y0,
+                color,
+                getattr(axis, "background_fill_alpha", 1.0),
+            )
+        # 轴线所在的位置 (靠近 frame 的一边)
+        if vertical:
+            base = x1 if out[0] < 0 else x0
+        else:
+            base = y0 if out[1] > 0 else y1
+        sign = out[0] if vertical else out[1]
+        pos = mappers["y" if vertical else "x"](band.ticks)
+
+        if axis.axis_line_color is not None:
+            line = (
+                (np.array([base, base]), np.array([y0, y1]))
+                if vertical
+                else (np.array([x0, x1]), np.array([base, base]))
+            )
+            canvas.lines(
+                [line],
+                _rgba(axis.axis_line_color, axis.axis_line_alpha, 1),
+                axis.axis_line_width,
+            )
+
+        if axis.major_tick_line_color is not None and pos.size > 0:
+            a, b = base - sign * axis.major_tick_in, base + sign * axis.major_tick_out
+            ticks = [
+                (
+                    (np.array([a, b]), np.array([p, p]))
+                    if vertical
+                    else (np.array([p, p]), np.array([a, b]))
+                )
+                for p in pos
+            ]
+            canvas.lines(
+                ticks,
+                _rgba(
+                    axis.major_tick_line_color, axis.major_tick_line_alpha, len(ticks)
+                ),
+                axis.major_tick_line_width,
+            )
+
+        cursor = base + sign * (
+            axis.major_tick_out if axis.major_tick_line_color is not None else 0
+        )
+        label_px = _font_px(axis.major_label_text_font_size)
+        if label_px > 0 and len(band.labels) > 0:
+            cursor += sign * axis.major_label_standoff
+            color_ = _color_tuple(axis.major_label_text_color)
+            for p, label in zip(pos.tolist(), band.labels):
+                if vertical:
+                    canvas.text(
+                        cursor,
+                        p,
+                        label,
+                        label_px,
+                        color_,
+                        align="right" if sign < 0 else "left",
+                    )
+                else:
+                    canvas.text(
+                        p,
+                        cursor,
+                        label,
+                        label_px,
+                        color_,
+                        align="center",
+                        baseline="top" if sign > 0 else "bottom",
+                    )
+            tw = max(_text_size(s, label_px)[0] for s in band.labels)
+            cursor += sign * (tw if vertical else label_px * LINE_HEIGHT)
+
+        axis_label = _label_text(axis.axis_label)
+        if axis_label != "":
+            px = _font_px(axis.axis_label_text_font_size)
+            cursor += sign * (axis.axis_label_standoff + px * LINE_HEIGHT / 2)
+            color_ = _color_tuple(axis.axis_label_text_color)
+            italic = axis.axis_label_text_font_style == "italic"
+            if vertical:
+                canvas.text(
+                    cursor,
+                    (y0 + y1) / 2,
+                    axis_label,
+                    px,
+                    color_,
+                    align="center",
+                    angle=math.pi / 2 if sign < 0 else -math.pi / 2,
+                    italic=italic,
+                )
+            else:
+                canvas.text(
+                    (x0 + x1) / 2,
+                    cursor,
+                    axis_label,
+                    px,
+                    color_,
+                    align="center",
+                    italic=italic,
+                )
+
+    # endregion
+
+    # region legend
+
+    def _legend_entries(self, legend: bm.Legend) -> list[tuple[str, bm.LegendItem]]:
+        entries: list[tuple[str, bm.LegendItem]] = []
+        for item in legend.items:
+            if not item.visible or len(item.renderers) == 0:
+                continue
+            label = item.label
+            if isinstance(label, Field):
+                renderer = item.renderers[0]
+                data = self._glyph_data(renderer)
+                if label.field in data.data:
+                    for v in dict.fromkeys(_column(data.data[label.field]).tolist()):
+                        entries.append((str(v), item))
+                continue
+            entries.append((_label_text(label), item))
+        return entries
+
+    def _legend_size(self, legend: bm.Legend) -> tuple[float, float]:
+        entries = self._legend_entries(legend)
+        px = _font_px(legend.label_text_font_size)
+        label_w = max((_text_size(label, px)[0] for label, _ in entries), default=0.0)
+        row_h = max(legend.glyph_height, px * LINE_HEIGHT)
+        item_w = (
+            legend.glyph_width
+            + legend.label_standoff
+            + max(label_w, legend.label_width)
+        )
+        n = len(entries)
+        if legend.orientation == "horizontal":
+            w = n * item_w + max(n - 1, 0) * legend.spacing
+            h = row_h
+        else:
+            w = item_w
+            h = n * row_h + max(n - 1, 0) * legend.spacing
+        title = _label_text(legend.title)
+        if title != "":
+            h += (
+                _font_px(legend.title_text_font_size) * LINE_HEIGHT
+                + legend.title_standoff
+            )
+        return w + 2 * legend.padding, h + 2 * legend.padding
+
+    def _paint_legend(
+        self,
+        canvas: _Canvas,
+        legend: bm.Legend,
+        box: tuple[float, float, float, float],
+        side: str | None,
+    ) -> None:
+        entries = self._legend_entries(legend)
+        if len(entries) == 0:
+            return
+        w, h = self._legend_size(legend)
+        bx, by, bw, bh = box
+        m = legend.margin
+        location = legend.location if side is None else "top_left"
+        if isinstance(location, (tuple, list)):
+            x, y = (
+                bx + float(location[0]),
+                by + bh - float(location[1]) - h,
+            )  # pyright: ignore[reportUnknownArgumentType]
+        else:
+            v, _, hz = str(location).partition("_")
+            if hz == "":
+                v, hz = ("center", v) if v in ("left", "right") else (v, "center")
+            x = {"left": bx + m, "center": bx + (bw - w) / 2, "right": bx + bw - w - m}[
+                hz
+            ]
+            y = {"top": by + m, "center": by + (bh - h) / 2, "bottom": by + bh - h - m}[
+                v
+            ]
+
+        canvas.fill(
+            x, y, w, h, legend.background_fill_color, legend.background_fill_alpha
+        )
+        if legend.border_line_color is not None:
+            canvas.rects(
+                np.array([x]),
+                np.array([y]),
+                np.array([x + w]),
+                np.array([y + h]),
+                None,
+                _rgba(legend.border_line_color, legend.border_line_alpha, 1),
+                legend.border_line_width,
+            )
+        px = _font_px(legend.label_text_font_size)
+        cx, cy = x + legend.padding, y + legend.padding
+        title = _label_text(legend.title)
+        if title != "":
+            tpx = _font_px(legend.title_text_font_size)
+            canvas.text(
+                cx,
+                cy,
+                title,
+                tpx,
+                _color_tuple(legend.title_text_color),
+                baseline="top",
+            )
+            cy += tpx * LINE_HEIGHT + legend.title_standoff
+        row_h = max(legend.glyph_height, px * LINE_HEIGHT)
+        label_w = max((_text_size(label, px)[0] for label, _ in entries), default=0.0)
+        item_w = (
+            legend.glyph_width
+            + legend.label_standoff
+            + max(label_w, legend.label_width)
+        )
+        for label, item in entries:
+            swatch = (
+                cx,
+                cy + (row_h - legend.glyph_height) / 2,
+                legend.glyph_width,
+                legend.glyph_height,
+            )
+            for renderer in item.renderers:
+                self._paint_swatch(canvas, renderer, item.index, swatch)
+            canvas.text(
+                cx + legend.glyph_width + legend.label_standoff,
+                cy + row_h / 2,
+                label,
+                px,
+                _color_tuple(legend.label_text_color),
+            )
+            if legend.orientation == "horizontal":
+                cx += item_w + legend.spacing
+            else:
+                cy += row_h + legend.spacing
+
+    def _paint_swatch(
+        self,
+        canvas: _Canvas,
+        renderer: bm.GlyphRenderer,
+        index: int | None,
+        box: tuple[float, float, float, float],
+    ) -> None:
+        glyph = renderer.glyph
+        data = self._glyph_data(renderer)
+        i = 0
+        if index is not None:
+            # item.index 是 source 中的行号
+            hit = np.flatnonzero(data.indices == index)
+            i = int(hit[0]) if hit.size > 0 else 0
+
+        def pick(prefix: str) -> RGBA | None:
+            if f"{prefix}_color" not in glyph.properties():
+                return None
+            colors = self._colors(glyph, data, prefix, max(data.n, 1))
+            return colors[min(i, len(colors) - 1) : min(i, len(colors) - 1) + 1]
+
+        x, y, w, h = box
+        fill, line = pick("fill"), pick("line")
+        line_width = (
+            float(np.max(np.atleast_1d(data.value(glyph, "line_width", 1.0))))
+            if "line_width" in glyph.properties()
+            else 1.0
+        )
+        if isinstance(glyph, (bm.Scatter, bm.Circle)):
+            marker = (
+                data.value(glyph, "marker", "circle")
+                if isinstance(glyph, bm.Scatter)
+                else "circle"
+            )
+            marker = np.atleast_1d(marker)
+            shape = str(marker[min(i, marker.size - 1)])
+            canvas.markers(
+                np.array([x + w / 2]),
+                np.array([y + h / 2]),
+                np.array([min(w, h) * 0.6]),
+                np.array([shape]),
+                fill if fill is not None else np.zeros((1, 4)),
+                line if line is not None else np.zeros((1, 4)),
+                line_width,
+            )
+        elif fill is not None:
+            canvas.rects(
+                np.array([x + w * 0.1]),
+                np.array([y + h * 0.1]),
+                np.array([x + w * 0.9]),
+                np.array([y + h * 0.9]),
+                fill,
+                line,
+                line_width,
+            )
+        elif line is not None:
+            canvas.lines(
+                [(np.array([x, x + w]), np.array([y + h / 2, y + h / 2]))],
+                line,
+                line_width,
+            )
+
+    # endregion
+
+    # region glyphs
+
+    def _colors(self, glyph: bm.Glyph, data: _GlyphData, prefix: str, n: int) -> RGBA:
+        color = data.value(glyph, f"{prefix}_color", None)
+        alpha = data.value(glyph, f"{prefix}_alpha", 1.0)
+        if (
+            isinstance(color, np.ndarray)
+            and color.ndim == 2
+            and color.dtype == np.float64
+        ):
+            out = color.copy()
+            out[:, 3] *= np.broadcast_to(np.asarray(alpha, dtype=np.float64), n)
+            return out
+        return _rgba(color, alpha, n)
+
+    def _coord(
+        self,
+        data: _GlyphData,
+        glyph: bm.Glyph,
+        name: str,
+        mapper: _Mapper,
+        default: Any = None,
+    ) -> np.ndarray | None:
+        """坐标属性 -> 屏幕坐标，支持 Dodge 和 Jitter"""
+        v, transform = data.resolve(glyph, name)
+        if v is None:
+            v = default
+        if v is None:
+            return None
+        if not isinstance(v, np.ndarray):
+            v = np.full(
+                data.n, v, dtype=object if isinstance(v, (str, tuple)) else np.float64
+            )
+        syn = mapper.interval.synthetic(v)
+        if isinstance(transform, bm.Dodge):
+            syn = syn + transform.value
+        elif isinstance(transform, bm.Jitter):
+            rng = np.random.default_rng(0)
+            if transform.distribution == "normal":
+                syn = syn + transform.mean + rng.normal(0, transform.width, syn.shape)
+            else:
+                syn = (
+                    syn
+                    + transform.mean
+                    + rng.uniform(-transform.width / 2, transform.width / 2, syn.shape)
+                )
+        elif transform is not None:
+            _warn_once(
+                f"transform:{type(transform).__name__}",
+                f"transform {type(transform).__name__} is not supported in static export",
+            )
+        return mapper(syn)
+
+    def _span(
+        self,
+        data: _GlyphData,
+        glyph: bm.Glyph,
+        center: str,
+        extent: str,
+        mapper: _Mapper,
+    ) -> tuple[np.ndarray, np.ndarray] | None:
+        """以 center 为中心、宽度为 extent (数据单位) 的区间的屏幕坐标"""
+        v, transform = data.resolve(glyph, center)
+        if v is None:
+            return None
+        if not isinstance(v, np.ndarray):
+            v = np.full(data.n, v, dtype=object if isinstance(v, str) else np.float64)
+        syn = mapper.interval.synthetic(v)
+        if isinstance(transform, bm.Dodge):
+            syn = syn + transform.value
+        e = np.asarray(data.value(glyph, extent, 1.0), dtype=np.float64)
+        if mapper.interval.log:
+            # log 轴上宽度在原始数据上计算
+            raw = 10**syn
+            lo = mapper.interval.synthetic(raw - e / 2)
+            hi = mapper.interval.synthetic(raw + e / 2)
+        else:
+            lo, hi = syn - e / 2, syn + e / 2
+        return mapper(lo), mapper(hi)
+
+    def _paint_glyph(
+        self,
+        canvas: _Canvas,
+        renderer: bm.GlyphRenderer,
+        mappers: dict[str, _Mapper],
+        frame: tuple[float, float, float, float],
+    ) -> None:
+        glyph = renderer.glyph
+        painter = _GLYPH_PAINTERS.get(type(glyph), None)
+        if painter is None:
+            _warn_once(
+                f"glyph:{type(glyph).__name__}",
+                f"{type(glyph).__name__} is not supported in static export, skipped",
+            )
+            return
+        data = self._glyph_data(renderer)
+        if data.n == 0:
+            return
+        painter(self, canvas, glyph, data, mappers, frame)
+
+    def _paint_whisker(
+        self, canvas: _Canvas, whisker: bm.Whisker, mappers: dict[str, _Mapper]
+    ) -> None:
+        data = self._glyph_data(whisker)
+        if data.n == 0:
+            return
+        # dimension 为 height 时 base 在 x 方向
+        base_dim, value_dim = (
+            ("x", "y") if whisker.dimension == "height" else ("y", "x")
+        )
+        base = self._coord(data, whisker, "base", mappers[base_dim])
+        lower = self._coord(data, whisker, "lower", mappers[value_dim])
+        upper = self._coord(data, whisker, "upper", mappers[value_dim])
+        if base is None or lower is None or upper is None:
+            return
+        n = data.n
+        lines: list[tuple[np.ndarray, np.ndarray]] = []
+        colors: list[RGBA] = []
+        widths: list[float] = []
+
+        def add(a: np.ndarray, b0: np.ndarray, b1: np.ndarray, model: Any) -> None:
+            # a 为 base 方向的坐标，b0/b1 为数值方向的两端
+            color = self._colors(model, data, "line", n)
+            for i in range(n):
+                pair = (np.array([a[i], a[i]]), np.array([b0[i], b1[i]]))
+                lines.append(pair if base_dim == "x" else pair[::-1])
+            colors.append(color)
+            widths.append(self._line_width(model, data))
+
+        add(base, lower, upper, whisker)
+        for head, at in ((whisker.lower_head, lower), (whisker.upper_head, upper)):
+            if head is None or head.line_width <= 0 or head.line_color is None:
+                continue
+            size = np.broadcast_to(np.asarray(head.size, dtype=np.float64), n)
+            for i in range(n):
+                a = np.array([base[i] - size[i] / 2, base[i] + size[i] / 2])
+                b = np.array([at[i], at[i]])
+                lines.append((a, b) if base_dim == "x" else (b, a))
+            colors.append(_rgba(head.line_color, head.line_alpha, n))
+            widths.append(float(head.line_width))
+        canvas.lines(lines, np.concatenate(colors), max(widths))
+
+    def _line_width(self, glyph: bm.Glyph, data: _GlyphData) -> float:
+        width = data.value(glyph, "line_width", 1.0)
+        return float(np.nanmax(np.atleast_1d(np.asarray(width, dtype=np.float64))))
+
+    def _scatter(
+        self,
+        canvas: _Canvas,
+        glyph: Any,
+        data: _GlyphData,
+        mappers: dict[str, _Mapper],
+        frame: Any,
+    ) -> None:
+        x = self._coord(data, glyph, "x", mappers["x"])
+        y = self._coord(data, glyph, "y", mappers["y"])
+        if x is None or y is None:
+            return
+        n = data.n
+        if isinstance(glyph, bm.Circle):
+            # radius 为数据单位，按 x 方向换算为像素
+            r = np.asarray(data.value(glyph, "radius", 1.0), dtype=np.float64)
+            mx = mappers["x"]
+            size = np.abs(mx(mx.interval.lo + r) - mx(np.asarray(mx.interval.lo))) * 2
+            marker = np.full(n, "circle")
+        else:
+            size = np.asarray(data.value(glyph, "size", 4.0), dtype=np.float64)
+            marker = np.asarray(data.value(glyph, "marker", "circle"))
+        size = np.broadcast_to(size, n).astype(np.float64)
+        marker = np.broadcast_to(marker, n)
+        canvas.markers(
+            x,
+            y,
+            size,
+            marker,
+            self._colors(glyph, data, "fill", n),
+            self._colors(glyph, data, "line", n),
+            self._line_width(glyph, data),
+        )
+
+    def _line(
+        self,
+        canvas: _Canvas,
+        glyph: Any,
+        data: _GlyphData,
+        mappers: dict[str, _Mapper],
+        frame: Any,
+    ) -> None:
+        x = self._coord(data, glyph, "x", mappers["x"])
+        y = self._coord(data, glyph, "y", mappers["y"])
+        if x is None or y is None:
+            return
+        if isinstance(glyph, bm.Step):
+            x, y = _step_points(x, y, glyph.mode)
+        color = self._colors(glyph, data, "line", data.n)
+        canvas.lines([(x, y)], color[:1], self._line_width(glyph, data))
+
+    def _multi_line(
+        self,
+        canvas: _Canvas,
+        glyph: Any,
+        data: _GlyphData,
+        mappers: dict[str, _Mapper],
+        frame: Any,
+    ) -> None:
+        polys = self._multi_coords(data, glyph, mappers)
+        if polys is None:
+            return
+        color = self._colors(glyph, data, "line", data.n)
+        canvas.lines(polys, color, self._line_width(glyph, data))
+
+    def _multi_coords(
+        self, data: _GlyphData, glyph: Any, mappers: dict[str, _Mapper]
+    ) -> list[tuple[np.ndarray, np.ndarray]] | None:
+        xs, _ = data.resolve(glyph, "xs")
+        ys, _ = data.resolve(glyph, "ys")
+        if xs is None or ys is None:
+            return None
+        mx, my = mappers["x"], mappers["y"]
+        return [
+            (
+                mx(mx.interval.synthetic(np.asarray(a))),
+                my(my.interval.synthetic(np.asarray(b))),
+            )
+            for a, b in zip(xs, ys)
+        ]
+
+    def _segment(
+        self,
+        canvas: _Canvas,
+        glyph: Any,
+        data: _GlyphData,
+        mappers: dict[str, _Mapper],
+        frame: Any,
+    ) -> None:
+        x0 = self._coord(data, glyph, "x0", mappers["x"])
+        y0 = self._coord(data, glyph, "y0", mappers["y"])
+        x1 = self._coord(data, glyph, "x1", mappers["x"])
+        y1 = self._coord(data, glyph, "y1", mappers["y"])
+        if x0 is None or y0 is None or x1 is None or y1 is None:
+            return
+        lines = [
+            (np.array([a, c]), np.array([b, d])) for a, b, c, d in zip(x0, y0, x1, y1)
+        ]
+        canvas.lines(
+            lines,
+            self._colors(glyph, data, "line", data.n),
+            self._line_width(glyph, data),
+        )
+
+    def _rects(
+        self,
+        canvas: _Canvas,
+        glyph: Any,
+        data: _GlyphData,
+        x0: np.ndarray | None,
+        y0: np.ndarray | None,
+        x1: np.ndarray | None,
+        y1: np.ndarray | None,
+    ) -> None:
+        if x0 is None or y0 is None or x1 is None or y1 is None:
+            return
+        n = data.n
+        line_width = self._line_width(glyph, data)
+        canvas.rects(
+            x0,
+            y0,
+            x1,
+            y1,
+            self._colors(glyph, data, "fill", n),
+            self._colors(glyph, data, "line", n) if line_width > 0 else None,
+            line_width,
+        )
+
+    def _quad(
+        self,
+        canvas: _Canvas,
+        glyph: Any,
+        data: _GlyphData,
+        mappers: dict[str, _Mapper],
+        frame: Any,
+    ) -> None:
+        self._rects(
+            canvas,
+            glyph,
+            data,
+            self._coord(data, glyph, "left", mappers["x"]),
+            self._coord(data, glyph, "top", mappers["y"]),
+            self._coord(data, glyph, "right", mappers["x"]),
+            self._coord(data, glyph, "bottom", mappers["y"]),
+        )
+
+    def _vbar(
+        self,
+        canvas: _Canvas,
+        glyph: Any,
+        data: _GlyphData,
+        mappers: dict[str, _Mapper],
+        frame: Any,
+    ) -> None:
+        span = self._span(data, glyph, "x", "width", mappers["x"])
+        if span is None:
+            return
+        self._rects(
+            canvas,
+            glyph,
+            data,
+            span[0],
+            self._coord(data, glyph, "top", mappers["y"]),
+            span[1],
+            self._coord(data, glyph, "bottom", mappers["y"], default=0.0),
+        )
+
+    def _hbar(
+        self,
+        canvas: _Canvas,
+        glyph: Any,
+        data: _GlyphData,
+        mappers: dict[str, _Mapper],
+        frame: Any,
+    ) -> None:
+        span = self._span(data, glyph, "y", "height", mappers["y"])
+        if span is None:
+            return
+        self._rects(
+            canvas,
+            glyph,
+            data,
+            self._coord(data, glyph, "left", mappers["x"], default=0.0),
+            span[0],
+            self._coord(data, glyph, "right", mappers["x"]),
+            span[1],
+        )
+
+    def _rect(
+        self,
+        canvas: _Canvas,
+        glyph: Any,
+        data: _GlyphData,
+        mappers: dict[str, _Mapper],
+        frame: Any,
+    ) -> None:
+        xs = self._span(data, glyph, "x", "width", mappers["x"])
+        ys = self._span(data, glyph, "y", "height", mappers["y"])
+        if xs is None or ys is None:
+            return
+        self._rects(canvas, glyph, data, xs[0], ys[0], xs[1], ys[1])
+
+    def _area(
+        self,
+        canvas: _Canvas,
+        glyph: Any,
+        data: _GlyphData,
+        mappers: dict[str, _Mapper],
+        frame: Any,
+    ) -> None:
+        if isinstance(glyph, bm.VArea):
+            x = self._coord(data, glyph, "x", mappers["x"])
+            a = self._coord(data, glyph, "y1", mappers["y"])
+            b = self._coord(data, glyph, "y2", mappers["y"])
+            if x is None or a is None or b is None:
+                return
+            px, py = np.concatenate([x, x[::-1]]), np.concatenate([a, b[::-1]])
+        else:
+            y = self._coord(data, glyph, "y", mappers["y"])
+            a = self._coord(data, glyph, "x1", mappers["x"])
+            b = self._coord(data, glyph, "x2", mappers["x"])
+            if y is None or a is None or b is None:
+                return
+            px, py = np.concatenate([a, b[::-1]]), np.concatenate([y, y[::-1]])
+        canvas.polygons(
+            [(px, py)], self._colors(glyph, data, "fill", data.n)[:1], None, 0
+        )
+
+    def _patch(
+        self,
+        canvas: _Canvas,
+        glyph: Any,
+        data: _GlyphData,
+        mappers: dict[str, _Mapper],
+        frame: Any,
+    ) -> None:
+        if isinstance(glyph, bm.Patches):
+            polys = self._multi_coords(data, glyph, mappers)
+            n = data.n
+        else:
+            x = self._coord(data, glyph, "x", mappers["x"])
+            y = self._coord(data, glyph, "y", mappers["y"])
+            polys = None if x is None or y is None else [(x, y)]
+            n = 1
+        if polys is None:
+            return
+        line_width = self._line_width(glyph, data)
+        canvas.polygons(
+            polys,
+            self._colors(glyph, data, "fill", data.n)[:n],
+            self._colors(glyph, data, "line", data.n)[:n] if line_width > 0 else None,
+            line_width,
+        )
+
+    def _span_line(
+        self,
+        canvas: _Canvas,
+        glyph: Any,
+        data: _GlyphData,
+        mappers: dict[str, _Mapper],
+        frame: Any,
+    ) -> None:
+        fx, fy, fw, fh = frame
+        if isinstance(glyph, bm.VSpan):
+            x = self._coord(data, glyph, "x", mappers["x"])
+            lines = (
+                []
+                if x is None
+                else [(np.array([p, p]), np.array([fy, fy + fh])) for p in x]
+            )
+        else:
+            y = self._coord(data, glyph, "y", mappers["y"])
+            lines = (
+                []
+                if y is None
+                else [(np.array([fx, fx + fw]), np.array([p, p])) for p in y]
+            )
+        canvas.lines(
+            lines,
+            self._colors(glyph, data, "line", data.n),
+            self._line_width(glyph, data),
+        )
+
+    def _text(
+        self,
+        canvas: _Canvas,
+        glyph: Any,
+        data: _GlyphData,
+        mappers: dict[str, _Mapper],
+        frame: Any,
+    ) -> None:
+        x = self._coord(data, glyph, "x", mappers["x"])
+        y = self._coord(data, glyph, "y", mappers["y"])
+        if x is None or y is None:
+            return
+        n = data.n
+        text = np.broadcast_to(
+            np.asarray(data.value(glyph, "text", ""), dtype=object), n
+        )
+        px = np.broadcast_to(
+            np.asarray(
+                [
+                    _font_px(s)
+                    for s in np.atleast_1d(data.value(glyph, "text_font_size", "16px"))
+                ]
+            ),
+            n,
+        )
+        color = self._colors(glyph, data, "text", n)
+        x_offset = np.broadcast_to(
+            np.asarray(data.value(glyph, "x_offset", 0.0), dtype=np.float64), n
+        )
+        y_offset = np.broadcast_to(
+            np.asarray(data.value(glyph, "y_offset", 0.0), dtype=np.float64), n
+        )
+        angle = np.broadcast_to(
+            np.asarray(data.value(glyph, "angle", 0.0), dtype=np.float64), n
+        )
+        align = np.broadcast_to(np.asarray(data.value(glyph, "text_align", "left")), n)
+        baseline = np.broadcast_to(
+            np.asarray(data.value(glyph, "text_baseline", "bottom")), n
+        )
+        for i in np.flatnonzero(np.isfinite(x) & np.isfinite(y)):
+            canvas.text(
+                float(x[i] + x_offset[i]),
+                float(y[i] + y_offset[i]),
+                str(text[i]),
+                float(px[i]),
+                tuple(color[i].tolist()),  # type: ignore
+                align=str(align[i]),
+                baseline=str(baseline[i]),
+                angle=float(angle[i]),
+            )
+
+    def _image(
+        self,
+        canvas: _Canvas,
+        glyph: Any,
+        data: _GlyphData,
+        mappers: dict[str, _Mapper],
+        frame: Any,
+    ) -> None:
+        images, _ = data.resolve(glyph, "image")
+        if images is None:
+            return
+        xs = np.broadcast_to(
+            np.asarray(data.value(glyph, "x", 0.0), dtype=np.float64), data.n
+        )
+        ys = np.broadcast_to(
+            np.asarray(data.value(glyph, "y", 0.0), dtype=np.float64), data.n
+        )
+        dws = np.broadcast_to(
+            np.asarray(data.value(glyph, "dw", 1.0), dtype=np.float64), data.n
+        )
+        dhs = np.broadcast_to(
+            np.asarray(data.value(glyph, "dh", 1.0), dtype=np.float64), data.n
+        )
+        mx, my = mappers["x"], mappers["y"]
+        for image, x, y, dw, dh in zip(images, xs, ys, dws, dhs):
+            image = np.asarray(image)
+            if isinstance(glyph, bm.ImageRGBA):
+                rgba = image.view(np.uint8).reshape(*image.shape, 4)
+            else:
+                rgba = (
+                    _map_colors(glyph.color_mapper, image.reshape(-1)) * 255 + 0.5
+                ).astype(np.uint8)
+                rgba = rgba.reshape(*image.shape, 4)
+            # 图片的第一行在数据坐标的下方
+            x0, x1 = mx(mx.interval.synthetic(np.array([x, x + dw])))
+            y0, y1 = my(my.interval.synthetic(np.array([y, y + dh])))
+            canvas.image(float(x0), float(y1), float(x1), float(y0), rgba[::-1])
+
+    # endregion
+
+
+def _step_points(
+    x: np.ndarray, y: np.ndarray, mode: str
+) -> tuple[np.ndarray, np.ndarray]:
+    n = x.size
+    if n < 2:
+        return x, y
+    if mode == "before":
+        sx = np.repeat(x, 2)[:-1]
+        sy = np.repeat(y, 2)[1:]
+    elif mode == "center":
+        mid = (x[:-1] + x[1:]) / 2
+        sx = np.concatenate([[x[0]], np.repeat(mid, 2), [x[-1]]])
+        sy = np.repeat(y, 2)
+    else:
+        sx = np.repeat(x, 2)[1:]
+        sy = np.repeat(y, 2)[:-1]
+    return sx, sy
+
+
+_GlyphPainter = Callable[
+    [
+        _PlotNode,
+        _Canvas,
+        Any,
+        _GlyphData,
+        dict[str, _Mapper],
+        tuple[float, float, float, float],
+    ],
+    None,
+]
+
+_GLYPH_PAINTERS: dict[type[bm.Glyph], _GlyphPainter] = {
+    bm.Scatter: _PlotNode._scatter,
+    bm.Circle: _PlotNode._scatter,
+    bm.Line: _PlotNode._line,
+    bm.Step: _PlotNode._line,
+    bm.MultiLine: _PlotNode._multi_line,
+    bm.Segment: _PlotNode._segment,
+    bm.Quad: _PlotNode._quad,
+    bm.VBar: _PlotNode._vbar,
+    bm.HBar: _PlotNode._hbar,
+    bm.Rect: _PlotNode._rect,
+    bm.VArea: _PlotNode._area,
+    bm.HArea: _PlotNode._area,
+    bm.Patch: _PlotNode._patch,
+    bm.Patches: _PlotNode._patch,
+    bm.VSpan: _PlotNode._span_line,
+    bm.HSpan: _PlotNode._span_line,
+    bm.Text: _PlotNode._text,
+    bm.Image: _PlotNode._image,
+    bm.ImageRGBA: _PlotNode._image,
+}
+
+# endregion
+
+
+def _write(filename: str | os.PathLike[str] | None, payload: bytes) -> None:
+    if filename is not None:
+        with open(filename, "wb") as f:
+            f.write(payload)
+
+
+def export_png(
+    model: bm.LayoutDOM,
+    filename: str | os.PathLike[str] | None = None,
+    *,
+    scale: float = 1.0,
+) -> bytes:
+    """把渲染得到的模型导出为 PNG，`scale` 为像素密度 (例如 2 为高清)"""
+    with profile_stage("export", name="png") as stage:
+        node = _node(model)
+        w, h = node.size()
+        canvas = _RasterCanvas(w, h, scale=scale)
+        node.paint(canvas, 0.0, 0.0, w, h)
+        payload = _encode_png(canvas.to_rgba())
+        stage.update(document_bytes=len(payload))
+    _write(filename, payload)
+    return payload
+
+
+def export_svg(
+    model: bm.LayoutDOM,
+    filename: str | os.PathLike[str] | None = None,
+) -> str:
+    """把渲染得到的模型导出为 SVG"""
+    with profile_stage("export", name="svg") as stage:
+        node = _node(model)
+        w, h = node.size()
+        canvas = _SvgCanvas(w, h)
+        node.paint(canvas, 0.0, 0.0, w, h)
+        payload = canvas.to_svg()
+        stage.update(document_bytes=len(payload))
+    _write(filename, payload.encode("utf-8"))
+    return payload
+
+
+def export(
+    model: bm.LayoutDOM,
+    format: ExportFormat,
+    filename: str | os.PathLike[str] | None = None,
+    *,
+    scale: float = 1.0,
+) -> bytes:
+    if format == "png":
+        return export_png(model, filename, scale=scale)
+    if format == "svg":
+        return export_svg(model, filename).encode("utf-8")
+    raise ValueError(f"unsupported export format {format!r}")
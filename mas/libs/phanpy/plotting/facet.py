@@ -1,6 +1,13 @@
-from typing import Any, Iterable
+import contextlib
+import contextvars
+from dataclasses import dataclass, field
+from typing import Any, Hashable, Iterable, Iterator
 
+import bokeh.models as bm
 import polars as pl
+from bokeh.models.glyph import ConnectedXYGlyph
+
+from mas.libs.phanpy.plotting.constants import m_internal
 
 FacetFilter = dict[str, Any]
 
@@ -47,3 +54,151 @@ def split_facet_filter_for_stats(
             stats_filter[k] = v
 
     return stats_filter, glyph_filter
+
+
+@dataclass
+class _DrawScope:
+    # 在子图中的位置: 每一层为 glyph 在父级中的序号
+    path: tuple[int, ...]
+    # 整个子图的 facet 过滤条件
+    facet_filter: FacetFilter | None
+    children: int = 0
+    calls: int = 0
+
+
+_draw_scope: contextvars.ContextVar[_DrawScope | None] = contextvars.ContextVar(
+    "mas.plotting.facet.draw_scope", default=None
+)
+
+
+@contextlib.contextmanager
+def facet_draw_scope(facet_filter: FacetFilter | None = None) -> Iterator[None]:
+    """标记一次绘制 (子图或者其中的一个 glyph)，用于在子图之间对应同一个 glyph
+
+    最外层为子图，`facet_filter` 为子图的过滤条件；嵌套时按顺序编号，沿用外层的条件
+    """
+    parent = _draw_scope.get()
+    if parent is None:
+        scope = _DrawScope(path=(), facet_filter=facet_filter)
+    else:
+        scope = _DrawScope(
+            path=(*parent.path, parent.children), facet_filter=parent.facet_filter
+        )
+        parent.children += 1
+    token = _draw_scope.set(scope)
+    try:
+        yield
+    finally:
+        _draw_scope.reset(token)
+
+
+@dataclass
+class SharedFacetSources:
+    """facet 的所有子图共用的 `bm.ColumnDataSource`
+
+    同一个 glyph 在每个子图中得到的 (未按 facet 过滤的) 数据相同，只创建一个
+    source，每个子图通过 `bm.CDSView` 过滤，子图之间的选择也因此联动。
+
+    source 按 glyph 在子图中的位置 (见 `facet_draw_scope`) 查找，不比较数据本身：
+    glyph 的数据由其输入和没有交给 view 过滤的 facet 条件决定，这部分条件也是 key 的一部分
+    """
+
+    # key -> (列名, 行数, 写入 source 的数据, source)
+    sources: dict[
+        Hashable,
+        tuple[tuple[str, ...], int, pl.DataFrame, bm.ColumnDataSource],
+    ] = field(default_factory=dict)
+
+    def next_key(self, facet_filter: FacetFilter) -> Hashable | None:
+        """当前 glyph 下一次渲染的 key，不在 `facet_draw_scope` 中时返回 None"""
+        scope = _draw_scope.get()
+        if scope is None:
+            return None
+        scope.calls += 1
+        panel_filter = scope.facet_filter or {}
+        residual = tuple(
+            (k, v) for k, v in panel_filter.items() if k not in facet_filter
+        )
+        return scope.path, scope.calls, residual
+
+    def lookup(
+        self, key: Hashable, data: pl.DataFrame
+    ) -> tuple[pl.DataFrame, bm.ColumnDataSource] | None:
+        entry = self.sources.get(key, None)
+        if entry is None:
+            return None
+        columns, height, source_data, source = entry
+        # 只做廉价的检查，形状不同时不复用
+        if columns != tuple(data.columns) or height != data.height:
+            return None
+        return source_data, source
+
+    def register(
+        self,
+        key: Hashable,
+        data: pl.DataFrame,
+        source_data: pl.DataFrame,
+        source: bm.ColumnDataSource,
+    ) -> None:
+        self.sources.setdefault(
+            key, (tuple(data.columns), data.height, source_data, source)
+        )
+
+
+_shared_sources: contextvars.ContextVar[SharedFacetSources | None] = (
+    contextvars.ContextVar("mas.plotting.facet.shared_sources", default=None)
+)
+
+
+@contextlib.contextmanager
+def shared_facet_sources() -> Iterator[SharedFacetSources]:
+    """在此范围内渲染的子图共用 source，见 `SharedFacetSources`"""
+    sources = SharedFacetSources()
+    token = _shared_sources.set(sources)
+    try:
+        yield sources
+    finally:
+        _shared_sources.reset(token)
+
+
+def current_shared_facet_sources(
+    data: pl.DataFrame,
+    facet_filter: FacetFilter | None,
+    glyph: bm.Glyph,
+) -> SharedFacetSources | None:
+    """`data` 可以通过 view 按 `facet_filter` 过滤时返回当前的共享 source
+
+    Line、Patch 等连续的 glyph 不支持 view 过滤 (CDSVIEW_FILTERS_WITH_CONNECTED)，
+    仍然使用每个子图单独的 source
+    """
+    sources = _shared_sources.get()
+    if sources is None or not facet_filter or _draw_scope.get() is None:
+        return None
+    if isinstance(glyph, ConnectedXYGlyph):
+        return None
+    if any(k not in data.columns for k in facet_filter.keys()):
+        return None
+    return sources
+
+
+def make_facet_view(data: pl.DataFrame, facet_filter: FacetFilter) -> bm.CDSView:
+    """按 `facet_filter` 过滤 `data` 的 `bm.CDSView`
+
+    字符串使用 `bm.GroupFilter` (不需要传输下标)，其他类型使用 `bm.IndexFilter`
+    """
+    if all(isinstance(v, str) for v in facet_filter.values()):
+        filters = [
+            bm.GroupFilter(column_name=k, group=v) for k, v in facet_filter.items()
+        ]
+        if len(filters) == 1:
+            return bm.CDSView(filter=filters[0])
+        return bm.CDSView(filter=bm.IntersectionFilter(operands=filters))
+
+    index_name = m_internal("mas.facet.index")
+    indices = (
+        data.lazy()
+        .select(pl.int_range(pl.len(), dtype=pl.Int64).alias(index_name), *facet_filter)
+        .filter(*[pl.col(k) == v for k, v in facet_filter.items()])
+        .collect()[index_name]
+    )
+    return bm.CDSView(filter=bm.IndexFilter(indices=indices.to_list()))
@@ -12,19 +12,141 @@
 #
 # Copyright (c) 2024 Maspectra Dev Team
 ############################################################
-from typing import Any, Iterable, Sequence
+import collections
+import threading
+import weakref
+from typing import Any, Hashable, Iterable, Literal, Sequence
 
+import bokeh.models as bm
 import polars as pl
 from bokeh.core.enums import MarkerType, MarkerTypeType
 
 from mas.libs.phanpy.plotting.field import (
     DelegateFieldSpecConstructor,
     FactorMapTransformFieldSpec,
+    expr_column_name,
 )
 from mas.libs.phanpy.plotting.palette import NamedPaletteType, use_palette
 from mas.libs.phanpy.types.color import ColorLike
 
 
+# (id(数据), 列或 data spec) -> (数据的弱引用, 列或 data spec, factors)
+# 字符串、表达式按内容比较，其他的按 id，对象本身保存在 value 中，避免 id 被复用
+_factors_cache: collections.OrderedDict[
+    tuple[Any, ...], tuple[weakref.ref[pl.DataFrame], tuple[Any, ...], list[Any]]
+] = collections.OrderedDict()
+_factors_cache_lock = threading.Lock()
+_FACTORS_CACHE_SIZE = 16
+
+
+def _factors_key(spec: Any) -> Hashable:
+    if isinstance(spec, str):
+        return spec
+    if isinstance(spec, pl.Expr):
+        # 按表达式的内容，复制后的 spec (例如各个子图) 得到相同的 key
+        return ("expr", expr_column_name(spec)[0])
+    return ("id", id(spec))
+
+
+def infer_factors(
+    data: pl.DataFrame,
+    *by: str | pl.Expr,
+    source: pl.DataFrame | None = None,
+    spec: Sequence[Any] = (),
+) -> list[str] | list[tuple[str, ...]]:
+    """从 `data` 中推断 `bm.FactorRange` 的 factors，多个列时为嵌套的 factors
+
+    - pl.Enum: 按定义的类别顺序
+    - pl.Categorical: 按 dtype 的 ordering (默认为 physical，即类别出现的顺序)
+    - 其他类型: 按值排序，数值排序后再转为字符串
+
+    `bm.FactorRange` 只接受字符串，绘制时数据中的列要用 `as_factor_columns`
+    做同样的转换。
+
+    结果按 `data` 对象和列缓存。`data` 由 `interpret_data_spec` 生成时每个子图都是
+    新的对象，此时传入原始数据 `source` 和 `by` 对应的 data spec，按它们缓存
+    """
+    if not 1 <= len(by) <= 3:
+        raise ValueError("factors must have 1 to 3 levels")
+    anchor, keys = (
+        (source, tuple(spec))
+        if source is not None and len(spec) == len(by)
+        else (data, tuple(by))
+    )
+    cache_key = (id(anchor), *(_factors_key(k) for k in keys))
+    with _factors_cache_lock:
+        cached = _factors_cache.get(cache_key, None)
+        if cached is not None and cached[0]() is anchor:
+            _factors_cache.move_to_end(cache_key)
+            return cached[2]
+
+    unique = data.select(by).unique().drop_nulls()
+    # Categorical/Enum 按 physical 排序，不需要比较字符串
+    unique = unique.sort(unique.columns).select(pl.all().cast(pl.String))
+    factors: list[Any]
+    if len(by) == 1:
+        factors = unique.to_series().to_list()
+    else:
+        factors = unique.rows()
+
+    with _factors_cache_lock:
+        _factors_cache[cache_key] = (weakref.ref(anchor), keys, factors)
+        _factors_cache.move_to_end(cache_key)
+        if len(_factors_cache) > _FACTORS_CACHE_SIZE:
+            _factors_cache.popitem(last=False)
+    return factors
+
+
+def ensure_factors(
+    range_: bm.Range,
+    data: pl.DataFrame | None,
+    *by: str | pl.Expr,
+    source: pl.DataFrame | None = None,
+    spec: Sequence[Any] = (),
+) -> None:
+    """categorical 轴没有指定 factors 时，从 `data` 中推断，参数见 `infer_factors`"""
+    if (
+        isinstance(range_, bm.FactorRange)
+        and len(range_.factors) == 0
+        and data is not None
+    ):
+        range_.factors = [*infer_factors(data, *by, source=source, spec=spec)]
+
+
+def categorical_side(
+    figure: bm.Plot, data: pl.DataFrame, x: str, y: str
+) -> Literal["x", "y"]:
+    """numeric/categorical 成对的统计图 (例如箱线图) 中 categorical 的一侧
+
+    优先按轴的类型 (`bm.FactorRange`) 判断，数值、布尔等类型的列也可以作为分类；
+    两个轴的类型相同时再按列的类型判断
+    """
+    x_categorical = isinstance(figure.x_range, bm.FactorRange)
+    y_categorical = isinstance(figure.y_range, bm.FactorRange)
+    if x_categorical == y_categorical:
+        x_categorical = not data[x].dtype.is_numeric()
+        y_categorical = not data[y].dtype.is_numeric()
+    if x_categorical and not y_categorical and data[y].dtype.is_numeric():
+        return "x"
+    if y_categorical and not x_categorical and data[x].dtype.is_numeric():
+        return "y"
+    raise ValueError("x/y must be a numeric/categorical pair")
+
+
+def as_factor_columns(data: pl.DataFrame, *names: str) -> pl.DataFrame:
+    """把 categorical 轴上的列转为字符串，与 `infer_factors` 得到的 factors 一致
+
+    数值、布尔等类型的列不转换时，BokehJS 找不到对应的 factor，点不会显示
+    """
+    casts = [
+        pl.col(name).cast(pl.String)
+        for name in names
+        if name in data.columns
+        and not isinstance(data.schema[name], (pl.String, pl.Categorical, pl.Enum))
+    ]
+    return data.with_columns(casts) if len(casts) > 0 else data
+
+
 def color_map(
     factors: Iterable[Any],
     palette: NamedPaletteType
@@ -13,16 +13,20 @@
 # Copyright (c) 2024 Maspectra Dev Team
 ############################################################
 import abc
-import functools
+import collections
+import hashlib
 import logging as logger
+import threading
 from dataclasses import dataclass
-from typing import Any, Callable, Collection
+from typing import Any, Collection, Literal, Mapping
 
 import polars as pl
 from bokeh.core.property.vectorization import Field as BokehField
 from polars._typing import IntoExpr, NonNestedLiteral
 from typing_extensions import Generic, Protocol, TypeVar
 
+from mas.libs.phanpy.plotting.constants import m_internal
+from mas.libs.phanpy.plotting.profile import profile_stage
 from mas.libs.phanpy.types.primitive import ScalarLike
 
 T = TypeVar("T", default=Any)
@@ -84,8 +88,11 @@ class DelegateFieldSpecConstructor(FieldSpecConstructorLike[T]):
         self,
         column_name: str,
         constructor: FieldSpecConstructorLike[T],
+        label: str | None = None,
     ) -> None:
         self.column_name = column_name
+        # 在 tooltip 等处展示的名称，默认为列名
+        self.label = label or column_name
         self.__constructor = constructor
 
     def __call__(self, data: pl.DataFrame) -> FieldSpec[T]:
@@ -101,13 +108,57 @@ DataSpec = (
 )  # Scalar will automatically expanded
 
 
+class PolarsExprFieldSpecConstructor(DelegateFieldSpecConstructor[T]):
+    """由 `pl.Expr` 生成的 field，`expr` 的输出列名即为 `column_name`"""
+
+    def __init__(
+        self,
+        column_name: str,
+        constructor: FieldSpecConstructorLike[T],
+        expr: pl.Expr,
+        label: str | None = None,
+    ) -> None:
+        super().__init__(column_name=column_name, constructor=constructor, label=label)
+        self.expr = expr
+
+
+def expr_column_name(expr: pl.Expr) -> tuple[str, str]:
+    """表达式对应的 (列名, 展示名称)
+
+    单独的列或者显式 alias 的表达式使用其输出列名，其他的计算列
+    (例如 `pl.col("dose") * pl.col("weight")`) 使用由表达式生成的临时列名，
+    避免覆盖输入列
+    """
+    output_name = expr.meta.output_name(raise_if_undetermined=False)
+    if output_name is not None and (
+        expr.meta.is_column() or not expr.meta.undo_aliases().meta.eq(expr)
+    ):
+        return output_name, output_name
+
+    label = str(expr)
+    if label.startswith("[") and label.endswith("]"):
+        label = label[1:-1]
+    try:
+        key = expr.meta.serialize(format="json")
+    except Exception:
+        # 无法序列化 (例如包含 python 函数) 时退化为按对象区分
+        key = f"{label}@{id(expr)}"
+    digest = hashlib.sha1(key.encode()).hexdigest()[:12]
+    return m_internal(f"mas.plotting.field.{digest}"), label
+
+
 class polars_expr_as_field_spec_constructor(Generic[T]):
     def __new__(
         cls,
         constructor: pl.Expr,
     ) -> DelegateFieldSpecConstructor[T]:
         root_names = constructor.meta.root_names()
-        column_name = constructor.meta.output_name()
+        column_name, label = expr_column_name(constructor)
+        expr = (
+            constructor
+            if constructor.meta.output_name(raise_if_undetermined=False) == column_name
+            else constructor.alias(column_name)
+        )
 
         def _constructor(data: pl.DataFrame) -> FieldSpec[T]:
             for from_name in root_names:
@@ -116,13 +167,36 @@ class polars_expr_as_field_spec_constructor(Generic[T]):
             return PolarsExprTransformFieldSpec(
                 column_name=column_name,
                 transformed_column_name=column_name,
-                expr=constructor,
+                expr=expr,
             )
 
+        return PolarsExprFieldSpecConstructor(
+            column_name=column_name,
+            constructor=_constructor,
+            expr=expr,
+            label=label,
+        )
+
+
+class column_field_spec_constructor(Generic[T]):
+    """直接引用已经存在的列"""
+
+    def __new__(
+        cls,
+        column_name: str,
+        label: str | None = None,
+    ) -> DelegateFieldSpecConstructor[T]:
+        def _constructor(data: pl.DataFrame) -> FieldSpec[T]:
+            if column_name not in data.columns:
+                raise pl.exceptions.ColumnNotFoundError(
+                    f"Column '{column_name}' not exists"
+                )
+            return FieldSpec(column_name=column_name)
+
         return DelegateFieldSpecConstructor(
-            # TODO: @xuchongyi 这里是有 bug 的，如果生成列依赖多个输入列，这里没法正确的 groupby，需要额外处理
             column_name=column_name,
             constructor=_constructor,
+            label=label,
         )
 
 
@@ -153,46 +227,205 @@ def interpret_data_spec(
     data: pl.DataFrame | None,
     **named_spec: DataSpec[Any],
 ) -> tuple[pl.DataFrame, tuple[str, ...]]:
-    lazy_exprs: list[IntoExpr | Callable[[int], IntoExpr]] = []
-    height: int | None = None
-    output_names: list[str] = []
+    with profile_stage("interpret_data_spec") as stage:
+        interpreted, output_names = _interpret_data_spec(data, **named_spec)
+        if stage.enabled:
+            stage.update(
+                rows_in=data.height if data is not None else 0,
+                rows_out=interpreted.height,
+                columns=interpreted.width,
+            )
+        return interpreted, output_names
+
+
+DataSpecKind = Literal["expr", "delegate", "series", "scalar"]
+
+
+@dataclass(frozen=True)
+class _DataSpecStep:
+    name: str
+    kind: DataSpecKind
+    # expr: 编译时已校验过的表达式; scalar: pl.lit
+    expr: pl.Expr | None = None
+    output_name: str | None = None
+    root_names: frozenset[str] = frozenset()
+
+
+@dataclass(frozen=True)
+class DataSpecPlan:
+    """`interpret_data_spec` 编译后的结果
+
+    对同一组 data spec 和相同 schema 的数据，分类和列名校验只做一次，
+    之后每个 panel 只需要一次 `with_columns`
+
+    `output_names` 中 delegate 的输出列名以 `apply` 返回的为准
+    """
+
+    steps: tuple[_DataSpecStep, ...]
+    output_names: tuple[str, ...]
+    needs_data: bool
+
+    def apply(
+        self, data: pl.DataFrame | None, named_spec: dict[str, DataSpec[Any]]
+    ) -> tuple[pl.DataFrame, tuple[str, ...]]:
+        if self.needs_data and data is None:
+            raise ValueError("Data must be provided with expression like data spec.")
+
+        height: int | None = None
+        # (expr, root_names, output_name)，高度在最后确定
+        columns: list[tuple[IntoExpr | None, frozenset[str], str]] = []
+        for step in self.steps:
+            v = named_spec[step.name]
+            if step.kind == "expr":
+                assert data is not None and step.output_name is not None
+                height = _ensure_height_matches(step.name, data.height, height)
+                columns.append((step.expr, step.root_names, step.output_name))
+            elif step.kind == "delegate":
+                assert data is not None
+                # 可能依赖数据 (例如 factor_cmap)，每次都需要重新构造
+                spec = v(data)
+                height = _ensure_height_matches(step.name, data.height, height)
+                if isinstance(spec, TransformFieldSpec):
+                    expr = spec.transform_expr()
+                    columns.append(
+                        (
+                            expr,
+                            frozenset(expr.meta.root_names()),
+                            spec.transformed_column_name,
+                        )
+                    )
+                else:
+                    if spec.column_name not in data.columns:
+                        raise pl.exceptions.ColumnNotFoundError(
+                            f"Column '{spec.column_name}' not exists"
+                        )
+                    columns.append(
+                        (data[spec.column_name], frozenset(), spec.column_name)
+                    )
+            elif step.kind == "series":
+                height = _ensure_height_matches(step.name, len(v), height)
+                columns.append((pl.Series(step.name, v), frozenset(), step.name))
+            else:
+                columns.append((None, frozenset(), step.name))
 
-    for name, v in named_spec.items():
-        if isinstance(v, pl.Expr):
-            v = polars_expr_as_field_spec_constructor(v)
-        if isinstance(v, DelegateFieldSpecConstructor):
+        if height is None:
             if data is None:
-                raise ValueError(
-                    "Data must be provided with expression like data spec."
+                height = 1
+            else:
+                height = data.height
+        elif data is not None and data.height != height:
+            data = pl.DataFrame()
+
+        frame = data if data is not None else pl.DataFrame()
+        # 后面的表达式依赖前面生成的列或者输出重名时，需要分多次 with_columns
+        stage: list[IntoExpr] = []
+        stage_outputs: set[str] = set()
+        for step, (expr_, root_names, output_name) in zip(self.steps, columns):
+            if expr_ is None:
+                assert step.expr is not None
+                expr_ = (
+                    # 没有其他列时需要显式指定高度
+                    step.expr.alias(step.name)
+                    if frame.width > 0 or len(stage) > 0
+                    else pl.repeat(step.expr, height).alias(step.name)
                 )
-            spec = v(data)
-            height = _ensure_height_matches(name, data.height, height)
-            if isinstance(spec, TransformFieldSpec):
-
-                def _(n: int, *, spec: TransformFieldSpec) -> pl.Expr:
-                    return spec.transform_expr()
+            if output_name in stage_outputs or not root_names.isdisjoint(
+                stage_outputs
+            ):
+                frame = frame.with_columns(stage)
+                stage, stage_outputs = [], set()
+            stage.append(expr_)
+            stage_outputs.add(output_name)
+        if stage:
+            frame = frame.with_columns(stage)
+
+        return frame, tuple(output_name for _, _, output_name in columns)
+
+
+# (spec 的 key, schema) -> plan，按 id 区分的 spec 对象保存在 value 中，避免 id 被复用
+# (列表、Series 等只用到长度，不保存)
+_plan_cache: collections.OrderedDict[
+    tuple[Any, ...], tuple[tuple[Any, ...], DataSpecPlan]
+] = collections.OrderedDict()
+_plan_cache_lock = threading.Lock()
+_PLAN_CACHE_SIZE = 256
+
+
+def _data_spec_key(name: str, v: DataSpec[Any]) -> tuple[Any, ...]:
+    if isinstance(v, (pl.Expr, DelegateFieldSpecConstructor)):
+        return (name, "spec", id(v))
+    if isinstance(v, Collection) and not isinstance(v, str):
+        # 只用到长度，和具体的值无关
+        return (name, "series")
+    return (name, "scalar", id(v))
+
+
+def compile_data_spec(
+    schema: Mapping[str, pl.DataType] | None,
+    **named_spec: DataSpec[Any],
+) -> DataSpecPlan:
+    """把 data spec 编译为 `DataSpecPlan`，按 spec 和 schema 缓存"""
+    key = (
+        tuple(_data_spec_key(name, v) for name, v in named_spec.items()),
+        tuple(schema.items()) if schema is not None else None,
+    )
+    with _plan_cache_lock:
+        cached = _plan_cache.get(key, None)
+        if cached is not None:
+            _plan_cache.move_to_end(key)
+            return cached[1]
+
+    plan = _compile_data_spec(schema, named_spec)
+    pinned = tuple(
+        v for (_, kind, *_), v in zip(key[0], named_spec.values()) if kind != "series"
+    )
+    with _plan_cache_lock:
+        _plan_cache[key] = (pinned, plan)
+        if len(_plan_cache) > _PLAN_CACHE_SIZE:
+            _plan_cache.popitem(last=False)
+    return plan
+
+
+def _compile_data_spec(
+    schema: Mapping[str, pl.DataType] | None,
+    named_spec: dict[str, DataSpec[Any]],
+) -> DataSpecPlan:
+    steps: list[_DataSpecStep] = []
+    output_names: list[str] = []
+    needs_data = False
 
-                lazy_exprs.append(functools.partial(_, spec=spec))
-                output_name = spec.transformed_column_name
-            else:
-                if spec.column_name not in data.columns:
-                    raise pl.exceptions.ColumnNotFoundError(
-                        f"Column '{spec.column_name}' not exists"
-                    )
-                lazy_exprs.append(data[spec.column_name])
-                output_name = spec.column_name
+    for name, v in named_spec.items():
+        if isinstance(v, pl.Expr):
+            needs_data = True
+            root_names = v.meta.root_names()
+            # 计算列使用临时列名，避免覆盖输入列 (例如 y2=pl.col("y") + 1)
+            output_name, _ = expr_column_name(v)
+            if schema is not None:
+                for from_name in root_names:
+                    if from_name not in schema:
+                        raise KeyError(f"{from_name} not found in column names")
+            step = _DataSpecStep(
+                name=name,
+                kind="expr",
+                expr=(
+                    v
+                    if v.meta.output_name(raise_if_undetermined=False) == output_name
+                    else v.alias(output_name)
+                ),
+                output_name=output_name,
+                root_names=frozenset(root_names),
+            )
+        elif isinstance(v, DelegateFieldSpecConstructor):
+            needs_data = True
+            step = _DataSpecStep(name=name, kind="delegate", output_name=v.column_name)
+            output_name = v.column_name
         elif isinstance(v, Collection) and not isinstance(
             v, str
         ):  # !IMPORTANT: 单个字符串是 Collection
-            height = _ensure_height_matches(name, len(v), height)
-            lazy_exprs.append(pl.Series(name, v))
+            step = _DataSpecStep(name=name, kind="series", output_name=name)
             output_name = name
         else:  # is scalar
-
-            def _(n: int, *, name: str, value: pl.Expr) -> pl.Expr:
-                return pl.repeat(value, n).alias(name)
-
-            lazy_exprs.append(functools.partial(_, name=name, value=pl.lit(v)))
+            step = _DataSpecStep(name=name, kind="scalar", expr=pl.lit(v))
             output_name = name
 
         if output_name in output_names:
@@ -200,30 +433,22 @@ def interpret_data_spec(
                 f"{output_name} appears multiple times in data specs. It might cause unexpected behavior"
             )
 
+        steps.append(step)
         output_names.append(output_name)
 
-    if height is None:
-        if data is None:
-            height = 1
-        else:
-            height = data.height
-    elif data is not None and data.height != height:
-        data = pl.DataFrame()
-
-    lazy: pl.LazyFrame
-    if data is not None:
-        lazy = data.lazy()
-    else:
-        lazy = pl.DataFrame().lazy()
+    return DataSpecPlan(
+        steps=tuple(steps), output_names=tuple(output_names), needs_data=needs_data
+    )
 
-    for lazy_expr in lazy_exprs:
-        if callable(lazy_expr):
-            expr_ = lazy_expr(height)
-        else:
-            expr_ = lazy_expr
-        lazy = lazy.with_columns(expr_)
 
-    return lazy.collect(), tuple(output_names)
+def _interpret_data_spec(
+    data: pl.DataFrame | None,
+    **named_spec: DataSpec[Any],
+) -> tuple[pl.DataFrame, tuple[str, ...]]:
+    # 比 data.schema 快很多
+    schema = dict(zip(data.columns, data.dtypes)) if data is not None else None
+    plan = compile_data_spec(schema, **named_spec)
+    return plan.apply(data, named_spec)
 
 
 def get_field_props(d: dict[str, Any]) -> dict[str, DelegateFieldSpecConstructor[Any]]:
@@ -234,6 +459,31 @@ def get_field_props(d: dict[str, Any]) -> dict[str, DelegateFieldSpecConstructor
     return field_props
 
 
+def materialize_field_props(
+    d: dict[str, Any], data: pl.DataFrame
+) -> tuple[dict[str, Any], pl.DataFrame]:
+    """把由表达式计算的 field 一次性计算为列，并替换为对该列的引用
+
+    之后可以直接按 `column_name` 分组，或者在聚合后的数据上继续使用
+    """
+    d = d.copy()
+    exprs: dict[str, pl.Expr] = {}
+    for k, v in d.items():
+        if isinstance(v, pl.Expr):
+            v = polars_expr_as_field_spec_constructor(v)
+        if not isinstance(v, PolarsExprFieldSpecConstructor) or v.expr.meta.is_column():
+            continue
+        spec = v(data)  # 校验输入列
+        assert isinstance(spec, TransformFieldSpec)
+        # 同一个表达式用在多个属性上时只计算一次
+        exprs.setdefault(spec.transformed_column_name, spec.transform_expr())
+        d[k] = column_field_spec_constructor(spec.transformed_column_name, label=v.label)
+
+    if len(exprs) > 0:
+        data = data.with_columns(*exprs.values())
+    return d, data
+
+
 def handle_spec_constructor(
     constructor: FieldSpecConstructorCls,
     data: pl.DataFrame,
@@ -288,12 +538,17 @@ def replace_field_props2(d: DictT, data: pl.DataFrame) -> ReplacedFieldProps[Dic
 def replace_field_props(
     d: dict[str, Any], data: pl.DataFrame
 ) -> tuple[dict[str, Any], pl.DataFrame]:
-    for k, v in d.items():
-        if isinstance(v, FieldSpecConstructorCls):
-            field_name, data = handle_spec_constructor(
-                constructor=v,
-                data=data,
-            )
-            d[k] = field_(field_name)
+    with profile_stage("replace_field_props") as stage:
+        rows_in = data.height
+        d, data = materialize_field_props(d, data)
+        for k, v in d.items():
+            if isinstance(v, FieldSpecConstructorCls):
+                field_name, data = handle_spec_constructor(
+                    constructor=v,
+                    data=data,
+                )
+                d[k] = field_(field_name)
+        if stage.enabled:
+            stage.update(rows_in=rows_in, rows_out=data.height, columns=data.width)
 
     return d, data
@@ -2,9 +2,17 @@
 # pyright: reportAttributeAccessIssue=warning
 from __future__ import annotations
 
+import contextlib
+import html
+import itertools
 import math
-from itertools import product
+from dataclasses import dataclass, field
 from typing import (
+    Any,
+    Callable,
+    ContextManager,
+    Iterable,
+    Literal,
     Sequence,
     TypedDict,
 )
@@ -13,16 +21,15 @@ import bokeh.models as bm
 import numpy as np
 from typing_extensions import NotRequired, Self, Unpack
 
-from mas.libs.phanpy.plotting.constants import (
-    PLOT_MARGIN,
-    RENDERER_TAG,
-)
+from mas.libs.phanpy.plotting.concurrency import raise_if_render_cancelled
+from mas.libs.phanpy.plotting.constants import PLOT_MARGIN
 from mas.libs.phanpy.plotting.display import PlotDisplay
 from mas.libs.phanpy.plotting.layer.renderable import (
     PlotRenderedComponents,
     RenderableTrait,
 )
 from mas.libs.phanpy.plotting.legends import merge_legends
+from mas.libs.phanpy.plotting.ranges import share_collected_range
 from mas.libs.phanpy.types.typeddict import keysafe_typeddict
 from mas.libs.phanpy.utils.traits import CopyTrait
 
@@ -67,6 +74,32 @@ class GridPlotLayoutSpec(TypedDict):
     shared_y_axis: NotRequired[bool]
 
     margin: NotRequired[int]
+    # 轻量布局：共享轴的标题使用 bm.Div，而不是带有隐藏 glyph 的 bm.Plot
+    lean: NotRequired[bool]
+
+
+@dataclass
+class _GridCell:
+    figure: bm.LayoutDOM
+    row: int
+    col: int
+    row_span: int = 1
+    col_span: int = 1
+
+
+@dataclass
+class _GridLayout:
+    """展开后的网格，嵌套的 GridPlot 中的子图也直接放在这个网格中"""
+
+    cells: list[_GridCell]
+    n_rows: int
+    n_cols: int
+    legends: list[bm.Legend] = field(default_factory=list)
+    tools: list[bm.Tool] = field(default_factory=list)
+    # 是否包含共享轴标题等辅助的图
+    decorated: bool = False
+    # 所有的子图 (包括嵌套网格中的)，不包括辅助的图
+    panels: list[bm.Plot] = field(default_factory=list)
 
 
 class GridPlot(
@@ -86,6 +119,10 @@ class GridPlot(
         self.__n_cols = n_cols
 
         self._layout = keysafe_typeddict(props, GridPlotLayoutSpec)
+        # 渲染子图时进入的 context (例如 facet 共享 source)
+        self._render_context: Callable[[], ContextManager[object]] = (
+            contextlib.nullcontext
+        )
 
     @property
     def children(self) -> list[RenderableTrait | None]:
@@ -130,82 +167,20 @@ class GridPlot(
         self_.__n_cols = n_cols
         return self_
 
-    def _render(self) -> PlotRenderedComponents:
-        children: list[
-            tuple[
-                bm.Plot,
-                int,  # row index
-                int,  # col index
-                int,  # row span
-                int,  # colspan
-            ]
-        ] = []
-        locator: dict[
-            tuple[
-                int,  # row index
-                int,  # col index
-            ],
-            bm.Plot,
-        ] = {}
-
-        redirecting_tools: list[bm.Tool] = []
-
-        ttl = self.n_cols * self.n_rows
-        els: list[RenderableTrait | None] = [*self.__children]
-        els.extend([None] * (ttl - len(els)))
-        cols_size = [0] * self.n_cols
-        rows_size = [0] * self.n_rows
-
-        reshaped = np.reshape(
-            np.asarray(els, dtype=object),
-            (self.n_rows, self.n_cols),
-        )
-        legends: list[bm.Legend] = []
-        for row_index, row in enumerate(reshaped):
-            el: RenderableTrait | None
-            for col_index, el in enumerate(row):
-                if el is not None:
-                    # legend_placement = el._props.get("legend", {}).get(
-                    #     "placement", "left"
-                    # )
-                    rendered = el._render()
-                    if rendered.legend is not None:
-                        legends.append(rendered.legend)
-                    figure = rendered.figure
-
-                    if isinstance(figure, bm.Plot):
-                        children.append((figure, row_index, col_index, 1, 1))
-                        locator[(row_index, col_index)] = figure
-                        figure.toolbar_location = None
-                        if figure.width:
-                            cols_size[col_index] = max(
-                                figure.width, cols_size[col_index]
-                            )
-                        if figure.height:
-                            rows_size[row_index] = max(
-                                figure.height, rows_size[row_index]
-                            )
-                        for tool in figure.tools:
-                            if isinstance(tool, bm.ToolProxy):
-                                redirecting_tools.extend([*tool.tools])  # type: ignore
-                            else:
-                                redirecting_tools.append(tool)
-                    else:
-                        raise NotImplementedError(
-                            "Nested gridplot is not implemented yet"
-                        )
+    def _as_grid(self) -> GridPlot:
+        return self
 
+    def _row_col_percent(self, n_els: int) -> tuple[list[float], list[float]]:
         cols = self._layout.get("cols", None)
         rows = self._layout.get("rows", None)
         height = self._layout.get("height", 600)
         width = self._layout.get("width", 600)
-        margin = self._layout.get("margin", PLOT_MARGIN)
         is_shared_x_axis = self._layout.get("shared_x_axis", False)
         is_shared_y_axis = self._layout.get("shared_y_axis", False)
         # fix height/width
         if rows is None:
             rows_percent = auto_rows(
-                len(children),
+                n_els,
                 self.n_rows,
                 self.n_cols,
                 height=height,
@@ -240,16 +215,74 @@ class GridPlot(
             cols_percent = cols
         else:
             raise ValueError("cols type error")
+        return rows_percent, cols_percent
 
-        for row_i, col_j in product(range(self.n_rows), range(self.n_cols)):
-            fig = locator.get((row_i, col_j), None)
-            if fig is None:
-                continue
-            # height = rows_size[row_i] or 300
-            fig.margin = margin
-            fig.height = int(height * rows_percent[row_i]) - 2 * margin
-            # width = cols_size[col_j] or 200
-            fig.width = int(width * cols_percent[col_j]) - 2 * margin
+    def _collect(self, width: int, height: int) -> _GridLayout:
+        """渲染所有子图并展开为网格中的单元格
+
+        嵌套的 GridPlot 递归展开，每一行/列按照子网格行/列数的最小公倍数细分，
+        这样整棵树只需要一个 `bm.GridPlot`
+        """
+        ttl = self.n_cols * self.n_rows
+        els: list[RenderableTrait | None] = [*self.__children]
+        els.extend([None] * (ttl - len(els)))
+        reshaped = np.reshape(
+            np.asarray(els, dtype=object),
+            (self.n_rows, self.n_cols),
+        )
+        rows_percent, cols_percent = self._row_col_percent(
+            len([el for el in els if el is not None])
+        )
+        margin = self._layout.get("margin", PLOT_MARGIN)
+        is_shared_x_axis = self._layout.get("shared_x_axis", False)
+        is_shared_y_axis = self._layout.get("shared_y_axis", False)
+        make_axis_title = (
+            _shared_axis_div if self._layout.get("lean", False) else _shared_axis_plot
+        )
+
+        blocks: dict[tuple[int, int], _GridLayout] = {}
+        # 直接的子图 (不包括嵌套网格中的子图)，用于整理共享轴
+        locator: dict[tuple[int, int], bm.Plot] = {}
+        legends: list[bm.Legend] = []
+        redirecting_tools: list[bm.Tool] = []
+        el: RenderableTrait | None
+        for row_index, row in enumerate(reshaped):
+            for col_index, el in enumerate(row):
+                if el is None:
+                    continue
+                raise_if_render_cancelled()
+                cell_width = int(width * cols_percent[col_index])
+                cell_height = int(height * rows_percent[row_index])
+                nested = el._as_grid()
+                if nested is not None:
+                    with nested._render_context():
+                        block = nested._collect(cell_width, cell_height)
+                    legends.extend(block.legends)
+                    redirecting_tools.extend(block.tools)
+                    blocks[(row_index, col_index)] = block
+                    continue
+
+                rendered = el._render()
+                if rendered.legend is not None:
+                    legends.append(rendered.legend)
+                figure = rendered.figure
+                if not isinstance(figure, bm.Plot):
+                    raise NotImplementedError(
+                        f"{type(figure).__name__} is not supported in gridplot"
+                    )
+                locator[(row_index, col_index)] = figure
+                figure.toolbar_location = None
+                figure.margin = margin
+                figure.height = cell_height - 2 * margin
+                figure.width = cell_width - 2 * margin
+                for tool in figure.tools:
+                    if isinstance(tool, bm.ToolProxy):
+                        redirecting_tools.extend([*tool.tools])  # type: ignore
+                    else:
+                        redirecting_tools.append(tool)
+                blocks[(row_index, col_index)] = _GridLayout(
+                    cells=[_GridCell(figure, 0, 0)], n_rows=1, n_cols=1, panels=[figure]
+                )
 
         # 整理共享轴
         # TODO: 现在 x/y 轴在 grid 中的显示是写死的
@@ -257,8 +290,12 @@ class GridPlot(
         share_: bm.Plot | None = None
         shared_x_axis: bm.Axis | None = None
         shared_y_axis: bm.Axis | None = None
-        if len(children) > 0:
-            share_ = children[0][0]
+        panels = [f for block in blocks.values() for f in block.panels]
+        direct = set(locator.values())
+        # 嵌套网格中的子图只共享 range/scale，坐标轴的显示由嵌套网格自己决定
+        nested_panels = [f for f in panels if f not in direct]
+        if len(locator) > 0:
+            share_ = next(iter(locator.values()))
             share_below = [*share_.below]  # type: ignore
             if len(share_below) == 1:
                 shared_x_axis = share_below[0].clone()
@@ -266,6 +303,10 @@ class GridPlot(
             if len(share_left) == 1:
                 shared_y_axis = share_left[0].clone()
             if is_shared_x_axis:
+                # 所有子图数据范围的并集，而不是第一个子图的范围
+                shared_x_range = share_collected_range(panels, "x")
+                if shared_x_range is not None:
+                    share_.x_range = shared_x_range
                 for col_index in range(self.n_cols):
                     # 最后一行非空的元素是 anchor
                     is_anchor: bool = True
@@ -292,14 +333,10 @@ class GridPlot(
                                         r.major_tick_line_color = None
                                         r.major_label_text_font_size = "0px"
 
-                                # fig.below = [
-                                #     *filter(
-                                #         lambda r: not isinstance(r, bm.Axis),
-                                #         fig.below,  # type: ignore
-                                #     )
-                                # ]
-
             if is_shared_y_axis:
+                shared_y_range = share_collected_range(panels, "y")
+                if shared_y_range is not None:
+                    share_.y_range = shared_y_range
                 for row_index in range(self.n_rows):
                     # 第一列非空的元素是 anchor
                     is_anchor: bool = True
@@ -325,128 +362,149 @@ class GridPlot(
                                         r.minor_tick_line_color = None
                                         r.major_tick_line_color = None
                                         r.major_label_text_font_size = "0px"
-                                # fig.left = [
-                                #     *filter(
-                                #         lambda r: not isinstance(r, bm.Axis),
-                                #         fig.left,  # type: ignore
-                                #     )
-                                # ]
-        # TODO: 设置 width 和 height rows cols 为比例时，无法通过 margin 设置子图间距
-        inner_grid = grid = bm.GridPlot(
-            children=children,
-            toolbar=bm.Toolbar(logo=None, tools=[bm.CopyTool()]),
-            styles={"background_color": "#ffffff"},
-            width=width + 30,
-            height=height,
-        )
 
+        if len(nested_panels) > 0:
+            anchor = share_ or nested_panels[0]
+            for dim, shared in (("x", is_shared_x_axis), ("y", is_shared_y_axis)):
+                if not shared:
+                    continue
+                if share_ is None:
+                    range_ = share_collected_range(panels, dim)
+                    if range_ is not None:
+                        setattr(anchor, f"{dim}_range", range_)
+                for fig in nested_panels:
+                    setattr(fig, f"{dim}_range", getattr(anchor, f"{dim}_range"))
+                    setattr(fig, f"{dim}_scale", getattr(anchor, f"{dim}_scale"))
+
+        if self._layout.get("lean", False):
+            _share_axis_models(locator.values())
+
+        # 每一行/列细分为其中子网格行/列数的最小公倍数
+        row_units = [
+            math.lcm(
+                *[blocks[(i, j)].n_rows for j in range(self.n_cols) if (i, j) in blocks]
+            )
+            for i in range(self.n_rows)
+        ]
+        col_units = [
+            math.lcm(
+                *[blocks[(i, j)].n_cols for i in range(self.n_rows) if (i, j) in blocks]
+            )
+            for j in range(self.n_cols)
+        ]
+        row_offsets = [0, *itertools.accumulate(row_units)]
+        col_offsets = [0, *itertools.accumulate(col_units)]
+        n_rows, n_cols = row_offsets[-1], col_offsets[-1]
+        # 共享的 y 轴标题占用最左侧一列
+        col_start = 1 if is_shared_y_axis and shared_y_axis is not None else 0
+
+        cells: list[_GridCell] = []
+        for (i, j), block in blocks.items():
+            row_scale = row_units[i] // block.n_rows
+            col_scale = col_units[j] // block.n_cols
+            for cell in block.cells:
+                cells.append(
+                    _GridCell(
+                        cell.figure,
+                        row_offsets[i] + cell.row * row_scale,
+                        col_start + col_offsets[j] + cell.col * col_scale,
+                        cell.row_span * row_scale,
+                        cell.col_span * col_scale,
+                    )
+                )
+
+        decorated = any(block.decorated for block in blocks.values())
         if share_:
-            axis_grid_children: list[tuple[bm.Plot, int, int]] = []
             # 补充 x/y 轴的内容
+            if col_start > 0:
+                assert shared_y_axis is not None
+                cells.append(
+                    _GridCell(
+                        make_axis_title(shared_y_axis, "left", height),
+                        0,
+                        0,
+                        n_rows,
+                        1,
+                    )
+                )
+                n_cols += 1
+                decorated = True
             if is_shared_x_axis and shared_x_axis is not None:
-                x_axis_plot = bm.Plot(
-                    background_fill_color="#ffffff",
-                    outline_line_width=0,
-                    outline_line_color="#ffffff",
-                    min_border=0,
-                    margin=0,
-                    height_policy="min",
-                    width=grid.width,
-                    toolbar_location=None,
-                    toolbar=bm.Toolbar(logo=None, tools=[bm.CopyTool()]),
+                cells.append(
+                    _GridCell(
+                        make_axis_title(shared_x_axis, "below", width + 30),
+                        n_rows,
+                        col_start,
+                        1,
+                        n_cols - col_start,
+                    )
                 )
+                n_rows += 1
+                decorated = True
+
+        return _GridLayout(
+            cells=cells,
+            n_rows=max(n_rows, 1),
+            n_cols=max(n_cols, 1),
+            legends=legends,
+            tools=redirecting_tools,
+            decorated=decorated,
+            panels=panels,
+        )
 
-                x_axis_label_styles = {}
-                for k, v in shared_x_axis.properties_with_values().items():
-                    if isinstance(k, str) and k.startswith("axis_label"):
-                        x_axis_label_styles[k] = v
-                x_axis_plot.add_layout(
-                    type(shared_x_axis)(
-                        major_tick_line_color=None,
-                        minor_tick_line_color=None,
-                        axis_line_color=None,
-                        axis_label_standoff=0,
-                        major_label_text_font_size="0pt",
-                    ).clone(**x_axis_label_styles),
-                    "below",
-                )
-                dummy = x_axis_plot.add_glyph(
-                    bm.ColumnDataSource(dict(_x=[0], _y=[0])), bm.Line(x="_x", y="_y")
-                )
-                dummy.visible = False
-                axis_grid_children.append((x_axis_plot, 1, 1))
-            if is_shared_y_axis and shared_y_axis is not None:
-                y_axis_plot = bm.Plot(
+    def _render(self) -> PlotRenderedComponents:
+        height = self._layout.get("height", 600)
+        width = self._layout.get("width", 600)
+        with self._render_context():
+            layout = self._collect(width, height)
+        children = [
+            (cell.figure, cell.row, cell.col, cell.row_span, cell.col_span)
+            for cell in layout.cells
+        ]
+
+        legend_model: bm.Legend | None = None
+        if len(layout.legends) > 0:
+            legend_model = layout.legends[0].clone(items=[])
+            legend_model = merge_legends(legend_model, *layout.legends)
+            if len(legend_model.items) > 0:  # type: ignore
+                # 只需要图例中引用的 renderer (用于绘制图例的样式)，不遍历整个模型图
+                legend_display_plot = bm.Plot(
+                    renderers=[
+                        *dict.fromkeys(
+                            r
+                            for item in legend_model.items  # type: ignore
+                            for r in item.renderers
+                        )
+                    ],
                     background_fill_color="#ffffff",
                     outline_line_width=0,
                     outline_line_color="#ffffff",
+                    toolbar_location=None,
                     min_border=0,
-                    min_width=None,
-                    margin=0,
                     width_policy="min",
-                    height=grid.height,
-                    toolbar_location=None,
-                    toolbar=bm.Toolbar(logo=None, tools=[bm.CopyTool()]),
                 )
-
-                y_axis_label_styles = {}
-                for k, v in shared_y_axis.properties_with_values().items():
-                    if isinstance(k, str) and k.startswith("axis_label"):
-                        y_axis_label_styles[k] = v
-                y_axis_plot.add_layout(
-                    type(shared_y_axis)(
-                        major_tick_line_color=None,
-                        minor_tick_line_color=None,
-                        axis_line_color=None,
-                        axis_label_standoff=0,
-                        major_label_text_font_size="0pt",
-                    ).clone(**y_axis_label_styles),
-                    "left",
-                )
-                dummy = y_axis_plot.add_glyph(
-                    bm.ColumnDataSource(dict(_x=[0], _y=[0])), bm.Line(x="_x", y="_y")
-                )
-                dummy.visible = False
-                axis_grid_children.append((y_axis_plot, 0, 0))
-
-            if len(axis_grid_children) > 0:
-                grid.toolbar_location = None
-                grid = bm.GridPlot(
-                    children=[
-                        *axis_grid_children,
-                        (grid, 0, 1),
-                    ],
-                    toolbar=bm.Toolbar(logo=None, tools=[bm.CopyTool()]),
-                    spacing=0,
-                    styles={"background_color": "#ffffff"},
-                )
-
-        if len(legends) > 0:
-            legend_display_plot = bm.Plot(
-                renderers=[*inner_grid.select({"tags": RENDERER_TAG})],
-                background_fill_color="#ffffff",
-                outline_line_width=0,
-                outline_line_color="#ffffff",
-                toolbar_location=None,
-                min_border=0,
-                width_policy="min",
-            )
-
-            legend_model = legends[0].clone(items=[])
-            legend_model = merge_legends(legend_model, *legends)
-            if len(legend_model.items) > 0:  # type: ignore
                 legend_display_plot.add_layout(legend_model, "left")
-                grid.toolbar_location = None
-                grid = bm.GridPlot(
-                    children=[(grid, 0, 0), (legend_display_plot, 0, 1)],
-                    spacing=0,
-                    styles={"background_color": "#ffffff"},
-                    toolbar=bm.Toolbar(logo=None, tools=[bm.CopyTool()]),
+                children.append(
+                    (legend_display_plot, 0, layout.n_cols, layout.n_rows, 1)
                 )
+                layout.decorated = True
+
+        # 整棵树只生成一个 bm.GridPlot，嵌套的 bm.GridPlot 在 BokehJS 中布局非常慢
+        # TODO: 设置 width 和 height rows cols 为比例时，无法通过 margin 设置子图间距
+        grid = bm.GridPlot(
+            children=children,
+            toolbar=bm.Toolbar(logo=None, tools=[bm.CopyTool()]),
+            styles={"background_color": "#ffffff"},
+        )
+        if layout.decorated:
+            # 有轴标题或图例时由子图决定大小
+            grid.spacing = 0
         else:
-            legend_model = None
+            grid.width = width + 30
+            grid.height = height
+
         merged_tools: dict[type[bm.Tool], bm.ToolProxy] = {}
-        for tool in redirecting_tools:
+        for tool in layout.tools:
             if type(tool) in merged_tools.keys():
                 merged_tools[type(tool)].tools.append(tool)
             else:
@@ -458,3 +516,105 @@ class GridPlot(
         grid.toolbar_location = "left"
         grid.toolbar.active_drag = merged_tools.get(bm.BoxZoomTool, None)
         return PlotRenderedComponents(figure=grid, legend=legend_model)
+
+
+def _shared_axis_plot(
+    axis: bm.Axis, placement: Literal["below", "left"], size: int
+) -> bm.Plot:
+    """只显示共享轴标题的图"""
+    if placement == "below":
+        plot = bm.Plot(
+            background_fill_color="#ffffff",
+            outline_line_width=0,
+            outline_line_color="#ffffff",
+            min_border=0,
+            margin=0,
+            height_policy="min",
+            width=size,
+            toolbar_location=None,
+            toolbar=bm.Toolbar(logo=None, tools=[bm.CopyTool()]),
+        )
+    else:
+        plot = bm.Plot(
+            background_fill_color="#ffffff",
+            outline_line_width=0,
+            outline_line_color="#ffffff",
+            min_border=0,
+            min_width=None,
+            margin=0,
+            width_policy="min",
+            height=size,
+            toolbar_location=None,
+            toolbar=bm.Toolbar(logo=None, tools=[bm.CopyTool()]),
+        )
+
+    axis_label_styles = {}
+    for k, v in axis.properties_with_values().items():
+        if isinstance(k, str) and k.startswith("axis_label"):
+            axis_label_styles[k] = v
+    plot.add_layout(
+        type(axis)(
+            major_tick_line_color=None,
+            minor_tick_line_color=None,
+            axis_line_color=None,
+            axis_label_standoff=0,
+            major_label_text_font_size="0pt",
+        ).clone(**axis_label_styles),
+        placement,
+    )
+    dummy = plot.add_glyph(
+        bm.ColumnDataSource(dict(_x=[0], _y=[0])), bm.Line(x="_x", y="_y")
+    )
+    dummy.visible = False
+    return plot
+
+
+def _shared_axis_div(
+    axis: bm.Axis, placement: Literal["below", "left"], size: int
+) -> bm.Div:
+    """只显示共享轴标题的 bm.Div，比 `_shared_axis_plot` 少了 plot/axis/glyph 等模型"""
+    label = axis.axis_label
+    styles = {
+        "color": axis.axis_label_text_color or "#444444",
+        "font-family": axis.axis_label_text_font,
+        "font-size": axis.axis_label_text_font_size,
+        "font-style": axis.axis_label_text_font_style,
+        "text-align": "center",
+        "white-space": "nowrap",
+    }
+    if placement == "left":
+        styles.update({"writing-mode": "vertical-rl", "transform": "rotate(180deg)"})
+        return bm.Div(
+            text=html.escape(label) if isinstance(label, str) else "",
+            styles=styles,
+            margin=0,
+            height=size,
+            align="center",
+        )
+    return bm.Div(
+        text=html.escape(label) if isinstance(label, str) else "",
+        styles=styles,
+        margin=0,
+        width=size,
+        align="center",
+    )
+
+
+def _share_axis_models(figures: Iterable[bm.Plot]) -> None:
+    """属性相同的 ticker/formatter/label policy 在子图之间复用，减少模型数量"""
+    shared: dict[tuple[str, type], list[tuple[bm.Model, dict[str, Any]]]] = {}
+    for fig in figures:
+        for side in ("below", "left", "above", "right"):
+            for axis in getattr(fig, side):
+                if not isinstance(axis, bm.Axis):
+                    continue
+                for attr in ("ticker", "formatter", "major_label_policy"):
+                    model = getattr(axis, attr)
+                    props = model.properties_with_values(include_defaults=False)
+                    candidates = shared.setdefault((attr, type(model)), [])
+                    for candidate, candidate_props in candidates:
+                        if candidate_props == props:
+                            setattr(axis, attr, candidate)
+                            break
+                    else:
+                        candidates.append((model, props))
@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import contextvars
+import math
+import threading
+from concurrent.futures import Executor, Future
+from typing import TYPE_CHECKING, Any, Hashable, Iterator
+
+import bokeh.models as bm
+import polars as pl
+
+from mas.libs.phanpy.plotting.concurrency import _default_executor, run_render
+from mas.libs.phanpy.plotting.constants import RENDERER_TAG
+from mas.libs.phanpy.plotting.profile import profile_stage
+from mas.libs.phanpy.plotting.ranges import (
+    RangeDimension,
+    collect_ranges,
+    copy_auto_range,
+    is_auto_range,
+    share_collected_range,
+)
+
+if TYPE_CHECKING:
+    from mas.libs.phanpy.plotting.layer.grid import GridPlot
+    from mas.libs.phanpy.plotting.layer.plot import Plot
+
+__all__ = ["FacetPages"]
+
+
+class FacetPages:
+    """facet_wrap 的分页渲染，每次只生成一页的子图
+
+    - 所有页共用从完整数据计算的 x/y 范围 (共享轴时)，颜色等映射本来就是在
+      完整数据上计算的，所以各页之间保持一致
+    - 渲染第 k 页后在后台预先渲染第 k + 1 页
+    """
+
+    def __init__(
+        self,
+        plot: Plot,
+        page_size: int,
+        prefetch: bool = True,
+        executor: Executor | None = None,
+    ) -> None:
+        if page_size < 1:
+            raise ValueError("page_size must be positive")
+        facet = plot._facet
+        assert facet is not None and facet["style"] == "wrap"
+        self._plot = plot
+        self._facet = facet
+        self._page_size = page_size
+        self._prefetch = prefetch
+        self._executor = executor
+        self._combinations = plot._facet_combinations(facet)
+        self._pages: dict[int, Future[bm.LayoutDOM]] = {}
+        self._lock = threading.Lock()
+        # 所有子图的共享范围，只计算一次，见 `_shared_ranges`
+        self._ranges: dict[RangeDimension, bm.Range1d | None] | None = None
+        self._ranges_lock = threading.Lock()
+
+    @property
+    def page_size(self) -> int:
+        return self._page_size
+
+    @property
+    def n_pages(self) -> int:
+        return max(math.ceil(self._combinations.height / self._page_size), 1)
+
+    def __len__(self) -> int:
+        return self.n_pages
+
+    def __iter__(self) -> Iterator[bm.LayoutDOM]:
+        for k in range(self.n_pages):
+            yield self.render(k)
+
+    def combinations(self, k: int) -> pl.DataFrame:
+        """第 k 页中的 facet 组合"""
+        self._check_page(k)
+        return self._combinations.slice(k * self._page_size, self._page_size)
+
+    def page(self, k: int) -> GridPlot:
+        """第 k 页对应的 `GridPlot` (还未渲染)"""
+        return self._plot._facet_wrap(self._facet, self.combinations(k))
+
+    def render(self, k: int) -> bm.LayoutDOM:
+        """渲染第 k 页，结果会被缓存"""
+        self._check_page(k)
+        with self._lock:
+            future = self._pages.get(k, None)
+            if future is None:
+                future = Future()
+                self._pages[k] = future
+                owner = True
+            else:
+                owner = False
+        if owner:
+            try:
+                future.set_result(self._render_page(k))
+            except BaseException as e:
+                with self._lock:
+                    self._pages.pop(k, None)
+                future.set_exception(e)
+        model = future.result()
+        if self._prefetch:
+            self.prefetch(k + 1)
+        return model
+
+    def prefetch(self, k: int) -> None:
+        """在后台渲染第 k 页"""
+        if k < 0 or k >= self.n_pages:
+            return
+        with self._lock:
+            if k in self._pages:
+                return
+            future: Future[bm.LayoutDOM] = Future()
+            self._pages[k] = future
+
+        def _run() -> None:
+            try:
+                future.set_result(self._render_page(k))
+            except BaseException as e:
+                with self._lock:
+                    self._pages.pop(k, None)
+                future.set_exception(e)
+
+        ctx = contextvars.copy_context()
+        (self._executor or _default_executor()).submit(ctx.run, _run)
+
+    def json_item(self, k: int) -> dict[str, Any]:
+        """第 k 页的 `bokeh.embed.json_item`，供前端按需请求"""
+        from bokeh.embed import json_item
+
+        model = self.render(k)
+        with profile_stage("serialize", name=f"page {k}"):
+            return dict(json_item(model))
+
+    async def ajson_item(
+        self,
+        k: int,
+        *,
+        key: Hashable | None = None,
+        executor: Executor | None = None,
+    ) -> dict[str, Any]:
+        """`json_item` 的异步版本"""
+        return await run_render(lambda: self.json_item(k), key=key, executor=executor)
+
+    def _check_page(self, k: int) -> None:
+        if k < 0 or k >= self.n_pages:
+            raise IndexError(f"page {k} out of range [0, {self.n_pages})")
+
+    def _render_page(self, k: int) -> bm.LayoutDOM:
+        with profile_stage("page", name=str(k)):
+            model = self.page(k).render()
+            self._share_ranges(model)
+        return model
+
+    def _shared_ranges(self) -> dict[RangeDimension, bm.Range1d | None]:
+        """所有子图 (不只是当前页) 的共享范围
+
+        和不分页时一样由子图中实际绘制的数据 (而不是原始数据) 计算，
+        所以需要绘制一次所有的子图，结果在各页之间复用
+        """
+        with self._ranges_lock:
+            if self._ranges is None:
+                with profile_stage("page_ranges"), collect_ranges():
+                    figures = [
+                        self._plot._as_renderable(filter=combination, with_legend=False)
+                        ._render()
+                        .figure
+                        for combination in self._combinations.iter_rows(named=True)
+                    ]
+                    self._ranges = {
+                        dim: share_collected_range(figures, dim) for dim in ("x", "y")
+                    }
+            return self._ranges
+
+    def _share_ranges(self, model: bm.LayoutDOM) -> None:
+        """共享轴时，用所有子图的范围替换当前页中自动计算的范围"""
+        # 只考虑子图，不包括共享轴标题和图例等辅助的图
+        figures = [
+            child[0]
+            for child in getattr(model, "children", [])
+            if isinstance(child[0], bm.Plot)
+            and any(
+                RENDERER_TAG in r.tags and isinstance(r, bm.GlyphRenderer)
+                for r in child[0].renderers
+            )
+        ]
+        dims: list[RangeDimension] = [
+            dim
+            for dim, shared in (
+                ("x", self._facet.get("shared_x_axis", False)),
+                ("y", self._facet.get("shared_y_axis", False)),
+            )
+            if shared
+            and any(is_auto_range(getattr(f, f"{dim}_range")) for f in figures)
+        ]
+        if len(dims) == 0:
+            return
+        ranges = self._shared_ranges()
+        for dim in dims:
+            range_ = ranges[dim]
+            if range_ is None:
+                continue
+            # 同一页中的子图共用一个 range
+            range_ = copy_auto_range(range_)
+            for figure in figures:
+                if is_auto_range(getattr(figure, f"{dim}_range")):
+                    setattr(figure, f"{dim}_range", range_)
@@ -17,12 +17,20 @@ from mas.libs.phanpy.plotting.constants import (
     GlyphTooltipsTag,
 )
 from mas.libs.phanpy.plotting.display import PlotDisplay
-from mas.libs.phanpy.plotting.facet import FacetFilter, facet_filter_as_str
+from mas.libs.phanpy.plotting.facet import (
+    FacetFilter,
+    facet_draw_scope,
+    facet_filter_as_str,
+    shared_facet_sources,
+)
 from mas.libs.phanpy.plotting.layer.grid import GridPlot, GridPlotLayoutSpec
+from mas.libs.phanpy.plotting.layer.pages import FacetPages
 from mas.libs.phanpy.plotting.layer.renderable import (
     PlotRenderedComponents,
     RenderableTrait,
 )
+from mas.libs.phanpy.plotting.profile import profile_stage
+from mas.libs.phanpy.plotting.ranges import apply_collected_ranges
 from mas.libs.phanpy.plotting.spec import (
     AxSpec,
     CategoricalAxSpec,
@@ -156,7 +164,7 @@ class PlotDrawer(RenderableTrait):
             fig.add_layout(mirror_x_axis, "above")
 
         fig.x_scale = make_scale(x_ax_spec)
-        fig.x_range = make_range(x_ax_spec)
+        fig.x_range = make_range(x_ax_spec, data=self._data)
         if x_grid is not None:
             # 更新 grid 的轴
             x_grid.axis = x_axis
@@ -168,7 +176,7 @@ class PlotDrawer(RenderableTrait):
             fig.add_layout(mirror_y_axis, "right")
 
         fig.y_scale = make_scale(y_ax_spec)
-        fig.y_range = make_range(y_ax_spec)
+        fig.y_range = make_range(y_ax_spec, data=self._data)
         if y_grid is not None:
             y_grid.axis = y_axis
         # endregion
@@ -218,12 +226,25 @@ class PlotDrawer(RenderableTrait):
 
         # region REAL RENDER
         # =====================================================
-        self._on_draw(
-            figure=fig,
-            legend=legend_renderer,
-            data=self._data,
-            facet_filter=self._facet_filter,
-        )
+        with profile_stage(
+            "panel",
+            name=facet_filter_as_str(self._facet_filter, named=True) or None,
+        ) as stage, facet_draw_scope(self._facet_filter):
+            self._on_draw(
+                figure=fig,
+                legend=legend_renderer,
+                data=self._data,
+                facet_filter=self._facet_filter,
+            )
+            apply_collected_ranges(fig)
+            for range_ in (fig.x_range, fig.y_range):
+                if isinstance(range_, bm.FactorRange) and len(range_.factors) == 0:
+                    raise ValueError(
+                        "You must provide factors if no data is provided with "
+                        "categorical axis"
+                    )
+            if stage.enabled:
+                stage.update(rows_in=self._data.height if self._data is not None else 0)
         # =====================================================
         # endregion
 
@@ -288,6 +309,10 @@ class Plot(
         self._facet = facet
         self._props = keysafe_typeddict(props, PlotSpec)
 
+    def __deepcopy_memo__(self) -> list[int]:
+        # DataFrame 不会被原地修改，复制时共享，各个子图使用同一个对象 (见 `infer_factors`)
+        return [id(self._data)]
+
     def _as_renderable(
         self,
         filter: FacetFilter | None = None,
@@ -314,54 +339,65 @@ class Plot(
             props=_props,
         )
 
-    def _render_facet(self, facet: FacetSpec) -> PlotRenderedComponents:
+    def _as_facet_grid(self, facet: FacetSpec) -> GridPlot:
         if facet["style"] == "wrap":
-            return self._render_facet_wrap(facet)
+            return self._facet_wrap(facet)
         elif facet["style"] == "grid":
-            return self._render_facet_grid(facet)
+            return self._facet_grid(facet)
         else:
             raise ValueError(f"Unknown facet type: {facet}")
 
-    def _render_facet_wrap(
-        self,
-        facet: FacetWrapSpec,
-    ) -> PlotRenderedComponents:
+    def _facet_combinations(self, facet: FacetWrapSpec) -> pl.DataFrame:
         if self._data is None:
             raise ValueError("facet_wrap cannot be done without providing data source")
-        df = self._data
+        return self._data.select(facet["by"]).unique().sort(facet["by"])
+
+    def _facet_wrap(
+        self,
+        facet: FacetWrapSpec,
+        combinations: pl.DataFrame | None = None,
+    ) -> GridPlot:
+        """`combinations` 为 None 时包含所有的组合，否则只画其中的子图 (分页)"""
+        if combinations is None:
+            combinations = self._facet_combinations(facet)
         children: list[RenderableTrait] = []
-        by = facet["by"]
         n_cols = facet["n_cols"]
         props = keysafe_typeddict(facet, GridPlotLayoutSpec)
 
-        combs = df.select(by).unique().sort(by)
-
-        for combination in combs.iter_rows(named=True):
+        for combination in combinations.iter_rows(named=True):
             rendered = self._as_renderable(
                 filter=combination,
                 with_legend=False,
             )
             children.append(rendered)
 
-        return GridPlot(
+        grid = GridPlot(
             children=[*children],
             n_cols=n_cols or min(len(children), 3),
             **props,
-        )._render()
+        )
+        if facet.get("shared_data", False):
+            grid._render_context = shared_facet_sources
+        return grid
 
-    def _render_facet_grid(
+    def _facet_grid(
         self,
         facet: FacetGridSpec,
-    ) -> PlotRenderedComponents:
+    ) -> GridPlot:
         raise NotImplementedError()
 
+    def _as_grid(self) -> GridPlot | None:
+        if self._facet is None:
+            return None
+        return self._as_facet_grid(self._facet)
+
     def _render(self) -> PlotRenderedComponents:
         facet = self._facet
 
         if facet is None:
             return self._as_renderable()._render()
         else:
-            return self._render_facet(facet)
+            return self._as_facet_grid(facet)._render()
 
     def with_data(
         self, data: pl.DataFrame | FrameInitTypes | bm.ColumnDataSource
@@ -464,6 +500,7 @@ class Plot(
         self,
         by: IntoExpr | Iterable[IntoExpr],
         n_cols: int | None = None,
+        shared_data: bool = False,
         **props: Unpack[GridPlotLayoutSpec],
     ) -> Self:
         self_ = self.copy()
@@ -471,10 +508,17 @@ class Plot(
             style="wrap",
             by=by,
             n_cols=n_cols,
+            shared_data=shared_data,
             **props,
         )
         return self_
 
+    def paginate(self, page_size: int, prefetch: bool = True) -> FacetPages:
+        """按页渲染 facet_wrap 的子图，每页 `page_size` 个，见 `FacetPages`"""
+        if self._facet is None or self._facet["style"] != "wrap":
+            raise ValueError("paginate requires with_facet_wrap")
+        return FacetPages(self.copy(), page_size=page_size, prefetch=prefetch)
+
     def with_facet_grid(
         self,
         colname: str | pl.Expr,
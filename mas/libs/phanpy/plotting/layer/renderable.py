@@ -1,10 +1,20 @@
 from __future__ import annotations
 
 import abc
+from concurrent.futures import Executor
 from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Hashable
 
 import bokeh.models as bm
 
+from mas.libs.phanpy.plotting.budget import render_budget
+from mas.libs.phanpy.plotting.concurrency import run_render
+from mas.libs.phanpy.plotting.profile import profile_stage
+from mas.libs.phanpy.plotting.ranges import collect_ranges
+
+if TYPE_CHECKING:
+    from mas.libs.phanpy.plotting.layer.grid import GridPlot
+
 
 @dataclass
 class PlotRenderedComponents:
@@ -17,5 +27,42 @@ class RenderableTrait(abc.ABC):
     def _render(self) -> PlotRenderedComponents:
         pass
 
+    def _as_grid(self) -> GridPlot | None:
+        """渲染结果为网格时返回对应的 GridPlot，嵌套时展开到外层的网格中"""
+        return None
+
     def render(self) -> bm.LayoutDOM:
-        return self._render().figure
+        with (
+            render_budget(),
+            collect_ranges(),
+            profile_stage("render", name=type(self).__name__),
+        ):
+            return self._render().figure
+
+    async def arender(
+        self,
+        *,
+        key: Hashable | None = None,
+        executor: Executor | None = None,
+    ) -> bm.LayoutDOM:
+        """`render` 的异步版本，数据处理和模型构建在 executor 中执行
+
+        同一个 `key` 上发起新的请求时，旧的请求会被取消
+        """
+        return await run_render(self.render, key=key, executor=executor)
+
+    async def arender_json(
+        self,
+        *,
+        key: Hashable | None = None,
+        executor: Executor | None = None,
+    ) -> dict[str, Any]:
+        """异步渲染并序列化为 `bokeh.embed.json_item` 的结果"""
+        from bokeh.embed import json_item
+
+        def _render_json() -> dict[str, Any]:
+            model = self.render()
+            with profile_stage("serialize"):
+                return dict(json_item(model))
+
+        return await run_render(_render_json, key=key, executor=executor)
@@ -16,7 +16,50 @@ import typing
 
 from pydantic import BaseModel, Field
 
-__all__ = ["PlottingOptions", "plotting_options"]
+__all__ = [
+    "RenderBudget",
+    "StaticPayloadOptions",
+    "PlottingOptions",
+    "plotting_options",
+]
+
+
+class RenderBudget(BaseModel):
+    """单次渲染生成的文档大小限制，None 表示不限制
+
+    超出限制时的处理方式 (policy):
+    - raise: 抛出 `RenderBudgetExceededError`
+    - warn: 只记录日志
+    - downsample: 等间隔抽取数据
+    - rasterize: 散点栅格化为图片，其他 glyph 回退到 downsample
+    - sample: 随机抽样
+    """
+
+    max_points_per_renderer: typing.Optional[int] = Field(default=None, ge=1)
+    max_total_cds_bytes: typing.Optional[int] = Field(default=None, ge=1)
+    max_renderers_per_figure: typing.Optional[int] = Field(default=None, ge=1)
+    policy: typing.Literal["raise", "warn", "downsample", "rasterize", "sample"] = (
+        Field(default="warn")
+    )
+
+
+class StaticPayloadOptions(BaseModel):
+    """notebook static 模式下发送给前端的数据格式
+
+    - json (默认): `bokeh.embed.json_item`，MIME 为 application/vnd.bokehjs.mas.v1+json
+    - compact: 二进制 buffer + 压缩，MIME 为 application/vnd.bokehjs.mas.v2+json，
+      格式见 `mas.libs.phanpy.plotting.payload`
+    - arrow: 在 compact 的基础上，source 的列以 Arrow IPC 发送，
+      MIME 为 application/vnd.bokehjs.mas.v3+json
+
+    compact/arrow 需要前端注册了对应 MIME 类型的渲染器，需要时再启用
+    """
+
+    encoding: typing.Literal["json", "compact", "arrow"] = Field(default="json")
+    # zstd 需要安装 zstandard，否则回退到 gzip
+    compression: typing.Literal["gzip", "zstd", "none"] = Field(default="gzip")
+    # compact/arrow: 内容相同的 ColumnDataSource 数据和 buffer 只发送一次
+    dedup: bool = Field(default=True)
 
 
 @typing.final
@@ -24,6 +67,15 @@ class PlottingOptions(BaseModel):
     """Options for modeling and simulation"""
 
     static_in_nb: bool = Field(default=False)
+    static_payload: StaticPayloadOptions = Field(
+        default_factory=StaticPayloadOptions
+    )
+
+    # 异步渲染 (arender) 同时允许执行的渲染数量
+    max_concurrent_renders: int = Field(default=4, ge=1)
+
+    # 文档大小限制，防止生成过大的页面
+    budget: RenderBudget = Field(default_factory=RenderBudget)
 
 
 plotting_options: typing.Final[PlottingOptions] = PlottingOptions()
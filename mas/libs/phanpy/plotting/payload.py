@@ -0,0 +1,464 @@
+"""notebook static 模式下发送给前端的 MIME 数据
+
+- json: 原始的 `bokeh.embed.json_item`，数组以 base64 内嵌在 JSON 中
+- compact: 模型 JSON 和二进制 buffer 打包为一个 blob，压缩后整体 base64 编码
+
+compact blob 的格式 (小端)::
+
+    b"MASP" | u8 版本 | u32 header 长度 | header (UTF-8 JSON) | 补齐到 8 字节 | buffers
+
+header 为 ``{"item": json_item, "buffers": [[id, offset, length], ...]}``，
+item 中的 ``{"type": "bytes", "data": {"id": ...}}`` 引用 buffers 中的数据，
+offset 相对于 buffers 的起始位置。前端解压后可以直接用 ``ArrayBuffer.slice``
+得到每个 buffer，交给 BokehJS 的 Deserializer
+
+dedup 时数据完全相同的 ColumnDataSource 只有第一个带有 ``data``，其余的
+``data`` 为空，header 中的 ``"aliases": {source id: 第一个 source 的 id}``
+指明应当从哪个 source 复制数据 (各个 source 仍然是独立的模型，选择不会联动)
+
+- arrow: 在 compact 的基础上，ColumnDataSource 的列以 Arrow IPC stream
+  (每个 source 一个 record batch) 的形式放在 buffers 中，header 中的
+  ``"arrow": {source id: buffer id}`` 指明对应关系。item 中 source 的 ``data``
+  只保留无法转换的列 (日期时间等由 bokeh 处理的列)，前端用 Arrow 表中的列补全
+"""
+
+from __future__ import annotations
+
+import base64
+import gzip
+import hashlib
+import json
+import logging as logger
+import struct
+from typing import Any, Literal
+
+import bokeh.models as bm
+import numpy as np
+import polars as pl
+from bokeh import __version__ as bokeh_version
+from bokeh.core.has_props import is_DataModel
+from bokeh.core.serialization import Buffer, BytesRep, ObjectRefRep, Serializer
+from bokeh.document.json import DocJson
+from bokeh.embed.util import OutputDocumentFor
+from bokeh.model import Model
+from bokeh.settings import settings
+from bokeh.util.serialization import make_id, transform_array
+
+from mas.libs.phanpy.plotting.options import StaticPayloadOptions
+
+__all__ = [
+    "MIME_TYPE_JSON",
+    "MIME_TYPE_COMPACT",
+    "MIME_TYPE_ARROW",
+    "PayloadCompression",
+    "encode_compact_payload",
+    "encode_arrow_payload",
+    "decode_compact_payload",
+    "static_mime_bundle",
+]
+
+MIME_TYPE_JSON = "application/vnd.bokehjs.mas.v1+json"
+MIME_TYPE_COMPACT = "application/vnd.bokehjs.mas.v2+json"
+MIME_TYPE_ARROW = "application/vnd.bokehjs.mas.v3+json"
+
+PayloadCompression = Literal["gzip", "zstd", "none"]
+
+_MAGIC = b"MASP"
+_VERSION = 1
+_ALIGN = 8
+
+
+class _BufferSerializer(Serializer):
+    """buffer 不内嵌为 base64 (deferred)，内容相同的 buffer 和 source 的数据只保留一份
+
+    只影响序列化的结果，不修改模型
+    """
+
+    def __init__(self, dedup: bool = True) -> None:
+        super().__init__(deferred=True)
+        self._dedup = dedup
+        self._by_digest: dict[bytes, Buffer] = {}
+        # source 数据的 digest -> 第一个 source 的 id
+        self._sources: dict[bytes, str] = {}
+        # source id -> 数据相同的第一个 source 的 id
+        self.aliases: dict[str, str] = {}
+
+    def _encode(self, obj: Any) -> Any:
+        if isinstance(obj, bm.ColumnDataSource):
+            return self._encode_source(obj)
+        return super()._encode(obj)
+
+    def _encode_source(self, source: bm.ColumnDataSource) -> Any:
+        if self._dedup and len(source.data) > 0:
+            digest = _source_digest(source)
+            if digest is not None:
+                canonical = self._sources.setdefault(digest, source.id)
+                if canonical != source.id:
+                    # 例如 BoxPlot 中上下两条 whisker 使用的 source
+                    self.aliases[source.id] = canonical
+                    return self._encode_source_with_data(source, {})
+        return self._encode_source_data(source)
+
+    def _encode_source_data(self, source: bm.ColumnDataSource) -> Any:
+        return super()._encode(source)
+
+    def _encode_source_with_data(
+        self, source: bm.ColumnDataSource, data: dict[str, Any]
+    ) -> ObjectRefRep:
+        # 参考 `bokeh.model.Model.to_serializable`，只替换 data
+        self.add_ref(source, source.ref)
+        properties = source.properties_with_values(
+            include_defaults=settings.serialize_include_defaults()
+        )
+        properties["data"] = data
+        return ObjectRefRep(
+            type="object",
+            name=source.__qualified_model__,
+            id=source.id,
+            attributes={k: self.encode(v) for k, v in properties.items()},
+        )
+
+    def _encode_bytes(self, obj: bytes | memoryview) -> BytesRep:
+        if not self._dedup:
+            return super()._encode_bytes(obj)
+        digest = hashlib.blake2b(obj, digest_size=16).digest()
+        buffer = self._by_digest.get(digest, None)
+        if buffer is None:
+            buffer = Buffer(make_id(), obj)
+            self._by_digest[digest] = buffer
+            self._buffers.append(buffer)
+        return BytesRep(type="bytes", data=buffer)
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    return str(obj)
+
+
+def _narrow_integers(values: pl.Series) -> pl.Series:
+    """与 `bokeh.util.serialization.transform_array` 一致，64 位整数尽量转为 32 位"""
+    narrow = {pl.Int64: (pl.Int32, np.int32), pl.UInt64: (pl.UInt32, np.uint32)}.get(
+        values.dtype, None
+    )
+    if narrow is None:
+        return values
+    lo, hi = values.min(), values.max()
+    info = np.iinfo(narrow[1])
+    if lo is None or info.min <= lo and hi <= info.max:  # type: ignore[operator]
+        return values.cast(narrow[0])
+    # JS 中没有 64 位整数的数组
+    return values.cast(pl.Float64)
+
+
+def _narrow_arrow(array: Any) -> Any:
+    """large_string / large_list 转为 32 位 offset，重复较多的字符串使用字典编码"""
+    import pyarrow as pa
+
+    if pa.types.is_large_string(array.type):
+        array = array.cast(pa.string())
+        if array.null_count == 0 and 2 * len(array.unique()) < len(array):
+            array = array.dictionary_encode()
+    elif pa.types.is_dictionary(array.type):
+        array = array.cast(pa.dictionary(pa.int32(), pa.string()))
+    elif pa.types.is_large_list(array.type):
+        array = array.cast(pa.list_(array.type.value_type))
+    return array
+
+
+def _arrow_column(values: Any) -> Any | None:
+    """转换为 Arrow 数组，需要 bokeh 处理的列 (日期时间、对象等) 返回 None"""
+    import pyarrow as pa
+
+    if isinstance(values, pl.Series):
+        dtype = values.dtype
+        if dtype.is_temporal() or dtype == pl.Object:
+            return None
+        if dtype.is_integer():
+            values = _narrow_integers(values)
+        if values.dtype.is_numeric() and values.null_count() > 0:
+            # 与 bokeh 的序列化一致，缺失值为 NaN
+            values = values.cast(pl.Float64).fill_null(float("nan"))
+        # 前端的 Arrow 实现不一定支持 string_view 等新的类型
+        return _narrow_arrow(values.to_arrow(compat_level=pl.CompatLevel.oldest()))
+    if isinstance(values, np.ndarray):
+        if values.ndim != 1 or values.dtype.kind not in "biuf":
+            return None
+        values = transform_array(values)
+    try:
+        array = pa.array(values)
+    except (pa.ArrowException, TypeError, ValueError):
+        return None
+    if pa.types.is_temporal(array.type) or pa.types.is_null(array.type):
+        return None
+    return array
+
+
+def _arrow_ipc(
+    data: dict[str, Any],
+) -> tuple[bytes | None, dict[str, Any]]:
+    """把 source 的列写为 Arrow IPC stream，返回 (stream, 剩余的列)"""
+    import pyarrow as pa
+
+    columns: dict[str, Any] = {}
+    rest: dict[str, Any] = {}
+    for name, values in data.items():
+        array = _arrow_column(values)
+        if array is None:
+            rest[name] = values
+        else:
+            columns[name] = array
+    if len(columns) == 0 or len({len(a) for a in columns.values()}) > 1:
+        return None, data
+    batch = pa.record_batch(list(columns.values()), names=list(columns))
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes(), rest
+
+
+class _ArrowSerializer(_BufferSerializer):
+    """ColumnDataSource 的列写为 Arrow IPC stream，不经过 JSON 和 base64"""
+
+    def __init__(self, dedup: bool = True) -> None:
+        super().__init__(dedup=dedup)
+        # source id -> buffer id
+        self.arrow: dict[str, str] = {}
+
+    def _encode_source_data(self, source: bm.ColumnDataSource) -> Any:
+        stream, rest = _arrow_ipc(source.data)
+        if stream is None:
+            return super()._encode_source_data(source)
+
+        buffer = Buffer(make_id(), stream)
+        self._buffers.append(buffer)
+        self.arrow[source.id] = buffer.id
+        return self._encode_source_with_data(source, rest)
+
+
+def _update_digest(h: Any, values: Any) -> None:
+    if isinstance(values, pl.Series):
+        h.update(str(values.dtype).encode())
+        if isinstance(values.dtype, pl.List):
+            h.update(values.list.len().fill_null(-1).to_numpy().tobytes())
+            _update_digest(h, values.explode())
+            return
+        if values.dtype.is_numeric() or values.dtype == pl.Boolean:
+            h.update(values.is_null().to_numpy().tobytes())
+            h.update(np.ascontiguousarray(values.to_numpy()).data)
+            return
+        values = values.to_list()
+    arr = np.asarray(values)
+    h.update(f"{arr.dtype.str}{arr.shape}".encode())
+    if arr.dtype.hasobject:
+        h.update(json.dumps(arr.tolist(), default=_default).encode())
+    else:
+        h.update(np.ascontiguousarray(arr).data)
+
+
+def _source_digest(source: bm.ColumnDataSource) -> bytes | None:
+    h = hashlib.blake2b(digest_size=16)
+    for name in sorted(source.data):
+        h.update(name.encode())
+        try:
+            _update_digest(h, source.data[name])
+        except (TypeError, ValueError):
+            return None
+    return h.digest()
+
+
+def _json_item(model: Model, serializer: _BufferSerializer) -> dict[str, Any]:
+    """与 `bokeh.embed.json_item` 相同，buffer 保存在 `serializer` 中
+
+    参考 `bokeh.document.Document.to_json`
+    """
+    with OutputDocumentFor([model]) as doc:
+        data_models = [
+            m for m in Model.model_class_reverse_map.values() if is_DataModel(m)
+        ]
+        defs = serializer.encode(data_models)
+        roots = serializer.encode(doc.roots)
+        callbacks = serializer.encode(doc.callbacks._js_event_callbacks)
+        doc_json = DocJson(version=bokeh_version, title="", roots=roots)
+        if data_models:
+            doc_json["defs"] = defs
+        if doc.callbacks._js_event_callbacks:
+            doc_json["callbacks"] = callbacks
+    item = {
+        "target_id": None,
+        "root_id": doc_json["roots"][0]["id"],
+        "doc": doc_json,
+        "version": bokeh_version,
+    }
+    return item
+
+
+def _compress(blob: bytes, compression: PayloadCompression) -> tuple[bytes, str]:
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            logger.warning("zstandard is not installed, fall back to gzip")
+        else:
+            return zstandard.ZstdCompressor(level=3).compress(blob), "zstd"
+        compression = "gzip"
+    if compression == "gzip":
+        return gzip.compress(blob, compresslevel=6, mtime=0), "gzip"
+    return blob, "none"
+
+
+def _decompress(data: bytes, compression: str) -> bytes:
+    if compression == "zstd":
+        import zstandard
+
+        return zstandard.ZstdDecompressor().decompress(data)
+    if compression == "gzip":
+        return gzip.decompress(data)
+    return data
+
+
+def _encode_payload(
+    model: Model,
+    serializer: _BufferSerializer,
+    compression: PayloadCompression,
+) -> dict[str, Any]:
+    item = _json_item(model, serializer)
+
+    table: list[list[Any]] = []
+    chunks: list[bytes] = []
+    offset = 0
+    for buffer in serializer.buffers:
+        data = buffer.to_bytes()
+        table.append([buffer.id, offset, len(data)])
+        padding = -len(data) % _ALIGN
+        chunks.append(data + b"\0" * padding)
+        offset += len(data) + padding
+
+    header_: dict[str, Any] = {"item": item, "buffers": table}
+    if serializer.aliases:
+        header_["aliases"] = serializer.aliases
+    if isinstance(serializer, _ArrowSerializer):
+        header_["arrow"] = serializer.arrow
+    header = json.dumps(
+        header_,
+        separators=(",", ":"),
+        default=lambda o: o.ref if isinstance(o, Buffer) else str(o),
+    ).encode("utf-8")
+    prefix = _MAGIC + struct.pack("<BI", _VERSION, len(header)) + header
+    prefix += b"\0" * (-len(prefix) % _ALIGN)
+    blob = b"".join([prefix, *chunks])
+
+    data, compression_ = _compress(blob, compression)
+    return {
+        "version": _VERSION,
+        "compression": compression_,
+        "size": len(blob),
+        "data": base64.b64encode(data).decode("ascii"),
+    }
+
+
+def encode_compact_payload(
+    model: Model,
+    compression: PayloadCompression = "gzip",
+    dedup: bool = True,
+) -> dict[str, Any]:
+    """把模型编码为 compact 格式，`dedup` 时合并相同的 source 和 buffer"""
+    return _encode_payload(model, _BufferSerializer(dedup=dedup), compression)
+
+
+def encode_arrow_payload(
+    model: Model,
+    compression: PayloadCompression = "gzip",
+    dedup: bool = True,
+) -> dict[str, Any]:
+    """把模型编码为 arrow 格式，source 的列通过 `pl.Series.to_arrow` 转换"""
+    return _encode_payload(model, _ArrowSerializer(dedup=dedup), compression)
+
+
+def decode_compact_payload(payload: dict[str, Any]) -> dict[str, Any]:
+    """`encode_compact_payload` / `encode_arrow_payload` 的逆过程
+
+    buffer 还原为内嵌的 base64，Arrow 中的列还原为 ``data`` 中的列表，
+    合并的 source 还原各自的 ``data``，结果可以直接交给 ``Bokeh.embed.embed_item``，主要用于检查和测试
+    """
+    blob = _decompress(base64.b64decode(payload["data"]), payload["compression"])
+    if blob[:4] != _MAGIC:
+        raise ValueError("not a compact plotting payload")
+    version, header_size = struct.unpack_from("<BI", blob, 4)
+    if version != _VERSION:
+        raise ValueError(f"unsupported payload version {version}")
+    start = 9
+    header = json.loads(blob[start : start + header_size])
+    base = start + header_size
+    base += -base % _ALIGN
+    buffers = {
+        id_: blob[base + offset : base + offset + length]
+        for id_, offset, length in header["buffers"]
+    }
+    arrow: dict[str, str] = header.get("arrow", {})
+    aliases: dict[str, str] = header.get("aliases", {})
+
+    def restore_source(obj: dict[str, Any]) -> dict[str, Any]:
+        import pyarrow as pa
+
+        table = pa.ipc.open_stream(buffers[arrow[obj["id"]]]).read_all()
+        data = obj["attributes"]["data"]
+        entries = [*data.get("entries", [])]
+        entries.extend((name, table[name].to_pylist()) for name in table.column_names)
+        return {
+            **obj,
+            "attributes": {
+                **obj["attributes"],
+                "data": {"type": "map", "entries": entries},
+            },
+        }
+
+    def restore(obj: Any) -> Any:
+        if isinstance(obj, dict):
+            if obj.get("type") == "bytes" and isinstance(obj.get("data"), dict):
+                data = buffers[obj["data"]["id"]]
+                return {"type": "bytes", "data": base64.b64encode(data).decode()}
+            if obj.get("type") == "object" and obj.get("id") in arrow:
+                obj = restore_source(obj)
+            return {k: restore(v) for k, v in obj.items()}
+        if isinstance(obj, list):
+            return [restore(v) for v in obj]
+        return obj
+
+    item = restore(header["item"])
+    if len(aliases) > 0:
+        sources: dict[str, dict[str, Any]] = {}
+
+        def index(obj: Any) -> None:
+            if isinstance(obj, dict):
+                if obj.get("type") == "object" and "id" in obj:
+                    sources.setdefault(obj["id"], obj)
+                for v in obj.values():
+                    index(v)
+            elif isinstance(obj, list):
+                for v in obj:
+                    index(v)
+
+        index(item)
+        for alias, canonical in aliases.items():
+            sources[alias]["attributes"]["data"] = sources[canonical]["attributes"][
+                "data"
+            ]
+    return item
+
+
+def static_mime_bundle(
+    model: Model, options: StaticPayloadOptions
+) -> tuple[str, str | dict[str, Any]]:
+    """static 模式下发送的 (MIME 类型, 数据)"""
+    if options.encoding == "json":
+        from bokeh.embed import json_item
+
+        return MIME_TYPE_JSON, json.dumps(json_item(model))
+    if options.encoding == "arrow":
+        return MIME_TYPE_ARROW, encode_arrow_payload(
+            model, compression=options.compression, dedup=options.dedup
+        )
+    return MIME_TYPE_COMPACT, encode_compact_payload(
+        model, compression=options.compression, dedup=options.dedup
+    )
@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import itertools
+import json
+import os
+import pathlib
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Iterator
+
+import polars as pl
+
+__all__ = [
+    "ProfileRecord",
+    "RenderProfile",
+    "plotting_profile",
+    "profile_stage",
+]
+
+
+@dataclass
+class ProfileRecord:
+    id: int
+    parent_id: int | None
+    stage: str
+    name: str | None
+    start_ns: int
+    duration_ns: int = 0
+    thread_id: int = 0
+    rows_in: int | None = None
+    rows_out: int | None = None
+    columns: int | None = None
+    cds_bytes: int | None = None
+    extra: dict[str, Any] = field(default_factory=dict)
+
+
+class RenderProfile:
+    """渲染过程中每个阶段的耗时与数据量记录"""
+
+    def __init__(self) -> None:
+        self.records: list[ProfileRecord] = []
+        self._ids = itertools.count()
+        self._origin_ns = time.perf_counter_ns()
+
+    def to_polars(self) -> pl.DataFrame:
+        return pl.DataFrame(
+            {
+                "id": [r.id for r in self.records],
+                "parent_id": [r.parent_id for r in self.records],
+                "stage": [r.stage for r in self.records],
+                "name": [r.name for r in self.records],
+                "start_ms": [(r.start_ns - self._origin_ns) / 1e6 for r in self.records],
+                "duration_ms": [r.duration_ns / 1e6 for r in self.records],
+                "rows_in": [r.rows_in for r in self.records],
+                "rows_out": [r.rows_out for r in self.records],
+                "columns": [r.columns for r in self.records],
+                "cds_bytes": [r.cds_bytes for r in self.records],
+            },
+            schema={
+                "id": pl.Int64,
+                "parent_id": pl.Int64,
+                "stage": pl.String,
+                "name": pl.String,
+                "start_ms": pl.Float64,
+                "duration_ms": pl.Float64,
+                "rows_in": pl.Int64,
+                "rows_out": pl.Int64,
+                "columns": pl.Int64,
+                "cds_bytes": pl.Int64,
+            },
+        ).sort("id")
+
+    def summary(self) -> pl.DataFrame:
+        """按阶段汇总"""
+        return (
+            self.to_polars()
+            .group_by("stage")
+            .agg(
+                pl.len().alias("calls"),
+                pl.col("duration_ms").sum().alias("total_ms"),
+                pl.col("duration_ms").mean().alias("mean_ms"),
+                pl.col("duration_ms").max().alias("max_ms"),
+                pl.col("rows_in").sum(),
+                pl.col("rows_out").sum(),
+                pl.col("cds_bytes").sum(),
+            )
+            .sort("total_ms", descending=True)
+        )
+
+    def to_table(self) -> str:
+        with pl.Config(tbl_rows=-1, tbl_cols=-1, tbl_width_chars=200):
+            return str(self.summary())
+
+    def to_chrome_trace(self) -> dict[str, Any]:
+        """导出为 Chrome trace event 格式，可以在 chrome://tracing 或 Perfetto 中打开"""
+        pid = os.getpid()
+        events: list[dict[str, Any]] = []
+        for r in self.records:
+            args: dict[str, Any] = {
+                k: v
+                for k, v in (
+                    ("rows_in", r.rows_in),
+                    ("rows_out", r.rows_out),
+                    ("columns", r.columns),
+                    ("cds_bytes", r.cds_bytes),
+                )
+                if v is not None
+            }
+            args.update(r.extra)
+            events.append(
+                {
+                    "name": r.stage if r.name is None else f"{r.stage}: {r.name}",
+                    "cat": r.stage,
+                    "ph": "X",
+                    "ts": (r.start_ns - self._origin_ns) / 1e3,
+                    "dur": r.duration_ns / 1e3,
+                    "pid": pid,
+                    "tid": r.thread_id,
+                    "args": args,
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def save_chrome_trace(self, path: str | os.PathLike[str]) -> None:
+        pathlib.Path(path).write_text(json.dumps(self.to_chrome_trace()))
+
+    def __str__(self) -> str:
+        return self.to_table()
+
+
+_active_profile: contextvars.ContextVar[RenderProfile | None] = contextvars.ContextVar(
+    "mas.plotting.profile", default=None
+)
+_current_record: contextvars.ContextVar[ProfileRecord | None] = contextvars.ContextVar(
+    "mas.plotting.profile.record", default=None
+)
+
+
+class _Stage:
+    enabled = True
+
+    def __init__(self, profile: RenderProfile, stage: str, name: str | None) -> None:
+        parent = _current_record.get()
+        self._profile = profile
+        self._record = ProfileRecord(
+            id=next(profile._ids),
+            parent_id=parent.id if parent is not None else None,
+            stage=stage,
+            name=name,
+            start_ns=0,
+            thread_id=threading.get_ident(),
+        )
+        self._token: contextvars.Token[ProfileRecord | None] | None = None
+
+    def update(
+        self,
+        rows_in: int | None = None,
+        rows_out: int | None = None,
+        columns: int | None = None,
+        cds_bytes: int | None = None,
+        **extra: Any,
+    ) -> None:
+        r = self._record
+        if rows_in is not None:
+            r.rows_in = rows_in
+        if rows_out is not None:
+            r.rows_out = rows_out
+        if columns is not None:
+            r.columns = columns
+        if cds_bytes is not None:
+            r.cds_bytes = cds_bytes
+        r.extra.update(extra)
+
+    def __enter__(self) -> _Stage:
+        self._token = _current_record.set(self._record)
+        self._record.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self._record.duration_ns = time.perf_counter_ns() - self._record.start_ns
+        if self._token is not None:
+            _current_record.reset(self._token)
+        self._profile.records.append(self._record)
+
+
+class _NullStage:
+    enabled = False
+
+    def update(self, *_: Any, **__: Any) -> None:
+        pass
+
+    def __enter__(self) -> _NullStage:
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+def profile_stage(stage: str, name: str | None = None) -> _Stage | _NullStage:
+    """记录一个渲染阶段；没有开启 profile 时返回一个空操作的 context manager
+
+    统计数据量的代价比较高的地方需要先判断 `stage.enabled`
+    """
+    profile = _active_profile.get()
+    if profile is None:
+        return _NULL_STAGE
+    return _Stage(profile, stage, name)
+
+
+@contextlib.contextmanager
+def plotting_profile() -> Iterator[RenderProfile]:
+    """在上下文中记录渲染各阶段的耗时、行数、列数和 ColumnDataSource 大小
+
+    >>> with plotting_profile() as prof:
+    ...     plot.render()
+    >>> print(prof.to_table())
+    """
+    profile = RenderProfile()
+    token = _active_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _active_profile.reset(token)
@@ -0,0 +1,309 @@
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import math
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Literal
+
+import bokeh.models as bm
+import polars as pl
+from bokeh.core.property.vectorization import Field, Unspecified
+
+from mas.libs.phanpy.plotting.constants import AUTO_RANGE_TAG
+from mas.libs.phanpy.plotting.facet import FacetFilter, apply_facet_filter
+
+__all__ = [
+    "collect_ranges",
+    "record_glyph_bounds",
+    "apply_collected_ranges",
+    "share_collected_range",
+    "copy_auto_range",
+    "is_auto_range",
+]
+
+RangeDimension = Literal["x", "y"]
+
+# glyph 中属于 x/y 方向的属性
+_FIELDS: dict[RangeDimension, tuple[str, ...]] = {
+    "x": ("x", "x0", "x1", "x2", "left", "right", "xs"),
+    "y": ("y", "y0", "y1", "y2", "top", "bottom", "ys"),
+}
+# 以 x/y 为中心、有宽度的 glyph
+_EXTENTS: dict[RangeDimension, tuple[tuple[type[bm.Glyph], str], ...]] = {
+    "x": ((bm.VBar, "width"), (bm.Rect, "width")),
+    "y": ((bm.HBar, "height"), (bm.Rect, "height")),
+}
+# bm.Image 以左下角为锚点，范围为 [x, x + dw]
+_IMAGE_FIELDS: dict[RangeDimension, tuple[str, str]] = {
+    "x": ("x", "dw"),
+    "y": ("y", "dh"),
+}
+
+
+@dataclass
+class _Bounds:
+    lo: float = math.inf
+    hi: float = -math.inf
+    # 有无法在 polars 中计算范围的 glyph 时保留 DataRange1d
+    resolved: bool = True
+
+    def update(self, other: _Bounds) -> None:
+        self.lo = min(self.lo, other.lo)
+        self.hi = max(self.hi, other.hi)
+        self.resolved = self.resolved and other.resolved
+
+
+# 一次 render 过程中每个 figure 的数据范围，key 为 (figure.id, 方向)
+_collector: contextvars.ContextVar[
+    dict[tuple[str, RangeDimension], _Bounds] | None
+] = contextvars.ContextVar("mas.plotting.render.ranges", default=None)
+
+
+@contextlib.contextmanager
+def collect_ranges() -> Iterator[None]:
+    """在一次渲染中记录每个 figure 的数据范围，嵌套调用时沿用外层的记录"""
+    if _collector.get() is not None:
+        yield
+        return
+
+    token = _collector.set({})
+    try:
+        yield
+    finally:
+        _collector.reset(token)
+
+
+def _glyph_bounds(
+    glyph: bm.Glyph, data: pl.DataFrame, dim: RangeDimension, log: bool
+) -> _Bounds:
+    """glyph 在某个方向上的数据范围，log 轴只考虑正数"""
+    if isinstance(glyph, (bm.Image, bm.ImageRGBA)):
+        return _image_bounds(glyph, data, dim, log)
+    if isinstance(glyph, bm.ImageURL):
+        return _Bounds(resolved=False)
+    columns: list[str] = []
+    for name in _FIELDS[dim]:
+        if name not in glyph.properties():
+            continue
+        value = getattr(glyph, name)
+        if isinstance(value, Field):
+            if value.transform is not Unspecified:
+                # 例如 Jitter 等 transform，结果只有在浏览器中才知道
+                return _Bounds(resolved=False)
+            columns.append(value.field)
+        elif isinstance(value, str):
+            columns.append(value)
+
+    half = 0.0
+    for glyph_type, attr in _EXTENTS[dim]:
+        if isinstance(glyph, glyph_type):
+            extent = getattr(glyph, attr)
+            if not isinstance(extent, (int, float)):
+                return _Bounds(resolved=False)
+            if getattr(glyph, f"{attr}_units", "data") == "screen":
+                extent = 0.0
+            half = extent / 2
+
+    for c in columns:
+        if c not in data.columns:
+            return _Bounds(resolved=False)
+        dtype = data.schema[c]
+        if isinstance(dtype, pl.List) and dtype.inner.is_numeric():
+            continue
+        if not dtype.is_numeric():
+            # 分类/时间等类型交给 BokehJS
+            return _Bounds(resolved=False)
+    if len(columns) == 0 or data.height == 0:
+        return _Bounds()
+
+    def _min_max(lists_exploded: bool) -> list[float | None]:
+        exprs: list[pl.Expr] = []
+        for c in columns:
+            col = pl.col(c)
+            if isinstance(data.schema[c], pl.List):
+                if not lists_exploded:
+                    # 不展开列表，只有结果不是有限值时才需要逐个过滤
+                    exprs.extend([col.list.min().min(), col.list.max().max()])
+                    continue
+                col = col.explode()
+            col = col.cast(pl.Float64)
+            col = col.filter((col > 0) & col.is_finite() if log else col.is_finite())
+            exprs.extend([col.min(), col.max()])
+        return [*data.select(*[e.alias(str(i)) for i, e in enumerate(exprs)]).row(0)]
+
+    values = _min_max(lists_exploded=log)
+    if any(v is not None and not math.isfinite(v) for v in values):
+        values = _min_max(lists_exploded=True)
+    bounds = _Bounds()
+    for lo, hi in zip(values[::2], values[1::2]):
+        if lo is not None and hi is not None:
+            bounds.update(_Bounds(lo=lo - half, hi=hi + half))
+    return bounds
+
+
+def _image_bounds(
+    glyph: bm.Image | bm.ImageRGBA, data: pl.DataFrame, dim: RangeDimension, log: bool
+) -> _Bounds:
+    anchor, extent = (getattr(glyph, name) for name in _IMAGE_FIELDS[dim])
+    if glyph.anchor != "bottom_left":
+        return _Bounds(resolved=False)
+    names = [v.field if isinstance(v, Field) else v for v in (anchor, extent)]
+    if not all(
+        isinstance(n, str) and n in data.columns and data.schema[n].is_numeric()
+        for n in names
+    ):
+        return _Bounds(resolved=False)
+    if getattr(glyph, f"{_IMAGE_FIELDS[dim][1]}_units") != "data":
+        return _Bounds(resolved=False)
+    if data.height == 0:
+        return _Bounds()
+
+    start = pl.col(names[0]).cast(pl.Float64)
+    stop = start + pl.col(names[1]).cast(pl.Float64)
+    lo, hi = data.select(
+        pl.min_horizontal(start, stop).min().alias("lo"),
+        pl.max_horizontal(start, stop).max().alias("hi"),
+    ).row(0)
+    if lo is None or hi is None or (log and hi <= 0):
+        return _Bounds()
+    if log and lo <= 0:
+        return _Bounds(resolved=False)
+    return _Bounds(lo=lo, hi=hi)
+
+
+def record_glyph_bounds(
+    figure: bm.Plot,
+    glyph: bm.Glyph,
+    data: pl.DataFrame,
+    facet_filter: FacetFilter | None = None,
+) -> None:
+    """记录 renderer 中的数据范围，只在 `collect_ranges` 中生效"""
+    collector = _collector.get()
+    if collector is None:
+        return
+    data = apply_facet_filter(data, facet_filter)
+    for dim in ("x", "y"):
+        bounds = collector.setdefault((figure.id, dim), _Bounds())
+        if bounds.resolved:
+            log = isinstance(getattr(figure, f"{dim}_scale"), bm.LogScale)
+            bounds.update(_glyph_bounds(glyph, data, dim, log))
+
+
+def is_auto_range(range_: bm.Range) -> bool:
+    """由数据自动决定的范围 (DataRange1d 或者预先计算的 Range1d)"""
+    return isinstance(range_, bm.DataRange1d) or (
+        isinstance(range_, bm.Range1d) and AUTO_RANGE_TAG in range_.tags
+    )
+
+
+@dataclass
+class _RangeSettings:
+    """DataRange1d 中影响范围计算的设置，替换为 Range1d 后仍然保留，共享轴时使用"""
+
+    padding: float = 0.1
+    start: float = math.nan
+    end: float = math.nan
+    flipped: bool = False
+
+
+# 记录在预先计算的 Range1d 上 (不会被序列化)
+_SETTINGS_ATTR = "_mas_range_settings"
+
+
+def _range_settings(range_: bm.Range) -> _RangeSettings:
+    if isinstance(range_, bm.DataRange1d):
+        return _RangeSettings(
+            padding=(
+                range_.range_padding if range_.range_padding_units == "percent" else 0.0
+            ),
+            start=range_.start if range_.start is not None else math.nan,
+            end=range_.end if range_.end is not None else math.nan,
+            flipped=range_.flipped,
+        )
+    return getattr(range_, _SETTINGS_ATTR, None) or _RangeSettings()
+
+
+def _make_range(
+    bounds: _Bounds, log: bool, template: bm.Range
+) -> bm.Range1d | None:
+    if not bounds.resolved:
+        return None
+    lo, hi = bounds.lo, bounds.hi
+    if not (math.isfinite(lo) and math.isfinite(hi)):
+        return None
+
+    settings = _range_settings(template)
+    # 同 DataRange1d: 两侧各留 range_padding / 2，宽度为 0 时使用 default_span
+    if log:
+        lo, hi = math.log10(lo), math.log10(hi)
+    pad = (hi - lo) * settings.padding / 2 if hi > lo else 1.0
+    lo, hi = lo - pad, hi + pad
+    if log:
+        lo, hi = 10**lo, 10**hi
+    if not math.isnan(settings.start):
+        lo = settings.start
+    if not math.isnan(settings.end):
+        hi = settings.end
+    if settings.flipped:
+        lo, hi = hi, lo
+    range_ = bm.Range1d(start=lo, end=hi, tags=[AUTO_RANGE_TAG])
+    setattr(range_, _SETTINGS_ATTR, settings)
+    return range_
+
+
+def _union(figures: Iterable[bm.Plot], dim: RangeDimension) -> _Bounds | None:
+    collector = _collector.get()
+    if collector is None:
+        return None
+    union = _Bounds()
+    for figure in figures:
+        bounds = collector.get((figure.id, dim), None)
+        if bounds is None:
+            continue
+        union.update(bounds)
+    return union
+
+
+def apply_collected_ranges(figure: bm.Plot) -> None:
+    """把 figure 的 DataRange1d 替换为按数据计算的 Range1d
+
+    BokehJS 不再需要遍历所有 renderer 计算范围，布局也因此是确定的
+    """
+    for dim in ("x", "y"):
+        current = getattr(figure, f"{dim}_range")
+        if not isinstance(current, bm.DataRange1d):
+            continue
+        bounds = _union([figure], dim)
+        if bounds is None:
+            continue
+        log = isinstance(getattr(figure, f"{dim}_scale"), bm.LogScale)
+        range_ = _make_range(bounds, log, current)
+        if range_ is not None:
+            setattr(figure, f"{dim}_range", range_)
+
+
+def share_collected_range(
+    figures: Iterable[bm.Plot], dim: RangeDimension
+) -> bm.Range1d | None:
+    """共享轴的范围：所有 figure 的数据范围的并集
+
+    任何一个 figure 的范围不是自动计算的时返回 None
+    """
+    figures = [*figures]
+    if len(figures) == 0:
+        return None
+    if not all(is_auto_range(getattr(f, f"{dim}_range")) for f in figures):
+        return None
+    bounds = _union(figures, dim)
+    if bounds is None:
+        return None
+    log = isinstance(getattr(figures[0], f"{dim}_scale"), bm.LogScale)
+    return _make_range(bounds, log, getattr(figures[0], f"{dim}_range"))
+
+
+def copy_auto_range(range_: bm.Range1d) -> bm.Range1d:
+    """复制预先计算的 Range1d (例如用于另一个文档)，保留共享轴时使用的设置"""
+    copied = bm.Range1d(start=range_.start, end=range_.end, tags=[*range_.tags])
+    setattr(copied, _SETTINGS_ATTR, _range_settings(range_))
+    return copied
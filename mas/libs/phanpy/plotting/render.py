@@ -12,20 +12,33 @@
 #
 # Copyright (c) 2024 Maspectra Dev Team
 ############################################################
-from typing import Literal, TypedDict
+from typing import Any, Literal, TypedDict
 
 import bokeh.models as bm
 import polars as pl
 from bokeh.core.enums import RenderLevelType
 from typing_extensions import NotRequired
 
+from mas.libs.phanpy.plotting.budget import (
+    apply_render_budget,
+    apply_shared_render_budget,
+    will_rasterize,
+)
 from mas.libs.phanpy.plotting.constants import (
     GLYPH_FIELD_TOOLTIPS_COLUMN_NAME,
     RENDERER_TAG,
     GlyphTooltipsTag,
 )
-from mas.libs.phanpy.plotting.facet import FacetFilter, apply_facet_filter
+from mas.libs.phanpy.plotting.facet import (
+    FacetFilter,
+    SharedFacetSources,
+    apply_facet_filter,
+    current_shared_facet_sources,
+    make_facet_view,
+)
 from mas.libs.phanpy.plotting.legends import handle_legend_group, handle_legend_label
+from mas.libs.phanpy.plotting.profile import profile_stage
+from mas.libs.phanpy.plotting.ranges import record_glyph_bounds
 
 GlyphLegendType = Literal["label", "group"]
 
@@ -84,23 +97,52 @@ def render_glyph(
     legend_spec: GlyphLegendSpec | None = None,
     tooltip_template: pl.Expr | None = None,
     level: RenderLevelType = "glyph",
-) -> bm.GlyphRenderer:
+    source_data: dict[str, Any] | None = None,
+) -> bm.GlyphRenderer | None:
+    """添加 glyph renderer，经过渲染预算、profile 和数据范围的记录
+
+    `source_data` 用于无法放在 polars 中的数据 (例如 `bm.Image` 的二维数组)，
+    此时 CDS 直接使用 `source_data`，`data` 只包含用于计算范围的标量列
+    """
     tags = [RENDERER_TAG]
     if tooltip_template is not None:
-        data = data.with_columns(
-            tooltip_template.alias(GLYPH_FIELD_TOOLTIPS_COLUMN_NAME)
-        )
+        with profile_stage("tooltip_format", name=name) as stage:
+            data = data.with_columns(
+                tooltip_template.alias(GLYPH_FIELD_TOOLTIPS_COLUMN_NAME)
+            )
+            stage.update(rows_in=data.height)
         tags.append(GlyphTooltipsTag.FIELD.value)
 
-    data = apply_facet_filter(data, facet_filter)
-    source = bm.ColumnDataSource(data.to_dict())
-    renderer = figure.add_glyph(
-        source,
-        glyph=glyph,
-        name=name,
-        tags=tags,
-        level=level,
+    shared_sources = (
+        current_shared_facet_sources(data, facet_filter, glyph)
+        if source_data is None
+        else None
     )
+    if shared_sources is not None:
+        assert facet_filter is not None
+        renderer = _render_shared_glyph(
+            shared_sources=shared_sources,
+            data=data,
+            facet_filter=facet_filter,
+            glyph=glyph,
+            figure=figure,
+            name=name,
+            tags=tags,
+            level=level,
+        )
+    else:
+        renderer = _render_glyph(
+            data=data,
+            facet_filter=facet_filter,
+            glyph=glyph,
+            figure=figure,
+            name=name,
+            tags=tags,
+            level=level,
+            source_data=source_data,
+        )
+    if renderer is None:
+        return None
     if legend is not None and legend_spec is not None:
         update_legend(
             legend_type=legend_spec.get("legend_type", "label"),
@@ -109,3 +151,106 @@ def render_glyph(
             renderer=renderer,
         )
     return renderer
+
+
+def _render_glyph(
+    data: pl.DataFrame,
+    facet_filter: FacetFilter | None,
+    glyph: bm.Glyph,
+    figure: bm.Plot,
+    name: str | None,
+    tags: list[str],
+    level: RenderLevelType,
+    source_data: dict[str, Any] | None = None,
+) -> bm.GlyphRenderer | None:
+    with profile_stage("apply_facet_filter", name=name) as stage:
+        rows_in = data.height
+        data = apply_facet_filter(data, facet_filter)
+        stage.update(rows_in=rows_in, rows_out=data.height)
+
+    decision = apply_render_budget(
+        data, glyph=glyph, figure=figure, name=name, source_data=source_data
+    )
+    if decision.data is None:
+        return None
+    data, glyph = decision.data, decision.glyph
+
+    with profile_stage("bokeh_model", name=name or type(glyph).__name__) as stage:
+        source = bm.ColumnDataSource(decision.to_source_data())
+        renderer = figure.add_glyph(
+            source,
+            glyph=glyph,
+            name=name,
+            tags=tags,
+            level=level,
+        )
+        if stage.enabled:
+            stage.update(
+                rows_out=data.height,
+                columns=data.width,
+                cds_bytes=decision.estimated_size(),
+                budget=decision.action,
+            )
+    record_glyph_bounds(figure, glyph, data)
+    return renderer
+
+
+def _render_shared_glyph(
+    shared_sources: SharedFacetSources,
+    data: pl.DataFrame,
+    facet_filter: FacetFilter,
+    glyph: bm.Glyph,
+    figure: bm.Plot,
+    name: str | None,
+    tags: list[str],
+    level: RenderLevelType,
+) -> bm.GlyphRenderer | None:
+    """所有子图共用一个 source，每个子图通过 view 按 facet 过滤"""
+    key = shared_sources.next_key(facet_filter)
+    shared = shared_sources.lookup(key, data) if key is not None else None
+    if shared is None:
+        if will_rasterize(data, glyph):
+            # 栅格化后的图片无法按 facet 过滤，回退为每个子图单独的 source
+            # (在计入用量之前判断，避免同一个 renderer 被计入两次)
+            return _render_glyph(
+                data=data,
+                facet_filter=facet_filter,
+                glyph=glyph,
+                figure=figure,
+                name=name,
+                tags=tags,
+                level=level,
+            )
+        decision = apply_render_budget(data, glyph=glyph, figure=figure, name=name)
+        if decision.data is None:
+            return None
+        with profile_stage("bokeh_model", name=name or type(glyph).__name__) as stage:
+            source = bm.ColumnDataSource(decision.to_source_data())
+            if stage.enabled:
+                stage.update(
+                    rows_out=decision.data.height,
+                    columns=decision.data.width,
+                    cds_bytes=decision.estimated_size(),
+                    budget=decision.action,
+                )
+        if key is not None:
+            shared_sources.register(key, data, decision.data, source)
+        source_data, glyph = decision.data, decision.glyph
+    else:
+        if not apply_shared_render_budget(glyph, figure=figure, name=name):
+            return None
+        source_data, source = shared
+
+    with profile_stage("apply_facet_filter", name=name) as stage:
+        view = make_facet_view(source_data, facet_filter)
+        stage.update(rows_in=source_data.height)
+    renderer = figure.add_glyph(
+        source,
+        glyph=glyph,
+        view=view,
+        name=name,
+        tags=tags,
+        level=level,
+    )
+    record_glyph_bounds(figure, glyph, source_data, facet_filter)
+    return renderer
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Literal, Sequence
+
+import numpy as np
+import polars as pl
+
+from mas.libs.phanpy.plotting.constants import m_internal
+
+__all__ = [
+    "SamplingStrategy",
+    "SamplingResult",
+    "sample_rows",
+]
+
+SamplingStrategy = Literal["stratified", "reservoir", "density"]
+
+
+@dataclass
+class SamplingResult:
+    data: pl.DataFrame
+    # 抽样前的行数
+    total: int
+
+    @property
+    def ratio(self) -> float:
+        return self.data.height / self.total if self.total > 0 else 1.0
+
+    def describe(self) -> str:
+        return f"sampled {self.data.height:,} / {self.total:,} ({self.ratio:.1%})"
+
+
+def _water_level(counts: np.ndarray, n: int) -> int:
+    """求每个分组的上限 q，使 sum(min(count, q)) 不超过 n
+
+    数量少的分组全部保留，剩余的名额由大分组平分
+    """
+    counts = np.sort(counts)
+    remaining = n
+    for i, c in enumerate(counts):
+        share = remaining // (len(counts) - i)
+        if c > share:
+            return max(share, 1)
+        remaining -= int(c)
+    return int(counts[-1]) if counts.size > 0 else 0
+
+
+def sample_rows(
+    data: pl.DataFrame | pl.LazyFrame,
+    n: int,
+    strategy: SamplingStrategy = "stratified",
+    by: Sequence[str] = (),
+    x: str | None = None,
+    y: str | None = None,
+    grid: int | None = None,
+    seed: int = 0,
+) -> SamplingResult:
+    """从 `data` 中抽取至多 `n` 行，保持原有顺序
+
+    - reservoir: 均匀抽样，对 `pl.LazyFrame` 使用 streaming 的 top-k
+      (按行号的 hash 取最小的 n 个，等价于 reservoir sampling)
+    - stratified: 按 `by` 分层，数量少的分组全部保留
+    - density: 按 (`by`, x/y 所在的网格) 分层，稀疏区域 (离群点) 全部保留，
+      `grid` 默认为 sqrt(n) / 2，使网格数不超过 n / 4；
+      非数值 (categorical) 的 x/y 不分网格，按其取值分层
+
+    分组数多于 `n` 时每个分组至少保留一行
+    """
+    index_name = m_internal("mas.sampling.index")
+    key_name = m_internal("mas.sampling.key")
+    cell_name = m_internal("mas.sampling.cell")
+    strata_name = m_internal("mas.sampling.strata")
+
+    lazy = data.lazy()
+    columns = lazy.collect_schema().names()
+    total = (
+        data.height
+        if isinstance(data, pl.DataFrame)
+        else lazy.select(pl.len()).collect(streaming=True).item()
+    )
+    if total <= n:
+        return SamplingResult(data=lazy.collect(streaming=True), total=total)
+
+    # 行号的 hash 作为随机数，同一份数据的结果稳定
+    lazy = lazy.with_row_index(index_name).with_columns(
+        pl.col(index_name).hash(seed).alias(key_name)
+    )
+    keys = [*by]
+    if strategy == "density":
+        if x is None or y is None:
+            raise ValueError("x and y must be provided with strategy='density'")
+        if grid is None:
+            grid = max(int(np.sqrt(n) / 2), 1)
+        schema = lazy.collect_schema()
+        dims = [*dict.fromkeys((x, y))]
+        binned = [
+            name
+            for name in dims
+            if schema[name].is_numeric() or schema[name].is_temporal()
+        ]
+        # categorical 的维度 (例如 categorical 轴上的散点) 不分网格，直接分层
+        keys.extend(name for name in dims if name not in binned and name not in keys)
+        values = [pl.col(name).to_physical().cast(pl.Float64) for name in binned]
+        if len(values) > 0:
+            bounds = lazy.select(
+                *[e.min().alias(f"min{i}") for i, e in enumerate(values)],
+                *[e.max().alias(f"max{i}") for i, e in enumerate(values)],
+            ).collect(streaming=True)
+            cell = pl.lit(0, dtype=pl.Int64)
+            for i, value in enumerate(values):
+                low, high = bounds[f"min{i}"].item(), bounds[f"max{i}"].item()
+                # 全部为空值时没有范围
+                low, high = (low, high) if low is not None else (0.0, 1.0)
+                cell = cell * grid + (
+                    ((value - low) / ((high - low) or 1.0) * grid)
+                    .floor()
+                    .clip(0, grid - 1)
+                )
+            lazy = lazy.with_columns(cell.fill_null(-1).cast(pl.Int64).alias(cell_name))
+            keys.append(cell_name)
+
+    if strategy == "reservoir" or len(keys) == 0:
+        sampled = lazy.top_k(n, by=key_name, reverse=True)
+    else:
+        counts = (
+            lazy.group_by(keys).agg(pl.len()).collect(streaming=True)["len"].to_numpy()
+        )
+        level = _water_level(counts, n)
+        sampled = lazy.filter(
+            pl.col(key_name).rank("ordinal").over(keys).alias(strata_name) <= level
+        )
+    result = sampled.sort(index_name).select(columns).collect(streaming=True)
+    return SamplingResult(data=result, total=total)
@@ -12,17 +12,21 @@
 #
 # Copyright (c) 2024 Maspectra Dev Team
 ############################################################
+from __future__ import annotations
+
 import logging as logger
 import os
 import pathlib
 import tempfile
-
-import bokeh.io
-import bokeh.resources
+import typing
 
 from mas.libs.phanpy.ipython.detect_ipython import is_ipynb
 from mas.libs.phanpy.metaclass.singleton import Singleton
 
+# bokeh.io 等只在 setup 时导入，避免 import plotting 时加载
+if typing.TYPE_CHECKING:
+    import bokeh.resources
+
 
 class _SetupFlag(metaclass=Singleton):
     is_set = False
@@ -43,6 +47,8 @@ def _get_bokeh_resource() -> tuple[bokeh.resources.ResourcesMode, pathlib.Path |
 
 
 def setup_notebook(reset: bool = False) -> None:
+    import bokeh.io
+    import bokeh.resources
     from bokeh.plotting import curdoc
 
     if not reset and _SetupFlag.is_set:
@@ -61,6 +67,7 @@ def setup_notebook(reset: bool = False) -> None:
 
 
 def setup_html(reset: bool = False) -> None:
+    import bokeh.io
     from bokeh.plotting import curdoc
 
     if not reset and _SetupFlag.is_set:
@@ -14,7 +14,7 @@
 ############################################################
 from __future__ import annotations
 
-from typing import Any, Generic, Iterable, Literal, cast
+from typing import Any, Generic, Iterable, Literal, Sequence, cast
 
 import bokeh.models as bm
 import polars as pl
@@ -39,6 +39,7 @@ from typing_extensions import (  # 必须要从 typing_extension 里面导入，
     Unpack,
 )
 
+from mas.libs.phanpy.plotting.factor import infer_factors
 from mas.libs.phanpy.plotting.layer.grid import GridPlotLayoutSpec
 from mas.libs.phanpy.plotting.props import ScalarTextProps
 from mas.libs.phanpy.types.color import Alpha, ColorLike
@@ -105,7 +106,10 @@ class NumericAxSpec(CommonAxSpec[AxisPlaceTypeT]):
 
 class CategoricalAxSpec(CommonAxSpec[AxisPlaceTypeT]):
     typ: Literal["categorical"]
-    factors: TextLikeCollection
+    # 不提供时从数据中推断，见 `infer_factors`
+    factors: NotRequired[TextLikeCollection]
+    # 推断 factors 使用的列，多个列时为嵌套的 factors (例如 dodge)
+    factors_from: NotRequired[str | Sequence[str]]
 
 
 AxSpec = NumericAxSpec[AxisPlaceTypeT] | CategoricalAxSpec[AxisPlaceTypeT]
@@ -243,7 +247,7 @@ def make_title(
     return title_axis
 
 
-def make_range(ax: AxSpec[Any]) -> bm.Range:
+def make_range(ax: AxSpec[Any], data: pl.DataFrame | None = None) -> bm.Range:
     typ = ax.get("typ", "numeric")
     if typ == "numeric":
         range_: NumericRangeSpec = ax.get("range", "auto")
@@ -264,12 +268,18 @@ def make_range(ax: AxSpec[Any]) -> bm.Range:
             return range_m
     else:
         factors_: TextLikeCollection | None = ax.get("factors", None)
-        if factors_ is None:
-            raise ValueError(
-                "You must provide factors if no data is provided with categorical axis"
-            )
+        if factors_ is not None:
+            return bm.FactorRange(factors=list(factors_))
+
+        factors_from: str | Sequence[str] | None = ax.get("factors_from", None)
+        if factors_from is not None:
+            if data is None:
+                raise ValueError("You must provide data to infer factors from columns")
+            by = [factors_from] if isinstance(factors_from, str) else [*factors_from]
+            return bm.FactorRange(factors=[*infer_factors(data, *by)])
 
-        return bm.FactorRange(factors=list(factors_))
+        # 由 glyph 从数据中推断 (见 `ensure_factors`)，绘制后仍为空时报错
+        return bm.FactorRange()
 
 
 class MajorGridLineProps(TypedDict):
@@ -378,6 +388,8 @@ class FacetWrapSpec(BaseFacetSpec):
     style: Literal["wrap"]
     by: IntoExpr | Iterable[IntoExpr]
     n_cols: int | None
+    # 所有子图共用一个 ColumnDataSource，每个子图通过 CDSView 过滤
+    shared_data: NotRequired[bool]
 
 
 class FacetGridSpec(BaseFacetSpec):